@@ -6,6 +6,7 @@ from data.game import Game
 def main():
 	gm = Game(api_use=True)
 	gm.new_game()
+	gm.api_print_help()
 
 	flip_stock = ['S0', 0, 'S0']
 	gm.api_make_move(flip_stock)
@@ -0,0 +1,286 @@
+"""
+plays (or solves) a large batch of seeded games across several processes
+and streams the results to a JSONL or CSV file
+
+every result has: seed, won, moves, seconds
+runs can be stopped and started again: seeds already in the output file are skipped
+
+examples:
+    python batch_runner.py --seeds seeds.txt --out results.jsonl
+    python batch_runner.py --count 100000 --policy solver --out results.csv
+    python batch_runner.py --seeds seeds.txt --policy my_bots:greedy --workers 8
+    python batch_runner.py --deal-ids 0:1000000 --decks 2 --out shard0.jsonl
+
+a policy is a function that takes a started Game (api_use=True) and plays it
+until it is won or the policy gives up. it can be given as 'random', 'solver'
+or 'module:function'
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import importlib
+import json
+import os
+import random
+import time
+from data.game import Game
+import data.seed_processor
+import data.solver
+
+
+#============= GLOBAL DEFINITIONS =============#
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_MAX_MOVES = 2000
+RESULT_FIELDS = ['seed', 'won', 'moves', 'seconds']
+
+
+#============= POLICIES =============#
+def random_policy(game, max_moves=DEFAULT_MAX_MOVES):
+    """
+    makes random legal moves until the game is won or max_moves is reached
+    the moves are picked with a generator seeded from the game's seed, so every
+    game plays the same in any worker process and in any run
+    """
+    rng = random.Random(game.get_seed())
+    for i in range(max_moves):
+        if game.api_is_won():
+            return
+        moves = game.api_get_legal_moves()
+        if len(moves) == 0:
+            return
+        game.api_make_move(rng.choice(moves))
+
+
+def solver_policy(game):
+    """
+    solves the game with data/solver.py and plays out the winning moves (if any)
+    """
+    status, moves = data.solver.solve_board(game.board)
+    if status == data.solver.SOLVED:
+        for move in moves:
+            game.api_make_move(move)
+
+
+POLICIES = {'random': random_policy, 'solver': solver_policy}
+
+
+def load_policy(name):
+    """
+    returns the policy function for a name from POLICIES or a 'module:function' string
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+#============= WORKER PROCESS =============#
+# set once per worker process by init_worker, so nothing is rebuilt between games
+worker_game = None
+worker_policy = None
+worker_options = None
+
+
+def init_worker(policy_name, game_options):
+    global worker_game, worker_policy, worker_options
+    worker_game = Game(api_use=True)
+    worker_policy = load_policy(policy_name)
+    worker_options = game_options
+
+
+def play_chunk(seeds):
+    """
+    plays every seed in a chunk and returns a list of result dicts
+    """
+    results = []
+    for seed in seeds:
+        start_time = time.perf_counter()
+        worker_game.new_game(custom_seed=seed, **worker_options)
+        worker_policy(worker_game)
+        results.append({'seed': seed,
+                        'won': worker_game.api_is_won(),
+                        'moves': worker_game.api_get_moves(),
+                        'seconds': round(time.perf_counter() - start_time, 6)})
+    return results
+
+
+#============= RESULT FILES =============#
+class ResultWriter:
+    """
+    appends results to a .jsonl or .csv file, one line per game
+    a line left half written by an interrupted run is cut off first
+    (read_finished_seeds skips it, so its game is played again)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.endswith('.csv')
+        trim_partial_line(path)
+        write_header = self.is_csv and (not os.path.exists(path) or os.path.getsize(path) == 0)
+        self.file = open(path, 'a', newline='')
+        if self.is_csv:
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if write_header:
+                self.csv_writer.writeheader()
+
+    def write(self, results):
+        for result in results:
+            if self.is_csv:
+                self.csv_writer.writerow(result)
+            else:
+                self.file.write(json.dumps(result) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_finished_seeds(path):
+    """
+    returns the set of seeds that already have a result in the output file
+    a last line without a line break was cut short by an interrupted run and is skipped
+    """
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, newline='') as result_file:
+        lines = (line for line in result_file if line.endswith('\n'))
+        if path.endswith('.csv'):
+            for row in csv.DictReader(lines):
+                finished.add(row['seed'])
+        else:
+            for line in lines:
+                try:
+                    finished.add(json.loads(line)['seed'])
+                except (ValueError, KeyError):
+                    pass
+    return finished
+
+
+def trim_partial_line(path, block_size=4096):
+    """
+    cuts a results file back to its last line break, if it doesn't end with one
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as result_file:
+        end = result_file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            result_file.seek(start)
+            block = result_file.read(position - start)
+            if position == end and block.endswith(b'\n'):
+                return
+            line_break = block.rfind(b'\n')
+            if line_break != -1:
+                result_file.truncate(start + line_break + 1)
+                return
+            position = start
+        result_file.truncate(0)
+
+
+#============= BATCH RUNNER =============#
+def read_seed_file(path):
+    with open(path) as seed_file:
+        for line in seed_file:
+            seed = line.strip()
+            if seed:
+                yield seed
+
+
+def random_seeds(count, decks=1):
+    for i in range(count):
+        yield data.seed_processor.generate_random_seed(decks)
+
+
+def deal_id_seeds(deal_ids, decks=1):
+    """
+    yields the seed of every deal id in a range, so any game can be replayed from its seed
+    """
+    for deal_id in deal_ids:
+        yield data.seed_processor.deal_to_seed(deal_id, decks)
+
+
+def parse_deal_ids(text):
+    """
+    returns a range from a 'start:stop' string
+    """
+    start, _, stop = text.partition(':')
+    return range(int(start), int(stop))
+
+
+def chunked(seeds, chunk_size):
+    chunk = []
+    for seed in seeds:
+        chunk.append(seed)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(seeds, out_path, policy_name='random', workers=None, chunk_size=DEFAULT_CHUNK_SIZE, game_options=None):
+    """
+    plays every seed from an iterable of seeds and writes the results to out_path
+    only a few chunks per worker are in flight at once, so seeds can come from
+    a generator of any length
+    returns the number of games played
+    """
+    game_options = game_options or {}
+    workers = workers or os.cpu_count()
+    finished = read_finished_seeds(out_path)
+    chunks = chunked((seed for seed in seeds if seed not in finished), chunk_size)
+    writer = ResultWriter(out_path)
+    games_played = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                initargs=(policy_name, game_options)) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(play_chunk, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    writer.write(future.result())
+                    games_played += len(future.result())
+        for future in concurrent.futures.as_completed(pending):
+            writer.write(future.result())
+            games_played += len(future.result())
+
+    writer.close()
+    return games_played
+
+
+def main():
+    parser = argparse.ArgumentParser(description="play a batch of seeded solitaire games")
+    parser.add_argument('--seeds', help="file with one seed per line")
+    parser.add_argument('--count', type=int, help="number of random seeds to play instead of a seed file")
+    parser.add_argument('--deal-ids', type=parse_deal_ids, help="'start:stop' range of deal ids to play instead of a seed file")
+    parser.add_argument('--decks', type=int, default=1, help="number of decks for --count and --deal-ids")
+    parser.add_argument('--out', required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument('--policy', default='random', help="'random', 'solver' or 'module:function'")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: one per cpu)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--deal-3', action='store_true', help="draw 3 cards at a time from the stock")
+    args = parser.parse_args()
+
+    if args.seeds:
+        seeds = read_seed_file(args.seeds)
+    elif args.count:
+        seeds = random_seeds(args.count, args.decks)
+    elif args.deal_ids:
+        seeds = deal_id_seeds(args.deal_ids, args.decks)
+    else:
+        parser.error("one of --seeds, --count or --deal-ids is required")
+
+    start_time = time.perf_counter()
+    games_played = run_batch(seeds, args.out, args.policy, args.workers, args.chunk_size,
+                             {'deal_3': args.deal_3, 'decks': args.decks})
+    print(f'Played {games_played} games in {time.perf_counter() - start_time:.1f} seconds')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+micro-benchmark for Board.attempt_move: how many moves a second Board and
+CompactBoard can play
+
+the moves are made up once from seeded random games (see record_games) and then
+played again on freshly dealt boards, so every run, and every version of the
+code, plays exactly the same moves. they are a mix of legal moves, stock draws,
+moves that get turned down and undos
+
+run it from the repository's root folder:
+    python -m benchmarks.bench_moves
+    python -m benchmarks.bench_moves --games 200 --repeat 5
+"""
+
+import argparse
+import random
+import time
+from data.solitaire_objects import Board, STOCK_DRAW_MOVE, UNDO_MOVE
+from data.compact_objects import CompactBoard
+from data import seed_processor
+
+
+#============= GLOBAL DEFINITIONS =============#
+DEFAULT_GAMES = 100
+DEFAULT_MOVES = 300
+DEFAULT_REPEAT = 3
+UNDO_SHARE = 0.1        # share of moves that are undos
+ILLEGAL_SHARE = 0.1     # share of moves picked at random (nearly always turned down)
+
+
+#============= FUNCTION DEFINITIONS =============#
+def deal_board(board_class, deal_id, deal_3):
+    board = board_class(deal_3=deal_3)
+    board.init_move_dict()
+    board.deal(seed_processor.deal_to_deck(deal_id))
+    return board
+
+
+def record_games(games=DEFAULT_GAMES, moves_per_game=DEFAULT_MOVES, deal_3=False, seed=0):
+    """
+    returns a list of (deal id, list of moves) for games played with random moves
+    """
+    rng = random.Random(seed)
+    recorded = []
+    for deal_id in range(games):
+        board = deal_board(Board, deal_id, deal_3)
+        keys = list(board.move_dict)
+        moves = []
+        for i in range(moves_per_game):
+            roll = rng.random()
+            if roll < UNDO_SHARE:
+                move = UNDO_MOVE
+            elif roll < UNDO_SHARE + ILLEGAL_SHARE:
+                move = [rng.choice(keys), rng.randrange(4), rng.choice(keys)]
+            else:
+                legal = board.legal_moves()
+                move = rng.choice(legal) if len(legal) != 0 else STOCK_DRAW_MOVE
+            board.attempt_move(move)
+            moves.append(list(move))
+        recorded.append((deal_id, moves))
+    return recorded
+
+
+def time_moves(board_class, recorded, deal_3=False, repeat=DEFAULT_REPEAT):
+    """
+    plays every recorded game on a new board_class board and returns the best
+    moves a second out of repeat runs (dealing is not timed)
+    """
+    total_moves = sum(len(moves) for deal_id, moves in recorded)
+    best = 0
+    for i in range(repeat):
+        boards = [deal_board(board_class, deal_id, deal_3) for deal_id, moves in recorded]
+        start_time = time.perf_counter()
+        for board, (deal_id, moves) in zip(boards, recorded):
+            attempt_move = board.attempt_move
+            for move in moves:
+                attempt_move(move)
+        best = max(best, total_moves / (time.perf_counter() - start_time))
+    return best
+
+
+def run_benchmark(games=DEFAULT_GAMES, moves_per_game=DEFAULT_MOVES, repeat=DEFAULT_REPEAT, seed=0):
+    """
+    returns {benchmark name: moves a second} for both board classes, drawing 1 and 3
+    """
+    results = {}
+    for deal_3 in (False, True):
+        recorded = record_games(games, moves_per_game, deal_3, seed)
+        for board_class in (Board, CompactBoard):
+            name = f'{board_class.__name__} draw {3 if deal_3 else 1}'
+            results[name] = time_moves(board_class, recorded, deal_3, repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='times Board.attempt_move')
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES)
+    parser.add_argument('--moves', type=int, default=DEFAULT_MOVES, help='moves per game')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs to take the best of')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, moves_per_second in run_benchmark(args.games, args.moves, args.repeat, args.seed).items():
+        print(f'{name:<20} {moves_per_second:>12,.0f} moves/s')
+
+
+if __name__ == '__main__':
+    main()
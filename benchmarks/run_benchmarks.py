@@ -0,0 +1,558 @@
+"""
+benchmark suite for the engine, the API, the seed codec and the renderer
+
+every benchmark uses fixed seeds, so two runs (or two versions of the code) time
+exactly the same work. results can be written out as JSON and compared against
+an earlier results file: a benchmark that got slower than its threshold allows
+is a regression, and the runner exits with status 1
+
+run it from the repository's root folder:
+    python -m benchmarks.run_benchmarks --out results.json
+    python -m benchmarks.run_benchmarks --baseline results.json --out new.json
+    python -m benchmarks.run_benchmarks --only attempt_move --only seed --scale 0.2
+    python -m benchmarks.run_benchmarks --list
+
+timings are only comparable on the same machine, and a busy machine can easily
+make a benchmark 20-30% slower from one run to the next, so keep baselines per
+machine (and raise --threshold on shared ones)
+
+the renderer is drawn with SDL's dummy video driver, so no window is opened.
+benchmarks that need a package that isn't installed (pygame, numpy) are skipped
+
+a benchmark is a function that sets up its work and returns (number of operations,
+function that does them). only the second function is timed, it is set up again for
+every repeat, and the best repeat is kept
+"""
+
+import argparse
+import copy
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from data.game import Game
+from data.solitaire_objects import Board, STOCK_DRAW_MOVE
+from data.compact_objects import CompactBoard
+from data import seed_processor
+from data import game_record
+from data import playouts
+import batch_runner
+
+
+#============= GLOBAL DEFINITIONS =============#
+RESULTS_FORMAT = 1
+DEFAULT_REPEAT = 5
+DEFAULT_SCALE = 1.0
+DEFAULT_THRESHOLD = 0.3     # a benchmark regresses when it is this much slower than the baseline
+THRESHOLDS = {'gui/': 0.4, 'game/': 0.4}    # name prefix => threshold, for noisier benchmarks
+
+BOARD_CLASSES = (Board, CompactBoard)
+MOVE_KINDS = ['draw', 'recycle', 'waste_to_foundation', 'waste_to_tableau', 'tableau_to_foundation',
+              'tableau_to_tableau', 'tableau_run', 'foundation_to_tableau', 'flip', 'rejected']
+MOVE_KIND_NAMES = {'WF': 'waste_to_foundation', 'WT': 'waste_to_tableau', 'TF': 'tableau_to_foundation',
+                   'TT': 'tableau_to_tableau', 'FT': 'foundation_to_tableau'}
+MAX_DEALS = 2000            # most games played looking for positions of one kind of move
+
+
+#============= HELPERS =============#
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+
+def deal_board(board_class, deal_id, deal_3=False, auto_flip_tab=True):
+    board = board_class(deal_3=deal_3, auto_flip_tab=auto_flip_tab)
+    board.init_move_dict()
+    board.deal(seed_processor.deal_to_deck(deal_id))
+    return board
+
+
+def play_random_moves(board, rng, num_moves):
+    for i in range(num_moves):
+        legal = board.legal_moves()
+        if len(legal) == 0:
+            return
+        board.attempt_move(rng.choice(legal))
+
+
+def move_kind(board, move):
+    """
+    returns which of MOVE_KINDS a legal move is (None for foundation to foundation)
+    """
+    orig_key, card_index, dest_key = move
+    if orig_key == 'S0':
+        return 'draw' if board.stock.get_length() != 0 else 'recycle'
+    if orig_key == dest_key:
+        return 'flip'
+    kind = MOVE_KIND_NAMES.get(orig_key[0] + dest_key[0])
+    if kind == 'tableau_to_tableau' and card_index != 0:
+        return 'tableau_run'
+    return kind
+
+
+def collect_positions(board_class, kind, count, seed=0):
+    """
+    returns up to count (board, move) pairs where move is a kind of move that can be
+    made on board, found by playing seeded random games
+    """
+    rng = random.Random(seed)
+    positions = []
+    for deal_id in range(MAX_DEALS):
+        board = deal_board(board_class, deal_id, auto_flip_tab=kind != 'flip')
+        keys = list(board.move_dict)
+        for step in range(200):
+            legal = board.legal_moves()
+            if len(legal) == 0:
+                break
+            if kind == 'rejected':
+                move = [rng.choice(keys), rng.randrange(3), rng.choice(keys)]
+                matching = [move] if move not in legal and move[0] != move[2] else []
+            else:
+                matching = [move for move in legal if move_kind(board, move) == kind]
+            if len(matching) != 0:
+                positions.append((copy.deepcopy(board), rng.choice(matching)))
+                if len(positions) == count:
+                    return positions
+            board.attempt_move(rng.choice(legal))
+    return positions
+
+
+#============= BENCHMARKS =============#
+def bench_deal(board_class, scale):
+    boards = [board_class() for i in range(scaled(500, scale))]
+    decks = [seed_processor.deal_to_deck(deal_id) for deal_id in range(len(boards))]
+
+    def run():
+        for board, deck in zip(boards, decks):
+            board.deal(deck)
+    return len(boards), run
+
+
+def bench_attempt_move(board_class, kind, scale, positions_cache={}):
+    """
+    makes one kind of move on many different boards (see MOVE_KINDS)
+    """
+    count = scaled(300, scale)
+    key = (board_class, kind, count)
+    if key not in positions_cache:
+        positions_cache[key] = collect_positions(board_class, kind, count)
+    positions = copy.deepcopy(positions_cache[key])
+    for board, move in positions:
+        # copied piles and journals have no room to grow, unlike ones in the middle
+        # of a game, so make the move (and take it back) once here, not in the timed run
+        # (the records are played back by hand: undo_move would also take back the
+        # move before a flip, which doesn't count as a move)
+        journal_length, moves = len(board.move_journal), board.moves
+        if board.attempt_move(move):
+            while len(board.move_journal) > journal_length:
+                board.reverse_record(board.move_journal.pop())
+            board.moves = moves
+
+    def run():
+        for board, move in positions:
+            board.attempt_move(move)
+    return len(positions), run
+
+
+def bench_undo_deep(board_class, scale):
+    """
+    undoes every move of a long game, one at a time
+    """
+    board = deal_board(board_class, 7, deal_3=True)
+    play_random_moves(board, random.Random(7), scaled(3000, scale))
+    moves = board.moves
+
+    def run():
+        for i in range(moves):
+            board.undo_move()
+    return moves, run
+
+
+def bench_snapshot(board_class, scale):
+    """
+    builds a full snapshot of a board in the middle of a game
+    (what undo used to save after every move with save_board_state)
+    """
+    board = deal_board(board_class, 3)
+    play_random_moves(board, random.Random(3), 60)
+    count = scaled(5000, scale)
+
+    def run():
+        for i in range(count):
+            board.snapshot()
+    return count, run
+
+
+def bench_legal_moves(board_class, scale):
+    board = deal_board(board_class, 5)
+    play_random_moves(board, random.Random(5), 40)
+    count = scaled(3000, scale)
+
+    def run():
+        for i in range(count):
+            board.legal_moves()
+    return count, run
+
+
+def bench_position_key(board_class, scale):
+    board = deal_board(board_class, 5)
+    play_random_moves(board, random.Random(5), 40)
+    count = scaled(50000, scale)
+
+    def run():
+        for i in range(count):
+            board.position_key(True)
+    return count, run
+
+
+def bench_fork_rollout(board_class, scale):
+    """
+    forks a board in the middle of a game and plays a few moves on the fork,
+    the way a Monte Carlo search tries out a move (only the forked piles get copied)
+    """
+    board = deal_board(board_class, 9)
+    play_random_moves(board, random.Random(9), 40)
+    moves = board.legal_moves()[:3] + [STOCK_DRAW_MOVE]
+    count = scaled(10000, scale)
+
+    def run():
+        for i in range(count):
+            fork = board.fork()
+            for move in moves:
+                fork.attempt_move(move)
+    return count, run
+
+
+def bench_playouts(scale):
+    """
+    plays heuristic playouts (one per legal move per determinization) from a
+    position in the middle of a game, in this process
+    """
+    board = deal_board(Board, 11)
+    play_random_moves(board, random.Random(11), 15)
+    count = scaled(20, scale)
+    engine = playouts.PlayoutEngine(seed=11)
+
+    def run():
+        engine.rng.seed(11)
+        engine.estimate_moves(board, count)
+    return count * len(board.legal_moves()), run
+
+
+def bench_random_games(scale):
+    """
+    plays whole games with batch_runner's random policy through Game(api_use=True)
+    """
+    game = Game(api_use=True)
+    deal_ids = range(scaled(20, scale))
+
+    def run():
+        for deal_id in deal_ids:
+            random.seed(deal_id)
+            game.new_game(custom_seed=deal_id)
+            batch_runner.random_policy(game, max_moves=300)
+    return len(deal_ids), run
+
+
+def bench_seed_encode(scale):
+    decks = [seed_processor.deal_to_deck(deal_id) for deal_id in range(scaled(2000, scale))]
+
+    def run():
+        for deck in decks:
+            seed_processor.deck_to_seed(deck)
+    return len(decks), run
+
+
+def bench_seed_decode(scale):
+    seeds = [seed_processor.deal_to_seed(deal_id) for deal_id in range(scaled(2000, scale))]
+
+    def run():
+        for seed in seeds:
+            seed_processor.seed_to_deck(seed)
+    return len(seeds), run
+
+
+def bench_seed_decode_codes(scale):
+    seeds = [seed_processor.deal_to_seed(deal_id) for deal_id in range(scaled(20000, scale))]
+
+    def run():
+        for codes in seed_processor.decode_many(seeds):
+            pass
+    return len(seeds), run
+
+
+def bench_deal_codes(scale):
+    deal_ids = range(scaled(5000, scale))
+
+    def run():
+        for deal_id in deal_ids:
+            seed_processor.deal_codes(deal_id)
+    return len(deal_ids), run
+
+
+def bench_record_decode(scale):
+    """
+    decodes the moves of archived games (see game_record.py)
+    """
+    rng = random.Random(11)
+    records = []
+    for deal_id in range(scaled(200, scale)):
+        board = deal_board(Board, deal_id)
+        moves = []
+        for i in range(200):
+            legal = board.legal_moves()
+            move = rng.choice(legal) if len(legal) != 0 else STOCK_DRAW_MOVE
+            board.attempt_move(move)
+            moves.append(move)
+        records.append(game_record.GameRecord(deal_id, False, True, 7, 1, len(moves), game_record.encode_moves(moves)))
+
+    def run():
+        for record in records:
+            game_record.decode_moves(record)
+    return sum(record.num_moves for record in records), run
+
+
+def gui_setup():
+    """
+    returns (gui module, screen), drawing with the dummy SDL video driver
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    from data import gui
+    gui.pygame.init()
+    screen = gui.pygame.display.set_mode((gui.WIDTH, gui.HEIGHT))
+    return gui, screen
+
+
+def bench_gui_draw(scale):
+    """
+    draws the whole board (a full frame)
+    """
+    gui, screen = gui_setup()
+    board = deal_board(Board, 9)
+    play_random_moves(board, random.Random(9), 60)
+    graphics = gui.BoardGraphics(board, screen)
+    graphics.update()
+    count = scaled(100, scale)
+
+    def run():
+        for i in range(count):
+            graphics.draw(screen)
+    return count, run
+
+
+def bench_gui_draw_changes(scale):
+    """
+    makes a move (or undoes one) and redraws only the piles it changed, like the game loop
+    """
+    gui, screen = gui_setup()
+    board = deal_board(Board, 9)
+    rng = random.Random(9)
+    play_random_moves(board, rng, 60)
+    graphics = gui.BoardGraphics(board, screen)
+    graphics.update()
+    graphics.draw(screen)
+    count = scaled(300, scale)
+    moves = []
+    for i in range(count):
+        legal = board.legal_moves()
+        moves.append(rng.choice(legal) if len(legal) != 0 else STOCK_DRAW_MOVE)
+
+    def run():
+        for i, move in enumerate(moves):
+            if i % 2 == 0:
+                board.attempt_move(move)
+            else:
+                board.undo_move()
+            graphics.update()
+            graphics.draw_changes(screen)
+    return count, run
+
+
+def bench_batch_step(scale):
+    """
+    legal action masks and steps for a batch of boards (see batch_engine.py)
+    """
+    import numpy as np
+    from data.batch_engine import BatchBoard
+    batch = BatchBoard(scaled(1024, scale))
+    batch.deal_ids(range(batch.num_boards))
+    rng = np.random.default_rng(0)
+    steps = 20
+
+    def run():
+        for i in range(steps):
+            mask = batch.legal_mask()
+            scores = rng.random(mask.shape) * mask
+            batch.step(scores.argmax(axis=1))
+    return steps * batch.num_boards, run
+
+
+def bench_deal_features(scale):
+    """
+    static difficulty features for a batch of seeds (see deal_features.py)
+    """
+    from data.deal_features import DealFeatures
+    features = DealFeatures(deal_3=True)
+    seeds = [seed_processor.deal_to_seed(deal_id) for deal_id in range(scaled(4096, scale))]
+
+    def run():
+        features.compute_seeds(seeds)
+    return len(seeds), run
+
+
+def all_benchmarks():
+    """
+    returns {benchmark name: function(scale) returning (operations, timed function)}
+    """
+    benchmarks = {}
+    for board_class in BOARD_CLASSES:
+        name = board_class.__name__
+        benchmarks[f'deal/{name}'] = lambda scale, board_class=board_class: bench_deal(board_class, scale)
+        for kind in MOVE_KINDS:
+            benchmarks[f'attempt_move/{kind}/{name}'] = (
+                lambda scale, board_class=board_class, kind=kind: bench_attempt_move(board_class, kind, scale))
+        benchmarks[f'undo_move/deep/{name}'] = lambda scale, board_class=board_class: bench_undo_deep(board_class, scale)
+        benchmarks[f'snapshot/{name}'] = lambda scale, board_class=board_class: bench_snapshot(board_class, scale)
+        benchmarks[f'legal_moves/{name}'] = lambda scale, board_class=board_class: bench_legal_moves(board_class, scale)
+        benchmarks[f'position_key/{name}'] = lambda scale, board_class=board_class: bench_position_key(board_class, scale)
+        benchmarks[f'fork/rollout/{name}'] = lambda scale, board_class=board_class: bench_fork_rollout(board_class, scale)
+    benchmarks['game/random_policy'] = bench_random_games
+    benchmarks['game/playouts'] = bench_playouts
+    benchmarks['seed/deck_to_seed'] = bench_seed_encode
+    benchmarks['seed/seed_to_deck'] = bench_seed_decode
+    benchmarks['seed/decode_many'] = bench_seed_decode_codes
+    benchmarks['seed/deal_codes'] = bench_deal_codes
+    benchmarks['game_record/decode_moves'] = bench_record_decode
+    benchmarks['gui/draw'] = bench_gui_draw
+    benchmarks['gui/draw_changes'] = bench_gui_draw_changes
+    benchmarks['batch_engine/step'] = bench_batch_step
+    benchmarks['deal_features/compute_seeds'] = bench_deal_features
+    return benchmarks
+
+
+#============= RUNNER =============#
+def threshold_for(name):
+    for prefix, threshold in THRESHOLDS.items():
+        if name.startswith(prefix):
+            return threshold
+    return DEFAULT_THRESHOLD
+
+
+def time_benchmark(setup, scale=DEFAULT_SCALE, repeat=DEFAULT_REPEAT):
+    """
+    returns (operations, best seconds) for a benchmark
+    """
+    best = None
+    for i in range(repeat):
+        operations, run = setup(scale)
+        # like timeit, keep the garbage collector out of the timed run
+        gc.collect()
+        gc.disable()
+        try:
+            start_time = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start_time
+        finally:
+            gc.enable()
+        if best is None or seconds < best:
+            best = seconds
+    return operations, best
+
+
+def run_benchmarks(names=None, scale=DEFAULT_SCALE, repeat=DEFAULT_REPEAT, report=print):
+    """
+    runs benchmarks (all of them if names is None) and returns the results as a
+    dictionary ready to be written out as JSON
+    """
+    benchmarks = all_benchmarks()
+    results = {}
+    skipped = {}
+    for name in (names if names is not None else benchmarks):
+        try:
+            operations, seconds = time_benchmark(benchmarks[name], scale, repeat)
+        except ImportError as error:
+            skipped[name] = str(error)
+            report(f'{name:<42} skipped ({error})')
+            continue
+        results[name] = {'operations': operations,
+                         'seconds': seconds,
+                         'us_per_op': seconds / operations * 1e6,
+                         'ops_per_second': operations / seconds,
+                         'threshold': threshold_for(name)}
+        report(f'{name:<42} {results[name]["us_per_op"]:>12.3f} us/op {results[name]["ops_per_second"]:>14,.0f} ops/s')
+    return {'format': RESULTS_FORMAT,
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale,
+            'repeat': repeat,
+            'results': results,
+            'skipped': skipped}
+
+
+def compare(results, baseline, threshold=None):
+    """
+    returns a list of (name, baseline ops/s, new ops/s, change) for every benchmark
+    that got slower than its threshold allows (taken from the baseline, unless
+    threshold is given)
+    change is the fraction of speed lost, e.g. 0.3 for 30% slower
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        change = 1 - result['ops_per_second'] / old['ops_per_second']
+        if change > (threshold if threshold is not None else old.get('threshold', DEFAULT_THRESHOLD)):
+            regressions.append((name, old['ops_per_second'], result['ops_per_second'], change))
+    return regressions
+
+
+def select_names(patterns):
+    """
+    returns the names of every benchmark containing any of the patterns (all if there are none)
+    """
+    names = list(all_benchmarks())
+    if not patterns:
+        return names
+    return [name for name in names if any(pattern in name for pattern in patterns)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='runs the solitaire benchmark suite')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='a results JSON file to check for regressions against')
+    parser.add_argument('--only', action='append', help='only run benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--threshold', type=float,
+                        help='fraction slower than the baseline that counts as a regression (overrides every threshold)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs to take the best of')
+    parser.add_argument('--scale', type=float, default=DEFAULT_SCALE, help='multiplies the work done by every benchmark')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args()
+
+    names = select_names(args.only)
+    if args.list:
+        print('\n'.join(names))
+        return
+
+    results = run_benchmarks(names, args.scale, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f'REGRESSION {name}: {old:,.0f} -> {new:,.0f} ops/s ({change:.0%} slower)')
+        if regressions:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,557 @@
+"""
+plays many games of solitaire at once, in lockstep, with NumPy arrays
+needs numpy (the rest of the game does not)
+
+every board in a BatchBoard shares the same options (deal_3, auto_flip_tab,
+number of tableaus and decks) and the same fixed list of actions, which are
+the moves of Board.attempt_move, numbered:
+    0                           => ['S0', 0, 'S0'] (draw from stock)
+    1 .. num_tableaus           => ['TN', 0, 'TN'] (flip a face down top card)
+    after that                  => every ['RX', Y, 'DZ'] move between two different piles
+                                   (see build_actions)
+an action is legal for a board exactly when Board.legal_moves would list it
+(tests/test_batch_engine.py plays the same moves on both and checks they agree)
+
+how the boards are stored (cards are card codes, see deck_of_cards.py):
+    tableaus[board, tableau, position]  codes with FACE_UP set if the card is exposed,
+                                        position 0 is the bottom card
+    tableau_lengths[board, tableau]
+    foundations[board, foundation]      code of the top card, or EMPTY
+                                        (the rest of a foundation is always the same suit, A to top)
+    stock[board, position] / waste[board, position] with stock_lengths / waste_lengths
+
+example:
+    boards = BatchBoard(4096)
+    boards.deal_ids(range(4096))
+    while not boards.is_won().all():
+        legal = boards.legal_mask()
+        boards.step(pick_actions(legal))
+"""
+
+import numpy as np
+from . import seed_processor
+from .deck_of_cards import (SUITS, COLORS, NUM_CARD_CODES, FACE_UP, CODE_MASK, CODE_RANK_VALUES, CODE_SUITS,
+                            CODE_COLORS, card_from_code)
+from .solitaire_objects import (Board, STOCK_DRAW_MOVE, DEFAULT_TABLEAUS, DEFAULT_DECKS,
+                                FOUNDATION_NEXT, TABLEAU_ACCEPTS, ACE_CODES, KING_CODES)
+
+
+#============= GLOBAL DEFINITIONS =============#
+EMPTY = NUM_CARD_CODES      # foundation (or tableau) top when there is no card
+MAX_RUN = 13                # the most face up cards that can be picked up from a tableau
+RUN_INDEXES = np.arange(MAX_RUN, dtype=np.int16)
+
+# action kinds
+DRAW = 0
+FLIP = 1
+MOVE = 2
+
+# source and destination pile kinds
+WASTE = 0
+FOUNDATION = 1
+TABLEAU = 2
+
+
+def _build_accept_table():
+    """
+    ACCEPT[destination kind * (EMPTY+1) + destination top, card] => 1 if the card
+    can be placed on the destination (same rules as Foundation.is_valid_placement
+    and Tableau.is_valid_placement, see the tables in solitaire_objects.py)
+    """
+    accept = np.zeros((3 * (EMPTY + 1), CODE_MASK + 1), dtype=bool)     # any masked code can be looked up
+    for top in range(NUM_CARD_CODES):
+        if FOUNDATION_NEXT[top] is not None:
+            accept[FOUNDATION * (EMPTY + 1) + top, FOUNDATION_NEXT[top]] = True
+        for card in range(NUM_CARD_CODES):
+            accept[TABLEAU * (EMPTY + 1) + top, card] = TABLEAU_ACCEPTS[top * NUM_CARD_CODES + card] == 1
+    accept[FOUNDATION * (EMPTY + 1) + EMPTY, list(ACE_CODES)] = True
+    accept[TABLEAU * (EMPTY + 1) + EMPTY, list(KING_CODES)] = True
+    return accept
+
+def _build_wanted_tables(accept):
+    """
+    the rows of ACCEPT rewritten as (WANTED_KEYS, WANTED_MASKS): a card can be placed
+    when CARD_KEYS[card] & mask == key, so checking a move is two byte operations
+    keys hold rank << 2 | suit index, and the low bit of the suit index is the color
+    """
+    for code in range(NUM_CARD_CODES):
+        assert (CARD_KEYS[code] & 1) == (CODE_COLORS[code] == COLORS[SUITS[1]])
+    keys = np.full(len(accept), NO_MATCH, dtype=np.uint8)
+    masks = np.zeros(len(accept), dtype=np.uint8)
+    for row, accepted in enumerate(accept):
+        codes = np.flatnonzero(accepted)
+        if len(codes) == 0:
+            continue
+        for mask in (EXACT_MASK, RANK_COLOR_MASK, RANK_MASK):
+            key = CARD_KEYS[codes[0]] & mask
+            if np.array_equal(np.flatnonzero(CARD_KEYS & mask == key), codes):
+                keys[row], masks[row] = key, mask
+                break
+        else:
+            raise ValueError(f"placement rule {row} can't be written as a key and mask")
+    return keys, masks
+
+NO_CARD = CODE_MASK         # a code that no pile ever accepts
+NO_MATCH = 255              # a key that no card ever has
+EXACT_MASK = 0b111111
+RANK_COLOR_MASK = 0b111101
+RANK_MASK = 0b111100
+CARD_KEYS = np.array([CODE_RANK_VALUES[code] << 2 | SUITS.index(CODE_SUITS[code]) if code < NUM_CARD_CODES else 0
+                      for code in range(CODE_MASK + 1)], dtype=np.uint8)     # rank 0 is never wanted
+ACCEPT = _build_accept_table()
+WANTED_KEYS, WANTED_MASKS = _build_wanted_tables(ACCEPT)
+RANK_VALUES = np.array(CODE_RANK_VALUES, dtype=np.uint8)
+
+
+#============= CLASS DEFINITIONS =============#
+class BatchBoard:
+    """
+    num_boards boards stored as arrays (see the module docstring)
+    boards must be dealt (deal, deal_seeds or deal_ids) before they are played
+    """
+
+    def __init__(self, num_boards, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS, deal_3=False, auto_flip_tab=True):
+        self.num_boards = num_boards
+        self.num_tableaus = num_tableaus
+        self.num_decks = num_decks
+        self.num_foundations = num_decks * 4
+        self.deal_3 = deal_3
+        self.auto_flip_tab = auto_flip_tab
+        self.num_cards = NUM_CARD_CODES * num_decks
+        self.stock_size = self.num_cards - num_tableaus * (num_tableaus + 1) // 2
+        if self.stock_size < 0:
+            raise ValueError("not enough cards to deal out the tableaus")
+        self.max_tableau = num_tableaus - 1 + MAX_RUN
+
+        self.tableaus = np.zeros((num_boards, num_tableaus, self.max_tableau), dtype=np.uint8)
+        self.tableau_lengths = np.zeros((num_boards, num_tableaus), dtype=np.int16)
+        self.foundations = np.full((num_boards, self.num_foundations), EMPTY, dtype=np.uint8)
+        self.stock = np.zeros((num_boards, self.stock_size), dtype=np.uint8)
+        self.stock_lengths = np.zeros(num_boards, dtype=np.int16)
+        self.waste = np.zeros((num_boards, self.stock_size), dtype=np.uint8)
+        self.waste_lengths = np.zeros(num_boards, dtype=np.int16)
+        self.moves = np.zeros(num_boards, dtype=np.int32)
+
+        self.actions = build_actions(num_tableaus, self.num_foundations)
+        self.num_actions = len(self.actions)
+        self.action_ids = {tuple(move): action for action, move in enumerate(self.actions)}
+        self._init_action_arrays()
+        self.destination_rows = np.array([FOUNDATION * (EMPTY + 1)] * self.num_foundations +
+                                         [TABLEAU * (EMPTY + 1)] * num_tableaus, dtype=np.intp)
+        # where every tableau starts in self.tableaus.reshape(-1)
+        self.tableau_starts = (np.arange(num_boards * num_tableaus) * self.max_tableau).reshape(num_boards, num_tableaus, 1)
+        self.run_offsets = self.tableau_starts - 1 - RUN_INDEXES    # plus the length => the card index deep in the run
+        self._init_deal_positions()
+
+    def _init_action_arrays(self):
+        """
+        describes every action with arrays, so a whole batch of actions can be
+        looked up at once:
+        kind, source column (in source_codes), destination column (in destination_tops),
+        destination kind, source pile kind, source pile index, destination pile index, number of cards
+        """
+        found_keys = ['F'+str(i) for i in range(self.num_foundations)]
+        tab_keys = ['T'+str(i) for i in range(self.num_tableaus)]
+        fields = {'kind': [], 'source': [], 'destination': [], 'dest_kind': [],
+                  'source_kind': [], 'source_pile': [], 'dest_pile': [], 'num_cards': []}
+        for move in self.actions:
+            orig_key, card_index, dest_key = move
+            if move == STOCK_DRAW_MOVE:
+                values = (DRAW, 0, 0, 0, WASTE, 0, 0, 0)
+            elif orig_key == dest_key:
+                values = (FLIP, 0, 0, 0, TABLEAU, int(orig_key[1:]), 0, 0)
+            else:
+                source_kind, source_pile = pile_kind(orig_key), int(orig_key[1:])
+                dest_kind, dest_pile = pile_kind(dest_key), int(dest_key[1:])
+                values = (MOVE, self.source_column(orig_key, card_index),
+                          dest_pile if dest_kind == FOUNDATION else self.num_foundations + dest_pile,
+                          dest_kind, source_kind, source_pile, dest_pile, card_index + 1)
+            for field, value in zip(fields, values):
+                fields[field].append(value)
+        self.action_kind = np.array(fields['kind'], dtype=np.uint8)
+        self.action_source = np.array(fields['source'], dtype=np.intp)
+        self.action_destination = np.array(fields['destination'], dtype=np.intp)
+        self.action_dest_kind = np.array(fields['dest_kind'], dtype=np.intp)
+        self.action_source_kind = np.array(fields['source_kind'], dtype=np.uint8)
+        self.action_source_pile = np.array(fields['source_pile'], dtype=np.intp)
+        self.action_dest_pile = np.array(fields['dest_pile'], dtype=np.intp)
+        self.action_num_cards = np.array(fields['num_cards'], dtype=np.int16)
+        self.action_flip_pile = np.where(self.action_kind == FLIP, self.action_source_pile, 0)
+        # columns of the array built in legal_mask: draw, flips, (every source, every tableau)
+        # then (top sources, every foundation)
+        num_sources = 1 + self.num_foundations + self.num_tableaus * MAX_RUN
+        first_pair = 1 + self.num_tableaus
+        self.top_sources = np.array([self.source_column(key, 0) for key in ['W0'] + found_keys + tab_keys], dtype=np.intp)
+        top_index = {column: i for i, column in enumerate(self.top_sources)}
+        self.action_columns = np.array([
+            action if kind != MOVE
+            else first_pair + source * self.num_tableaus + destination - self.num_foundations if destination >= self.num_foundations
+            else first_pair + num_sources * self.num_tableaus + top_index[source] * self.num_foundations + destination
+            for action, (kind, source, destination) in enumerate(zip(self.action_kind, self.action_source, self.action_destination))],
+            dtype=np.intp)
+
+    def _init_deal_positions(self):
+        """
+        works out where Board.deal puts every card of a deck (see deal_positions)
+        """
+        self.deal_tableau, self.deal_position, self.deal_deck_index, self.deal_exposed = (
+            deal_positions(self.num_tableaus, self.num_cards))
+
+    def source_column(self, key, card_index):
+        """
+        returns the column of source_codes that holds the card picked up by a move from
+        key at card_index: waste first, then the foundations, then MAX_RUN per tableau
+        """
+        if key == 'W0':
+            return 0
+        if key[0] == 'F':
+            return 1 + int(key[1:])
+        return 1 + self.num_foundations + int(key[1:]) * MAX_RUN + card_index
+
+
+    #============== Dealing ==============#
+
+    def deal(self, codes, boards=None):
+        """
+        deals a deck to every board (or to the boards in the index array boards)
+        codes is an array (or list of bytes) of card codes, one deck per row,
+        in the same order as Deck.cards
+        """
+        boards = np.arange(self.num_boards) if boards is None else np.asarray(boards, dtype=np.intp)
+        codes = np.asarray([np.frombuffer(row, dtype=np.uint8) if isinstance(row, (bytes, bytearray)) else row
+                            for row in codes], dtype=np.uint8).reshape(len(boards), self.num_cards) & CODE_MASK
+
+        self.tableaus[boards] = 0
+        self.tableaus[boards[:, None], self.deal_tableau, self.deal_position] = (
+            codes[:, self.deal_deck_index] | np.where(self.deal_exposed, FACE_UP, 0).astype(np.uint8))
+        self.tableau_lengths[boards] = np.arange(1, self.num_tableaus + 1)
+        self.foundations[boards] = EMPTY
+        self.stock[boards] = codes[:, :self.stock_size]
+        self.stock_lengths[boards] = self.stock_size
+        self.waste[boards] = 0
+        self.waste_lengths[boards] = 0
+        self.moves[boards] = 0
+
+    def deal_seeds(self, seeds, boards=None):
+        """
+        deals the deck of a seed (see seed_processor.py) to every board
+        """
+        self.deal(list(seed_processor.decode_many(seeds)), boards)
+
+    def deal_ids(self, deal_ids, boards=None):
+        """
+        deals the deck of a deal id (see seed_processor.deal_codes) to every board
+        """
+        self.deal([seed_processor.deal_codes(deal_id, self.num_decks) for deal_id in deal_ids], boards)
+
+
+    #============== Legal moves ==============#
+
+    def source_codes(self):
+        """
+        returns a (num_boards, source columns) array of the code of the card a move from
+        each source column (see source_column) would pick up, or NO_CARD if nothing can
+        be picked up there
+        """
+        rows = np.arange(self.num_boards)
+        codes = np.empty((self.num_boards, 1 + self.num_foundations + self.num_tableaus * MAX_RUN), dtype=np.uint8)
+        codes[:, 0] = np.where(self.waste_lengths != 0, self.waste[rows, np.maximum(self.waste_lengths - 1, 0)] & CODE_MASK, NO_CARD)
+        codes[:, 1:1 + self.num_foundations] = self.foundations    # EMPTY is never accepted anywhere
+
+        # the top MAX_RUN cards of every tableau, looked up in the flattened tableaus
+        # (positions below the bottom card read some other card, which is then thrown away)
+        lengths = self.tableau_lengths[:, :, None]
+        run_codes = self.tableaus.reshape(-1)[lengths + self.run_offsets]
+        missing = (lengths <= RUN_INDEXES) | (run_codes < FACE_UP)
+        run_codes &= CODE_MASK
+        run_codes[missing] = NO_CARD
+        codes[:, 1 + self.num_foundations:] = run_codes.reshape(self.num_boards, -1)
+        return codes
+
+    def destination_tops(self):
+        """
+        returns the top card code of every foundation and then every tableau (EMPTY if none)
+        """
+        tops = self.tableaus.reshape(-1)[self.tableau_starts[:, :, 0] + np.maximum(self.tableau_lengths - 1, 0)] & CODE_MASK
+        tops[self.tableau_lengths == 0] = EMPTY
+        return np.concatenate([self.foundations, tops], axis=1)
+
+    def wanted_cards(self):
+        """
+        returns two (num_boards, num_foundations + num_tableaus) arrays, the key and mask
+        of the cards that can be placed on every foundation (then tableau), see _build_wanted_tables
+        """
+        rows = self.destination_rows + self.destination_tops()
+        return WANTED_KEYS[rows], WANTED_MASKS[rows]
+
+    def flip_mask(self):
+        """
+        returns a (num_boards, num_tableaus) bool array of which tableaus have a face down top card
+        """
+        tops = self.tableaus.reshape(-1)[self.tableau_starts[:, :, 0] + np.maximum(self.tableau_lengths - 1, 0)]
+        return (self.tableau_lengths != 0) & (tops & FACE_UP == 0)
+
+    def can_draw(self):
+        return (self.stock_lengths != 0) | (self.waste_lengths != 0)
+
+    def legal(self, actions):
+        """
+        returns a bool array the shape of actions, an array of action ids with one row
+        per board, that is True where the action is legal on that row's board
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        rows = np.arange(self.num_boards)[:, None]
+        codes = self.source_codes()[rows, self.action_source[actions]]
+        destination = self.action_destination[actions]
+        keys, masks = self.wanted_cards()
+        is_move = CARD_KEYS[codes] & masks[rows, destination] == keys[rows, destination]
+        can_flip = self.flip_mask()[rows, self.action_flip_pile[actions]]
+
+        kind = self.action_kind[actions]
+        return np.where(kind == MOVE, is_move, np.where(kind == DRAW, self.can_draw()[:, None], can_flip))
+
+    def legal_mask(self):
+        """
+        returns a (num_boards, num_actions) bool array of every legal action
+        """
+        # every source against every tableau, and the top cards against every foundation,
+        # then the columns that are actions are picked out
+        card_keys = CARD_KEYS[self.source_codes()]
+        keys, masks = self.wanted_cards()
+        found = self.num_foundations
+        to_tableaus = card_keys[:, :, None] & masks[:, None, found:] == keys[:, None, found:]
+        top_keys = card_keys[:, self.top_sources, None]
+        to_foundations = top_keys & masks[:, None, :found] == keys[:, None, :found]
+        columns = np.concatenate([self.can_draw()[:, None], self.flip_mask(),
+                                  to_tableaus.reshape(self.num_boards, -1),
+                                  to_foundations.reshape(self.num_boards, -1)], axis=1)
+        return columns[:, self.action_columns]
+
+
+    #============== Making moves ==============#
+
+    def step(self, actions):
+        """
+        makes one action per board (an array of num_boards action ids)
+        illegal actions leave their board alone
+        returns a bool array of which boards made their move
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        made = self.legal(actions[:, None])[:, 0]
+        kind = self.action_kind[actions]
+
+        self._draw(np.flatnonzero(made & (kind == DRAW)))
+        self._flip(np.flatnonzero(made & (kind == FLIP)), actions)
+        moves = np.flatnonzero(made & (kind == MOVE))
+        self._move(moves, actions[moves])
+
+        self.moves += made & (kind != FLIP)
+        return made
+
+    def _flip(self, boards, actions):
+        """
+        flips the top card of a tableau for every board in the index array boards
+        (like Board.attempt_move, a flip doesn't count as a move)
+        """
+        piles = self.action_source_pile[actions[boards]]
+        lengths = self.tableau_lengths[boards, piles]
+        self.tableaus[boards, piles, lengths - 1] |= FACE_UP
+
+    def _draw(self, boards):
+        """
+        same as Stock.deal_to_wp for every board in the index array boards
+        """
+        empty = self.stock_lengths[boards] == 0
+        self._recycle(boards[empty])
+        boards = boards[~empty]
+        if not self.deal_3:
+            self._deal_cards(boards, 1)
+        else:
+            full = self.stock_lengths[boards] > 2
+            self._deal_cards(boards[full], 3)
+            self._deal_remaining(boards[~full])
+
+    def _deal_cards(self, boards, num_cards):
+        # one card at a time, so the top of the stock ends up deepest in the waste
+        for i in range(num_cards):
+            self.waste[boards, self.waste_lengths[boards]] = self.stock[boards, self.stock_lengths[boards] - 1] | FACE_UP
+            self.stock_lengths[boards] -= 1
+            self.waste_lengths[boards] += 1
+
+    def _deal_remaining(self, boards):
+        # with fewer than 3 cards left, deal_3 moves them over as a single pile (order kept)
+        remaining = self.stock_lengths[boards]
+        for i in range(2):
+            some = boards[remaining > i]
+            self.waste[some, self.waste_lengths[some] + i] = self.stock[some, i] | FACE_UP
+        self.waste_lengths[boards] += remaining
+        self.stock_lengths[boards] = 0
+
+    def _recycle(self, boards):
+        # same as Wastepile.move_to_stock: reversed and flipped face down
+        positions = self.waste_lengths[boards][:, None] - 1 - np.arange(self.stock_size)
+        cards = np.take_along_axis(self.waste[boards], np.maximum(positions, 0), axis=1) & CODE_MASK
+        self.stock[boards] = np.where(positions >= 0, cards, 0)
+        self.stock_lengths[boards] = self.waste_lengths[boards]
+        self.waste_lengths[boards] = 0
+
+    def _move(self, boards, actions):
+        """
+        moves cards between two piles for every board in the index array boards
+        (the actions must already be known to be legal)
+        """
+        source_kind = self.action_source_kind[actions]
+        source_pile = self.action_source_pile[actions]
+        dest_pile = self.action_dest_pile[actions]
+        num_cards = self.action_num_cards[actions]
+        to_foundation = self.action_dest_kind[actions] == FOUNDATION
+
+        # every source except a tableau gives up one card
+        cards = np.zeros(len(boards), dtype=np.uint8)
+        from_waste = source_kind == WASTE
+        b = boards[from_waste]
+        self.waste_lengths[b] -= 1
+        cards[from_waste] = self.waste[b, self.waste_lengths[b]]
+        from_foundation = source_kind == FOUNDATION
+        b, p = boards[from_foundation], source_pile[from_foundation]
+        tops = self.foundations[b, p]
+        cards[from_foundation] = tops | FACE_UP
+        self.foundations[b, p] = np.where(RANK_VALUES[tops] == 1, EMPTY, tops - 1)
+
+        single = ~to_foundation & ~(source_kind == TABLEAU)
+        b, p = boards[single], dest_pile[single]
+        self.tableaus[b, p, self.tableau_lengths[b, p]] = cards[single]
+        self.tableau_lengths[b, p] += 1
+        single_found = to_foundation & ~(source_kind == TABLEAU)
+        self.foundations[boards[single_found], dest_pile[single_found]] = cards[single_found] & CODE_MASK
+
+        # tableau sources move num_cards cards from the top of the tableau
+        from_tableau = source_kind == TABLEAU
+        b, p, d, n = boards[from_tableau], source_pile[from_tableau], dest_pile[from_tableau], num_cards[from_tableau]
+        start = self.tableau_lengths[b, p] - n
+        found = to_foundation[from_tableau]
+        self.foundations[b[found], d[found]] = self.tableaus[b[found], p[found], start[found]] & CODE_MASK
+        b, p, d, n, start = b[~found], p[~found], d[~found], n[~found], start[~found]
+        for i in range(MAX_RUN):
+            some = n > i
+            self.tableaus[b[some], d[some], self.tableau_lengths[b[some], d[some]] + i] = (
+                self.tableaus[b[some], p[some], start[some] + i])
+        self.tableau_lengths[b, d] += n
+
+        b, p = boards[from_tableau], source_pile[from_tableau]
+        self.tableau_lengths[b, p] -= num_cards[from_tableau]
+        if self.auto_flip_tab:
+            b, p = b[self.tableau_lengths[b, p] != 0], p[self.tableau_lengths[b, p] != 0]
+            self.tableaus[b, p, self.tableau_lengths[b, p] - 1] |= FACE_UP
+
+
+    #============== Reading boards ==============#
+
+    def is_won(self):
+        """
+        same as Board.is_won for every board (cards left in the waste do not count)
+        """
+        return (self.stock_lengths == 0) & (self.tableau_lengths == 0).all(axis=1)
+
+    def action_to_move(self, action):
+        return list(self.actions[action])
+
+    def move_to_action(self, move_input):
+        """
+        returns the action id of an attempt_move style move, or None if it has none
+        """
+        return self.action_ids.get(tuple(move_input))
+
+    def position_codes(self, board):
+        """
+        returns the position of one board as a tuple of bytes:
+        (stock, waste, foundation tops, tableau 0, tableau 1, ...)
+        foundation tops are EMPTY or a code without FACE_UP
+        """
+        return ((bytes(self.stock[board, :self.stock_lengths[board]]),
+                 bytes(self.waste[board, :self.waste_lengths[board]]),
+                 bytes(self.foundations[board])) +
+                tuple(bytes(self.tableaus[board, tab, :self.tableau_lengths[board, tab]])
+                      for tab in range(self.num_tableaus)))
+
+    def load_board(self, board, source):
+        """
+        copies the position of a Board (or CompactBoard) into board number board
+        """
+        self.stock[board, :source.stock.get_length()] = list(source.stock.get_code_list())
+        self.stock_lengths[board] = source.stock.get_length()
+        self.waste[board, :source.wp.get_length()] = list(source.wp.get_code_list())
+        self.waste_lengths[board] = source.wp.get_length()
+        for i, fnd in enumerate(source.foundations):
+            self.foundations[board, i] = fnd.get_top_code() & CODE_MASK if fnd.get_length() != 0 else EMPTY
+        for i, tbl in enumerate(source.tableaus):
+            self.tableaus[board, i, :tbl.get_length()] = list(tbl.get_code_list())
+            self.tableau_lengths[board, i] = tbl.get_length()
+        self.moves[board] = source.moves
+
+    def to_board(self, board, board_class=Board):
+        """
+        returns a new Board (or board_class) with the position of board number board
+        it has no move history, so its moves can't be undone past this position
+        """
+        new_board = board_class(num_tableaus=self.num_tableaus, num_decks=self.num_decks,
+                                deal_3=self.deal_3, auto_flip_tab=self.auto_flip_tab)
+        new_board.init_move_dict()
+        position = self.position_codes(board)
+        for code in position[0]:
+            new_board.stock.add_card(card_from_code(code))
+        for code in position[1]:
+            new_board.wp.add_card(card_from_code(code))
+        for fnd, top in zip(new_board.foundations, position[2]):
+            if top != EMPTY:
+                for code in range(top - CODE_RANK_VALUES[top] + 1, top + 1):
+                    fnd.add_card(card_from_code(code | FACE_UP))
+        for tbl, codes in zip(new_board.tableaus, position[3:]):
+            for code in codes:
+                tbl.add_card(card_from_code(code))
+        new_board.moves = int(self.moves[board])
+        return new_board
+
+
+#============= FUNCTION DEFINITIONS =============#
+def pile_kind(key):
+    return {'W': WASTE, 'F': FOUNDATION, 'T': TABLEAU}[key[0]]
+
+
+def build_actions(num_tableaus=DEFAULT_TABLEAUS, num_foundations=DEFAULT_DECKS * 4):
+    """
+    returns the list of moves (in attempt_move format) that action ids stand for
+    moves that could never be legal (several cards to a foundation, or onto the
+    pile they came from) are left out
+    """
+    tableau_keys = ['T'+str(i) for i in range(num_tableaus)]
+    foundation_keys = ['F'+str(i) for i in range(num_foundations)]
+    actions = [list(STOCK_DRAW_MOVE)]
+    actions += [[key, 0, key] for key in tableau_keys]
+    for orig_key in ['W0'] + foundation_keys + tableau_keys:
+        max_index = MAX_RUN if orig_key[0] == 'T' else 1
+        for card_index in range(max_index):
+            for dest_key in foundation_keys + tableau_keys:
+                if dest_key != orig_key and (card_index == 0 or dest_key[0] == 'T'):
+                    actions.append([orig_key, card_index, dest_key])
+    return actions
+
+
+def deal_positions(num_tableaus, num_cards):
+    """
+    works out where Board.deal puts the cards of a deck of num_cards cards, as arrays
+    with one entry per tableau card, in the order they are dealt:
+    (tableau, position in the tableau, index in the deck, whether it is dealt face up)
+    the rest of the deck (indexes 0 up to the first one dealt) goes to the stock
+    """
+    lengths = [0] * num_tableaus
+    positions = []
+    next_card = num_cards - 1     # cards are pulled from the end of the deck
+    tab_num = 0
+    while lengths[-1] < num_tableaus:
+        if lengths[tab_num] < tab_num + 1:
+            positions.append((tab_num, lengths[tab_num], next_card, lengths[tab_num] == tab_num))
+            lengths[tab_num] += 1
+            next_card -= 1
+        tab_num = (tab_num + 1) % num_tableaus
+    return tuple(np.array(column) for column in zip(*positions))
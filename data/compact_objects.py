@@ -0,0 +1,203 @@
+"""
+a compact alternative to the pile and board classes in solitaire_objects.py
+
+every card is stored as a single byte (see the CODE_* definitions in
+deck_of_cards.py) and every pile is a bytearray, so a whole board only
+takes up a few hundred bytes and checking a move is a couple of table lookups
+
+CompactBoard has exactly the same API as Board. Card objects returned
+by the piles (get_topmost_card, get_card_list, etc.) are decoded copies,
+so flipping them will not change the board
+"""
+
+from .deck_of_cards import card_from_code, NUM_CARD_CODES, FACE_UP, CODE_MASK, CODE_RANK_VALUES
+from .solitaire_objects import (Pile, Stock, Wastepile, Foundation, Tableau, Board, SQUARED,
+                                FOUNDATION_NEXT, TABLEAU_ACCEPTS, zobrist_span, zobrist_flip)
+
+
+#============= GLOBAL DEFINITIONS =============#
+FLIPPED_CODES = bytes(code ^ FACE_UP for code in range(256))    # bytes.translate table that flips every card
+
+
+#============= CLASS DEFINITIONS =============#
+class CompactPile(Pile):
+    """
+    a Pile that keeps its cards as a bytearray of card codes
+    """
+    __slots__ = ()
+
+    def __init__(self, cards, stack_style=SQUARED):
+        self.cards = bytearray(cards)
+        self.stack_style = stack_style
+        self.zobrist_key = 0
+        self.shared = False
+        if self.zobrist_kind is not None and len(cards) != 0:
+            self.rehash()
+
+    def remove_cards(self, num_cards, flip_cards=False):
+        """
+        removes the num_cards amount from top (end) of pile
+        and returns them as another pile object
+        """
+        split = len(self.cards) - num_cards
+        temp_codes = self.cards[split:]
+        del self.cards[split:]
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, split, temp_codes)
+
+        if flip_cards:
+            for i in range(len(temp_codes)):
+                temp_codes[i] ^= FACE_UP
+
+        return CompactPile(temp_codes)
+
+    def merge_pile(self, pile_of_cards):
+        """
+        takes a pile object as input and adds it to the current pile
+        """
+        codes = pile_of_cards.cards if isinstance(pile_of_cards, CompactPile) else pile_of_cards.get_code_list()
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, len(self.cards), codes)
+        self.cards.extend(codes)
+
+    def move_cards(self, other_pile, num_cards, flip_cards=False, reverse=False):
+        """
+        same as Pile.move_cards (other_pile must be a CompactPile too)
+        """
+        if other_pile is self:
+            return
+        cards = self.cards
+        split = len(cards) - num_cards
+        moved = cards[split:]
+        del cards[split:]
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, split, moved)
+
+        if flip_cards:
+            moved = moved.translate(FLIPPED_CODES)
+        if reverse:
+            moved.reverse()
+
+        if other_pile.zobrist_kind is not None:
+            other_pile.zobrist_key ^= zobrist_span(other_pile.zobrist_kind, len(other_pile.cards), moved)
+        other_pile.cards += moved
+
+    def add_card(self, card):
+        """
+        takes a card object as input and adds it to the current pile
+        """
+        self.cards.append(card.get_code())
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, len(self.cards) - 1, self.cards[-1:])
+
+    def get_card_list(self):
+        """
+        returns the cards decoded as a new list of card objects
+        """
+        return [card_from_code(code) for code in self.cards]
+
+    def get_code_list(self):
+        return self.cards
+
+    def get_top_code(self):
+        return self.cards[-1]
+
+    def get_n_code(self, n):
+        return self.cards[-n]
+
+    def get_n_card(self, n):
+        if len(self.cards) > 0:
+            return card_from_code(self.cards[-n])
+        else:
+            return None
+
+    def get_topmost_card(self):
+        if len(self.cards) > 0:
+            return card_from_code(self.cards[-1])
+        else:
+            return None
+
+    def get_bottommost_card(self):
+        if len(self.cards) > 0:
+            return card_from_code(self.cards[0])
+        else:
+            return None
+
+    def flip_top_card(self):
+        self.cards[-1] ^= FACE_UP
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_flip(self.zobrist_kind, len(self.cards) - 1, self.cards[-1])
+
+
+class CompactStock(Stock, CompactPile):
+    __slots__ = ()
+
+
+class CompactWastepile(Wastepile, CompactPile):
+    __slots__ = ()
+
+
+class CompactFoundation(Foundation, CompactPile):
+    __slots__ = ()
+
+    def is_valid_placement(self, other_pile):
+        """
+        same rules as Foundation.is_valid_placement
+        """
+        if len(other_pile.cards) != 1:
+            return False
+        card = other_pile.cards[0] & CODE_MASK
+        if len(self.cards) == 0:
+            return CODE_RANK_VALUES[card] == 1
+        return FOUNDATION_NEXT[self.cards[-1] & CODE_MASK] == card
+
+    def can_accept(self, code, num_cards, height):
+        if num_cards != 1:
+            return False
+        if height == 0:
+            return CODE_RANK_VALUES[code] == 1
+        return FOUNDATION_NEXT[self.cards[height-1] & CODE_MASK] == code & CODE_MASK
+
+
+class CompactTableau(Tableau, CompactPile):
+    __slots__ = ()
+
+    def reveal_top_card(self):
+        if len(self.cards) != 0 and not self.cards[-1] & FACE_UP:
+            self.flip_top_card()
+            return True
+        return False
+
+    def is_fully_exposed(self):
+        for code in self.cards:
+            if not code & FACE_UP:
+                return False
+        return True
+
+    def is_valid_placement(self, other_pile):
+        """
+        same rules as Tableau.is_valid_placement
+        """
+        card = other_pile.cards[0] & CODE_MASK
+        if len(self.cards) == 0:
+            return CODE_RANK_VALUES[card] == 13
+        return TABLEAU_ACCEPTS[(self.cards[-1] & CODE_MASK) * NUM_CARD_CODES + card] == 1
+
+    def can_accept(self, code, num_cards, height):
+        if height == 0:
+            return CODE_RANK_VALUES[code] == 13
+        return TABLEAU_ACCEPTS[(self.cards[height-1] & CODE_MASK) * NUM_CARD_CODES + (code & CODE_MASK)] == 1
+
+    def is_valid_retrieval(self, card_index):
+        if len(self.cards) > card_index:
+            return bool(self.cards[-(card_index+1)] & FACE_UP)
+
+
+class CompactBoard(Board):
+    """
+    a Board that stores all of its piles as bytearrays
+    """
+    stock_class = CompactStock
+    wastepile_class = CompactWastepile
+    foundation_class = CompactFoundation
+    tableau_class = CompactTableau
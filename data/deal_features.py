@@ -0,0 +1,169 @@
+"""
+static features of dealt games, worked out for a whole batch of decks at once
+with NumPy arrays instead of dealing a Board per deck
+needs numpy (the rest of the game does not)
+
+Board.deal always puts a deck's cards in the same places (see
+batch_engine.deal_positions), so every feature is a lookup through a fixed
+map from deck index to tableau position, done for every deck in one go
+
+features (one int16 per deck, see DealFeatures.compute):
+    buried_aces         => aces dealt face down on the tableaus
+    ace_depth           => cards on top of the tableau aces, added up
+    buried_kings        => kings dealt face down with other cards under them
+                           (they need an empty tableau to be moved to)
+    low_card_depth      => cards on top of the tableau aces, twos and threes, added up
+    same_suit_blocks    => tableau cards on top of a lower card of their own suit
+                           (the lower card can't reach its foundation until the
+                           higher one has been moved to another tableau)
+    opening_moves       => face up tableau cards that can be moved at the start
+    stock_aces          => aces in the stock
+    reachable_aces      => aces that come to the top of the waste on the first
+                           trip through the stock (all of them with 1 card draws,
+                           only every third card with deal_3)
+    reachable_playable  => cards that come to the top of the waste on the first trip
+                           and can be played at the start (aces, or a card that goes
+                           on one of the face up tableau cards)
+
+example:
+    features = DealFeatures(deal_3=True)
+    columns = features.compute_seeds(seeds)
+    hard = columns['buried_kings'] + columns['same_suit_blocks'] > 6
+"""
+
+import numpy as np
+from . import seed_processor
+from .deck_of_cards import SUITS, NUM_CARD_CODES, CODE_MASK, CODE_SUITS
+from .solitaire_objects import DEFAULT_TABLEAUS, DEFAULT_DECKS
+from .batch_engine import ACCEPT, EMPTY, TABLEAU, RANK_VALUES, deal_positions
+
+
+#============= GLOBAL DEFINITIONS =============#
+FEATURES = ['buried_aces', 'ace_depth', 'buried_kings', 'low_card_depth', 'same_suit_blocks',
+            'opening_moves', 'stock_aces', 'reachable_aces', 'reachable_playable']
+LOW_RANK = 3                # the highest rank counted by low_card_depth
+SUIT_INDEXES = np.array([SUITS.index(CODE_SUITS[code]) if code < NUM_CARD_CODES else 0
+                         for code in range(CODE_MASK + 1)], dtype=np.uint8)
+
+
+#============= CLASS DEFINITIONS =============#
+class DealFeatures:
+    """
+    works out FEATURES for decks dealt with the given options
+    (every map from deck index to board position is built once, here)
+    """
+
+    def __init__(self, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS, deal_3=False):
+        self.num_tableaus = num_tableaus
+        self.num_decks = num_decks
+        self.deal_3 = deal_3
+        self.num_cards = NUM_CARD_CODES * num_decks
+        self.stock_size = self.num_cards - num_tableaus * (num_tableaus + 1) // 2
+        if self.stock_size < 0:
+            raise ValueError("not enough cards to deal out the tableaus")
+
+        # one entry per tableau card (a slot), in the order Board.deal deals them
+        tableau, position, self.slot_deck_index, exposed = deal_positions(num_tableaus, self.num_cards)
+        self.slot_depth = (tableau - position).astype(np.int16)     # tableau i is dealt i + 1 cards
+        self.slot_down = ~exposed
+        self.slot_buried = self.slot_down & (position != 0)
+        self.top_deck_index = self.slot_deck_index[exposed][np.argsort(tableau[exposed])]
+        # every (upper, lower) pair of slots in the same tableau
+        upper, lower = np.nonzero((tableau[:, None] == tableau[None, :]) & (position[:, None] > position[None, :]))
+        self.upper_slots = upper
+        self.lower_slots = lower
+        self.reachable_stock = np.array(first_pass_tops(self.stock_size, deal_3), dtype=np.intp)
+
+    def compute(self, codes):
+        """
+        returns {feature name: int16 array with one value per deck}
+        codes is an array (or list of bytes) of card codes, one deck per row,
+        in the same order as Deck.cards (face up or down)
+        """
+        if isinstance(codes, np.ndarray):
+            codes = codes.reshape(-1, self.num_cards) & CODE_MASK
+        else:
+            codes = np.frombuffer(b''.join(codes), dtype=np.uint8).reshape(-1, self.num_cards) & CODE_MASK
+
+        slots = codes[:, self.slot_deck_index]
+        ranks = RANK_VALUES[slots]
+        aces = ranks == 1
+        suits = SUIT_INDEXES[slots]
+        upper_ranks = ranks[:, self.upper_slots]
+        lower_ranks = ranks[:, self.lower_slots]
+        blocks = (suits[:, self.upper_slots] == suits[:, self.lower_slots]) & (upper_ranks > lower_ranks)
+
+        # a face up card can be moved at the start if it is an ace or goes on another face up card
+        tops = codes[:, self.top_deck_index]
+        fits = ACCEPT[TABLEAU * (EMPTY + 1) + tops[:, None, :], tops[:, :, None]]   # [deck, card, destination]
+        movable = (RANK_VALUES[tops] == 1) | fits.any(axis=2)
+
+        reachable = codes[:, self.reachable_stock]
+        reachable_aces = RANK_VALUES[reachable] == 1
+        playable = ACCEPT[TABLEAU * (EMPTY + 1) + tops[:, None, :], reachable[:, :, None]].any(axis=2)
+
+        columns = {
+            'buried_aces': (aces & self.slot_down).sum(axis=1),
+            'ace_depth': (aces * self.slot_depth).sum(axis=1),
+            'buried_kings': ((ranks == 13) & self.slot_buried).sum(axis=1),
+            'low_card_depth': ((ranks <= LOW_RANK) * self.slot_depth).sum(axis=1),
+            'same_suit_blocks': blocks.sum(axis=1),
+            'opening_moves': movable.sum(axis=1),
+            'stock_aces': (RANK_VALUES[codes[:, :self.stock_size]] == 1).sum(axis=1),
+            'reachable_aces': reachable_aces.sum(axis=1),
+            'reachable_playable': (reachable_aces | playable).sum(axis=1),
+        }
+        return {name: columns[name].astype(np.int16) for name in FEATURES}
+
+    def compute_seeds(self, seeds):
+        """
+        compute for a list of seeds (see seed_processor.py)
+        """
+        return self.compute(seeds_to_codes(seeds, self.num_decks))
+
+    def compute_ids(self, deal_ids):
+        """
+        compute for a list of deal ids (see seed_processor.deal_codes)
+        """
+        return self.compute([seed_processor.deal_codes(deal_id, self.num_decks) for deal_id in deal_ids])
+
+
+#============= FUNCTION DEFINITIONS =============#
+def first_pass_tops(stock_size, deal_3=False):
+    """
+    returns the stock indexes of the cards that come to the top of the waste on the
+    first trip through a full stock of stock_size cards, in the order they do
+    (following Stock.deal_to_wp: the top of the stock is the last index)
+    """
+    stock = list(range(stock_size))
+    tops = []
+    while len(stock) != 0:
+        if not deal_3:
+            tops.append(stock.pop())
+        elif len(stock) > 2:
+            tops.append(stock[-3])
+            del stock[-3:]
+        else:
+            tops.append(stock[-1])     # the last one or two cards are moved over together
+            stock = []
+    return tops
+
+
+def seeds_to_codes(seeds, num_decks=DEFAULT_DECKS):
+    """
+    returns the card codes of a list of seeds as a uint8 array, one deck per row
+    every seed is checked to hold its decks exactly once (like seed_processor.validate_seed),
+    all at once, and a ValueError names the first one that doesn't
+    """
+    num_cards = NUM_CARD_CODES * num_decks
+    text = ''.join(seed_processor.split_seed(seed)[1] for seed in seeds).encode('ascii', 'replace')
+    codes = np.frombuffer(text.translate(seed_processor.CHAR_CODES), dtype=np.uint8)
+    if len(codes) == len(seeds) * num_cards:
+        codes = codes.reshape(len(seeds), num_cards)
+        full_deck = np.repeat(np.arange(NUM_CARD_CODES, dtype=np.uint8), num_decks)
+        if not (np.sort(codes, axis=1) != full_deck).any():
+            return codes
+    for seed in seeds:
+        if seed_processor.seed_decks(seed) != num_decks or not seed_processor.is_valid_seed(seed):
+            raise ValueError(f"seed does not hold {num_decks} full deck(s): {seed!r}")
+    raise ValueError(f"seeds do not hold {num_decks} full deck(s) each")
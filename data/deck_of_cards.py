@@ -10,6 +10,19 @@ COLORS = {"H": "red",
           "D": "red",
           "C": "black"}
 
+# every card can also be encoded as a small integer (fits in one byte):
+# suit index * 13 + rank value - 1, plus FACE_UP if the card is exposed
+NUM_CARD_CODES = 52
+FACE_UP = 64
+CODE_MASK = 63
+CODE_SUITS = [SUITS[code // 13] if code < NUM_CARD_CODES else None for code in range(FACE_UP)] * 2
+CODE_RANKS = [RANKS[code % 13] if code < NUM_CARD_CODES else None for code in range(FACE_UP)] * 2
+CODE_RANK_VALUES = [code % 13 + 1 if code < NUM_CARD_CODES else 0 for code in range(FACE_UP)] * 2
+CODE_COLORS = [COLORS[suit] if suit is not None else None for suit in CODE_SUITS]
+# what str(card) gives for every code ('--' for face down cards)
+CODE_NAMES = ['--'] * FACE_UP + [f'{CODE_RANKS[code]}{CODE_SUITS[code]}' if code < NUM_CARD_CODES else None
+                                 for code in range(FACE_UP)]
+
 
 #============= CLASS DEFINITIONS =============#
 class Card:
@@ -17,13 +30,16 @@ class Card:
     many of the methods here are present to avoid
     accessing an internal variable externally
     """
-    
+    __slots__ = ('suit', 'rank', 'exposed', 'color', 'rank_value', 'code', 'twin')
+
     def __init__(self, suit, rank, exposed=False):
         self.suit = suit
         self.rank = rank
         self.exposed = exposed
         self.color = COLORS[self.suit]
         self.rank_value = RANK_VALUES[self.rank]
+        self.code = SUITS.index(self.suit) * 13 + self.rank_value - 1
+        self.twin = None    # the same card flipped the other way (see flipped)
 
     def get_suit(self):
         return self.suit
@@ -46,6 +62,25 @@ class Card:
     def flip_card(self):
         self.exposed = not self.exposed
 
+    def flipped(self):
+        """
+        returns this card flipped over as another Card object, made the first
+        time it is needed and reused after that
+        piles on a board flip cards by swapping them for their flipped twin instead
+        of calling flip_card, so a card object never changes once it is on a board
+        and boards forked from one another can share them (see Board.fork)
+        """
+        if self.twin is None:
+            self.twin = Card(self.suit, self.rank, not self.exposed)
+            self.twin.twin = self
+        return self.twin
+
+    def get_code(self):
+        """
+        returns the card encoded as a single integer (see CODE_* definitions)
+        """
+        return self.code | FACE_UP if self.exposed else self.code
+
     def can_move(self):
         """
         method to determine if this card has a legal move somewhere on board
@@ -89,11 +124,12 @@ class Deck:
         else:
             self.cards = seed_to_list(custom_seed)
 
-    def shuffle(self):
-        temp_list = []
-        for i in range(len(self.cards)):
-            temp_list.append(self.cards.pop(random.randrange(len(self.cards))))
-        self.cards = temp_list
+    def shuffle(self, rng=None):
+        """
+        shuffles the cards with rng (a random.Random) if one is given,
+        otherwise with the global random module
+        """
+        (random if rng is None else rng).shuffle(self.cards)
 
     def pull_card(self, expose=False):
         if expose:
@@ -115,6 +151,15 @@ class Deck:
             for card in temp_list:
                 card.flip_card() 
 
+    def copy(self):
+        """
+        returns a new deck with new card objects in the same order
+        (much faster than copy.deepcopy)
+        """
+        new_deck = Deck.__new__(Deck)
+        new_deck.cards = [Card(card.suit, card.rank, card.exposed) for card in self.cards]
+        return new_deck
+
     def combine_decks(self, other_deck):
         """
         combines all the cards from other_deck into this deck
@@ -131,3 +176,11 @@ class Deck:
 
     def __str__(self):
         return str([f'{card}' for card in self.cards])
+
+
+#============= FUNCTION DEFINITIONS =============#
+def card_from_code(code):
+    """
+    returns a new Card object from an integer made by Card.get_code
+    """
+    return Card(CODE_SUITS[code], CODE_RANKS[code], bool(code & FACE_UP))
@@ -0,0 +1,363 @@
+"""
+reinforcement learning environments with the reset/step interface of gym
+(gym itself is not needed, but numpy is)
+
+actions are integers: action i is the move batch_engine.build_actions()[i],
+which covers the stock draw, flipping a tableau card and every
+['RX', Y, 'DZ'] move between two different piles
+
+observations are one preallocated int16 array per env (see ObservationLayout):
+    stock length, waste length, the top WASTE_SHOWN waste cards (top first),
+    foundation tops, then every tableau slot from the bottom card up
+cards are their card code (see deck_of_cards.py), face down cards are HIDDEN
+and slots with no card are NO_CARD_SLOT
+
+the reward for a step is how many cards were added to (or taken off) the foundations,
+so a won game adds up to the number of cards in play
+
+examples:
+    env = SolitaireEnv()
+    observation, info = env.reset(seed=12345)       # seed is the deal id (or a seed string)
+    observation, reward, terminated, truncated, info = env.step(action)
+
+    envs = SolitaireVectorEnv(1024, workers=4)
+    observations, info = envs.reset(seed=0)
+    observations, rewards, terminated, truncated, info = envs.step(actions)
+    envs.close()
+"""
+
+import multiprocessing
+import random
+import numpy as np
+from .compact_objects import CompactBoard
+from .deck_of_cards import NUM_CARD_CODES, FACE_UP, CODE_MASK
+from .solitaire_objects import DEFAULT_TABLEAUS, DEFAULT_DECKS
+from .batch_engine import BatchBoard, build_actions, MAX_RUN, RANK_VALUES
+from . import seed_processor
+
+
+#============= GLOBAL DEFINITIONS =============#
+NO_CARD_SLOT = NUM_CARD_CODES
+HIDDEN = NUM_CARD_CODES + 1
+WASTE_SHOWN = 3
+DEFAULT_MAX_MOVES = 1000
+
+STOCK_LENGTH = 0
+WASTE_LENGTH = 1
+
+# what a card code on the board looks like in an observation
+OBS_CODES = np.array([HIDDEN if code < FACE_UP else code & CODE_MASK for code in range(2 * FACE_UP)], dtype=np.int16)
+
+
+#============= CLASS DEFINITIONS =============#
+class ObservationLayout:
+    """
+    where everything is in an observation array for a number of tableaus and decks
+    waste, foundations and tableaus are slices, tableau_slots is how many
+    slots each tableau has
+    """
+
+    def __init__(self, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS):
+        self.tableau_slots = num_tableaus - 1 + MAX_RUN
+        self.waste = slice(2, 2 + WASTE_SHOWN)
+        self.foundations = slice(self.waste.stop, self.waste.stop + num_decks * 4)
+        self.tableaus = slice(self.foundations.stop, self.foundations.stop + num_tableaus * self.tableau_slots)
+        self.size = self.tableaus.stop
+
+    def tableau(self, index):
+        start = self.tableaus.start + index * self.tableau_slots
+        return slice(start, start + self.tableau_slots)
+
+
+class SolitaireEnv:
+    """
+    a single game, played on a CompactBoard
+    observation and legal_mask are updated in place by reset and step
+    (copy them if they need to be kept)
+    """
+
+    def __init__(self, deal_3=False, auto_flip_tab=True, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS,
+                 max_moves=DEFAULT_MAX_MOVES):
+        self.options = {'deal_3': deal_3, 'auto_flip_tab': auto_flip_tab, 'num_tableaus': num_tableaus, 'num_decks': num_decks}
+        self.max_moves = max_moves
+        self.actions = build_actions(num_tableaus, num_decks * 4)
+        self.action_ids = {tuple(move): action for action, move in enumerate(self.actions)}
+        self.num_actions = len(self.actions)
+        self.layout = ObservationLayout(num_tableaus, num_decks)
+        self.observation = np.zeros(self.layout.size, dtype=np.int16)
+        self.legal_mask = np.zeros(self.num_actions, dtype=bool)
+        self.rng = random.Random()
+        self.board = None
+        self.seed = None
+
+    def reset(self, seed=None):
+        """
+        starts a new game and returns (observation, info)
+        seed picks the deal: an integer deal id or a seed string (see seed_processor.py)
+        without one, a random deal id is used
+        """
+        if seed is None:
+            seed = self.rng.randrange(seed_processor.MAX_DEAL_ID + 1)
+        if isinstance(seed, int):
+            seed = seed_processor.deal_to_seed(seed, self.options['num_decks'])
+        self.seed = seed
+        self.board = CompactBoard(**self.options)
+        self.board.init_move_dict()
+        self.board.deal(seed_processor.seed_to_deck(seed))
+        self.board.pop_changed_piles()
+
+        self.update_observation(None)
+        self.update_legal_mask()
+        return self.observation, {'legal_mask': self.legal_mask, 'seed': self.seed}
+
+    def step(self, action):
+        """
+        makes the move for an action id
+        returns (observation, reward, terminated, truncated, info)
+        an illegal action changes nothing (info['made'] is False)
+        """
+        made = bool(self.legal_mask[action])
+        reward = 0
+        if made:
+            before = self.foundation_cards()
+            self.board.attempt_move(self.actions[action])
+            reward = self.foundation_cards() - before
+            self.update_observation(self.board.pop_changed_piles())
+            self.update_legal_mask()
+
+        terminated = self.board.is_won()
+        truncated = not terminated and self.board.moves >= self.max_moves
+        return self.observation, reward, terminated, truncated, {'legal_mask': self.legal_mask, 'made': made}
+
+    def foundation_cards(self):
+        return sum(fnd.get_length() for fnd in self.board.foundations)
+
+    def update_observation(self, changed_piles):
+        """
+        rewrites the parts of the observation for the piles in changed_piles
+        (every pile if it is None)
+        """
+        obs = self.observation
+        board = self.board
+        if changed_piles is None or 'S0' in changed_piles or 'W0' in changed_piles:
+            obs[STOCK_LENGTH] = board.stock.get_length()
+            obs[WASTE_LENGTH] = board.wp.get_length()
+            top_cards = OBS_CODES[np.frombuffer(board.wp.get_code_list(), dtype=np.uint8)[::-1][:WASTE_SHOWN]]
+            obs[self.layout.waste] = NO_CARD_SLOT
+            obs[self.layout.waste.start:self.layout.waste.start + len(top_cards)] = top_cards
+
+        for i, fnd in enumerate(board.foundations):
+            if changed_piles is None or 'F'+str(i) in changed_piles:
+                obs[self.layout.foundations.start + i] = fnd.get_top_code() & CODE_MASK if fnd.get_length() != 0 else NO_CARD_SLOT
+        for i, tbl in enumerate(board.tableaus):
+            if changed_piles is None or 'T'+str(i) in changed_piles:
+                slots = obs[self.layout.tableau(i)]
+                slots[:] = NO_CARD_SLOT
+                slots[:tbl.get_length()] = OBS_CODES[np.frombuffer(tbl.get_code_list(), dtype=np.uint8)]
+
+    def update_legal_mask(self):
+        self.legal_mask[:] = False
+        for move in self.board.legal_moves():
+            self.legal_mask[self.action_ids[tuple(move)]] = True
+
+    def action_to_move(self, action):
+        return list(self.actions[action])
+
+    def move_to_action(self, move_input):
+        return self.action_ids.get(tuple(move_input))
+
+    def render(self):
+        return str(self.board)
+
+
+class BatchEnv:
+    """
+    the envs of a SolitaireVectorEnv (or of one of its worker processes), played on a
+    BatchBoard, writing into the arrays it is given
+    outputs => dict of 'observations', 'legal_masks', 'rewards', 'terminated', 'truncated'
+    """
+
+    def __init__(self, num_envs, outputs, board_options, max_moves=DEFAULT_MAX_MOVES, seed=None):
+        self.boards = BatchBoard(num_envs, **board_options)
+        self.outputs = outputs
+        self.max_moves = max_moves
+        self.layout = ObservationLayout(self.boards.num_tableaus, self.boards.num_decks)
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, deal_ids=None, seed=None):
+        """
+        deals every env: the deal ids given, or ones picked by a generator seeded with seed
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        if deal_ids is None:
+            deal_ids = self.random_deal_ids(self.boards.num_boards)
+        self.boards.deal_ids(deal_ids)
+        self.outputs['rewards'][:] = 0
+        self.outputs['terminated'][:] = False
+        self.outputs['truncated'][:] = False
+        self.update_outputs()
+
+    def step(self, actions):
+        """
+        steps every env, and deals a new game to every env that finished
+        (so the observation returned for it is the start of its next game)
+        """
+        boards = self.boards
+        before = RANK_VALUES[boards.foundations].sum(axis=1, dtype=np.int16)
+        boards.step(actions)
+        self.outputs['rewards'][:] = RANK_VALUES[boards.foundations].sum(axis=1, dtype=np.int16) - before
+        terminated = boards.is_won()
+        truncated = ~terminated & (boards.moves >= self.max_moves)
+        self.outputs['terminated'][:] = terminated
+        self.outputs['truncated'][:] = truncated
+
+        finished = np.flatnonzero(terminated | truncated)
+        if len(finished) != 0:
+            boards.deal_ids(self.random_deal_ids(len(finished)), finished)
+        self.update_outputs()
+
+    def random_deal_ids(self, count):
+        return [int(deal_id) for deal_id in self.rng.integers(0, seed_processor.MAX_DEAL_ID, count, dtype=np.uint64, endpoint=True)]
+
+    def update_outputs(self):
+        """
+        writes every observation (same layout as SolitaireEnv) and legal mask
+        """
+        boards = self.boards
+        obs = self.outputs['observations']
+        rows = np.arange(boards.num_boards)
+        obs[:, STOCK_LENGTH] = boards.stock_lengths
+        obs[:, WASTE_LENGTH] = boards.waste_lengths
+        for i in range(WASTE_SHOWN):
+            positions = boards.waste_lengths - 1 - i
+            obs[:, self.layout.waste.start + i] = np.where(positions >= 0, OBS_CODES[boards.waste[rows, np.maximum(positions, 0)]],
+                                                           NO_CARD_SLOT)
+        obs[:, self.layout.foundations] = boards.foundations     # EMPTY is the same as NO_CARD_SLOT
+        slots = np.arange(self.layout.tableau_slots)
+        tableaus = np.where(slots >= boards.tableau_lengths[:, :, None], NO_CARD_SLOT, OBS_CODES[boards.tableaus])
+        obs[:, self.layout.tableaus] = tableaus.reshape(boards.num_boards, -1)
+        self.outputs['legal_masks'][:] = boards.legal_mask()
+
+
+class SolitaireVectorEnv:
+    """
+    num_envs games stepped together
+    with workers=0 every game is in this process (one BatchBoard), otherwise the games
+    are split between that many worker processes, which write their results into
+    shared memory so nothing but the actions is sent between processes
+    observations, legal_masks, rewards, terminated and truncated are arrays with
+    one row per env, updated in place by reset and step
+    """
+
+    def __init__(self, num_envs, workers=0, deal_3=False, auto_flip_tab=True, num_tableaus=DEFAULT_TABLEAUS,
+                 num_decks=DEFAULT_DECKS, max_moves=DEFAULT_MAX_MOVES, seed=None):
+        board_options = {'deal_3': deal_3, 'auto_flip_tab': auto_flip_tab, 'num_tableaus': num_tableaus, 'num_decks': num_decks}
+        self.num_envs = num_envs
+        self.actions = build_actions(num_tableaus, num_decks * 4)
+        self.num_actions = len(self.actions)
+        self.layout = ObservationLayout(num_tableaus, num_decks)
+        self.shapes = {'observations': ((num_envs, self.layout.size), np.int16),
+                       'legal_masks': ((num_envs, self.num_actions), np.bool_),
+                       'rewards': ((num_envs,), np.int16),
+                       'terminated': ((num_envs,), np.bool_),
+                       'truncated': ((num_envs,), np.bool_)}
+        self.workers = []
+
+        if workers == 0:
+            self.outputs = {name: np.zeros(shape, dtype) for name, (shape, dtype) in self.shapes.items()}
+            self.local_env = BatchEnv(num_envs, self.outputs, board_options, max_moves, seed)
+        else:
+            self.local_env = None
+            buffers = {name: multiprocessing.RawArray('b', int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                       for name, (shape, dtype) in self.shapes.items()}
+            self.outputs = shared_arrays(buffers, self.shapes)
+            bounds = np.linspace(0, num_envs, workers + 1).astype(int)
+            self.slices = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+            for i, env_slice in enumerate(self.slices):
+                parent_end, worker_end = multiprocessing.Pipe()
+                worker_seed = None if seed is None else [seed, i]
+                process = multiprocessing.Process(target=run_worker, daemon=True,
+                                                  args=(worker_end, buffers, self.shapes, env_slice,
+                                                        board_options, max_moves, worker_seed))
+                process.start()
+                worker_end.close()
+                self.workers.append((process, parent_end))
+
+        self.observations = self.outputs['observations']
+        self.legal_masks = self.outputs['legal_masks']
+        self.rewards = self.outputs['rewards']
+        self.terminated = self.outputs['terminated']
+        self.truncated = self.outputs['truncated']
+
+    def reset(self, seed=None, deal_ids=None):
+        """
+        deals every env and returns (observations, info)
+        deal_ids gives the deal id for every env, otherwise they are picked at random
+        (reproducibly if seed is given)
+        """
+        if self.local_env is not None:
+            self.local_env.reset(deal_ids, seed)
+        else:
+            for i, (env_slice, (process, pipe)) in enumerate(zip(self.slices, self.workers)):
+                pipe.send(('reset', None if deal_ids is None else list(deal_ids)[env_slice],
+                           None if seed is None else [seed, i]))
+            self.wait_for_workers()
+        return self.observations, {'legal_mask': self.legal_masks}
+
+    def step(self, actions):
+        """
+        makes one action per env, returns (observations, rewards, terminated, truncated, info)
+        envs that finish are dealt a new game straight away
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        if self.local_env is not None:
+            self.local_env.step(actions)
+        else:
+            for env_slice, (process, pipe) in zip(self.slices, self.workers):
+                pipe.send(('step', actions[env_slice], None))
+            self.wait_for_workers()
+        return self.observations, self.rewards, self.terminated, self.truncated, {'legal_mask': self.legal_masks}
+
+    def wait_for_workers(self):
+        for process, pipe in self.workers:
+            reply = pipe.recv()
+            if reply is not None:
+                raise RuntimeError(f'solitaire env worker failed:\n{reply}')
+
+    def close(self):
+        for process, pipe in self.workers:
+            pipe.send(('close', None, None))
+            process.join()
+        self.workers = []
+
+
+#============= FUNCTION DEFINITIONS =============#
+def shared_arrays(buffers, shapes, env_slice=slice(None)):
+    """
+    returns numpy views of the shared buffers (rows in env_slice only)
+    """
+    return {name: np.frombuffer(buffers[name], dtype=dtype).reshape(shape)[env_slice]
+            for name, (shape, dtype) in shapes.items()}
+
+
+def run_worker(pipe, buffers, shapes, env_slice, board_options, max_moves, seed):
+    """
+    the loop of a SolitaireVectorEnv worker process
+    every command is answered with None, or the traceback if it failed
+    """
+    import traceback
+    outputs = shared_arrays(buffers, shapes, env_slice)
+    env = BatchEnv(env_slice.stop - env_slice.start, outputs, board_options, max_moves, seed)
+    while True:
+        command, data, seed = pipe.recv()
+        if command == 'close':
+            return
+        try:
+            if command == 'reset':
+                env.reset(data, seed)
+            elif command == 'step':
+                env.step(data)
+            pipe.send(None)
+        except Exception:
+            pipe.send(traceback.format_exc())
@@ -1,19 +1,17 @@
 """
 this will be the main module that will be used as an API
+it never imports pygame, the GUI lives in gui.py and is only loaded when used
 solitaire glossary: https://semicolon.com/Solitaire/Rules/Glossary.html
 scoring information: http://hands.com/~lkcl/hp6915/Dump/Files/soltr.htm 
 
 """
 
-import sys
-import os
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
-import pygame
-import time
 import copy
 import data.seed_processor
 from .solitaire_objects import Board
-from .deck_of_cards import Deck, SUITS, RANKS, RANK_VALUES
+from .compact_objects import CompactBoard
+from .deck_of_cards import Deck, CODE_NAMES
+from .instrumentation import Stats, instrument_board, uninstrument_board, DEFAULT_DUMP_INTERVAL
 
 
 #============= GLOBAL DEFINITIONS =============#
@@ -21,40 +19,6 @@ DEFAULT_DECKS = 1
 DEFAULT_TABLEAUS = 7
 
 
-# PyGame-Related Globals
-WIDTH = 1500
-HEIGHT = 1000
-
-STOCK_POS = (50, 100)
-STOCK_SPACING = 3
-MAX_STOCK_DISPLAYED = 23
-
-WASTE_POS = (325, 100)
-WASTE_SPACING = 40
-
-FOUND_START_POS = (650, 100)
-TABLEAU_START_POS = (50, 350)
-CARD_HORI_DIST = 60
-CARD_VERT_DIST = 40
-
-CARD_HEIGHT = 190
-CARD_WIDTH = 140
-
-MAT_IMG = 'assets/board.png'
-CARD_BACK = 'assets/cards/cardBack_blue5.png'
-CARD_BLANK = 'assets/cards/cardBlank2.png'
-CARD_PREFIX = 'assets/cards/card'
-CARD_SUFFIX = '.png'
-CARD_STRINGS = {'H': 'Hearts', 'S': 'Spades', 'D': 'Diamonds', 'C': 'Clubs',
-                'A': 'A', '2': '2', '3': '3', '4': '4', '5': '5', '6': '6',
-                '7': '7', '8': '8', '9': '9', 'T': '10', 'J': 'J', 'Q': 'Q',
-                'K': 'K'}
-
-FONT_FILE = 'assets/OpenSans-Regular.ttf'
-FONT_SIZE = 40
-DEFAULT_TEXT_COLOR = (0, 0, 0)
-
-
 #============= CLASS DEFINITIONS =============#
 class Game:
     """
@@ -71,8 +35,9 @@ class Game:
         api_use is only True if this module will be used as an API
         """
         self.api_use = api_use
+        self.stats = None   # see api_enable_stats
 
-    def new_game(self, deal_3=False, auto_flip_tab=True, decks=DEFAULT_DECKS, tableau_qty=DEFAULT_TABLEAUS, custom_seed=None, commandline=False):
+    def new_game(self, deal_3=False, auto_flip_tab=True, decks=DEFAULT_DECKS, tableau_qty=DEFAULT_TABLEAUS, custom_seed=None, commandline=False, compact=False, auto_complete=False, auto_play=False):
         """
         initializes a new game
         deal_3 is a boolean that determines whether the stock draws 3 or 1 card at a time
@@ -81,23 +46,38 @@ class Game:
         decks is an integer that determines how many decks worth of cards to play with
         tableau_qty is an integer that determines how man tableaus to play with (each
             tableau is dealt out cards equal to what number tableau it is)
+        custom_seed is either a seed string or an integer deal id (see seed_processor.py)
+            to deal the same deck every time. a seed string sets the number of decks
+        compact is a boolean that determines whether the board stores its cards
+            as bytes (CompactBoard) instead of card objects, which saves memory
+        auto_complete is a boolean that determines whether every card left goes to the
+            foundations by itself once the game can no longer be lost (see Board.auto_complete)
+        auto_play is a boolean that determines whether cards that can never be needed
+            on the tableaus again go to the foundations by themselves (see Board.auto_play)
         """
         self.deal_3 = deal_3
         self.auto_flip_tab = auto_flip_tab
         self.decks = decks
         self.tableau_qty = tableau_qty
         self.commandline = commandline
+        self.compact = compact
+        self.auto_complete = auto_complete
+        self.auto_play = auto_play
         self.deck = self._init_decks(custom_seed)
-        self.backup_deck = copy.deepcopy(self.deck)
+        self.backup_deck = self.deck.copy()
         self.start_game()
 
     def start_game(self):
         """
         starts the game with settings from new_game method
         """
-        self.board = Board(num_tableaus=self.tableau_qty, num_decks=self.decks, deal_3=self.deal_3)
+        board_class = CompactBoard if self.compact else Board
+        self.board = board_class(num_tableaus=self.tableau_qty, num_decks=self.decks, deal_3=self.deal_3)
         self.board.init_move_dict()
         self.board.deal(self.deck)
+        self.snapshot = None
+        if self.stats is not None:
+            instrument_board(self.board, self.stats)
 
         if self.api_use:
             self.init_game_api()
@@ -110,6 +90,16 @@ class Game:
     #============== API-Related Methods ==============#
 
     def init_game_api(self):
+        """
+        nothing needs set up for an API game (and nothing is printed,
+        since API games are often played thousands at a time)
+        """
+        pass
+
+    def api_print_help(self):
+        """
+        prints out how to use the API
+        """
         print("Game is now started")
         print("Provide moves via the method .make_move()")
         print("The method return True if the move was successful and False if not")
@@ -124,12 +114,63 @@ class Game:
     def api_make_move(self, move_input):
         """
         just calls the board's attemp move method and returns successful or not
+        with auto_play or auto_complete on, the cards they move join the move,
+        so undoing it takes them back too
+        """
+        moves = self.board.moves
+        successful = self.board.attempt_move(move_input)
+        if (self.auto_play or self.auto_complete) and self.board.moves > moves:
+            if self.auto_play:
+                self.board.auto_play(join_move=True)
+            if self.auto_complete:
+                self.board.auto_complete(join_move=True)
+        return successful
+
+    def api_fork(self):
+        """
+        returns a new API Game in the same position as this one, whose moves
+        don't change this game (see Board.fork), for trying out moves in a search
+        the fork has no undo history, and stats are off for it
+        """
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        game.api_use = True
+        game.stats = None
+        game.snapshot = None
+        game.__dict__.pop('window', None)
+        game.board = self.board.fork()
+        return game
+
+    def api_make_moves(self, moves, atomic=True, batch_undo=False):
         """
-        return self.board.attempt_move(move_input)
+        makes a whole list of moves at once and returns the index of the first
+        move that was turned down (None if every move was made)
+        atomic => if a move is turned down, the game goes back to where it was
+            before the first move
+        batch_undo => the moves count as one move that a single undo takes back
+        (auto_play and auto_complete are not applied in between, so a list of
+        moves recorded without them plays back the same)
+        """
+        return self.board.make_moves(moves, atomic, batch_undo)
+
+    def api_auto_complete(self):
+        """
+        moves every card left to the foundations if the game can no longer be lost,
+        as one move (one undo takes it back)
+        returns how many cards were moved
+        """
+        return self.board.auto_complete()
 
     def api_undo_move(self):
         self.board.attempt_move(['UN', 0, 'UN'])
 
+    def api_get_legal_moves(self):
+        """
+        returns a list of every move that api_make_move would currently accept
+        (see Board.legal_moves), without making any of them
+        """
+        return self.board.legal_moves()
+
     def api_restart_game(self, reshuffle_deck=True):
         """
         restarts the game with the option to shuffle a new deck.
@@ -160,24 +201,74 @@ class Game:
         """returns how many moves has been made so far"""
         return self.board.moves
 
+    def api_get_version(self):
+        """
+        returns a number that goes up every time the board changes (including undos),
+        so a caller can skip reading the board when it hasn't changed
+        """
+        return self.board.version
+
+    def api_snapshot(self):
+        """
+        returns a read-only BoardSnapshot (see solitaire_objects.py) of the board:
+        version, moves, stock, waste, foundations and tableaus, with every pile as
+        bytes of card codes (bottom card first, face down cards are HIDDEN_CODE,
+        see deck_of_cards.py for the codes)
+        the same snapshot is returned until the board changes
+        """
+        if self.snapshot is None or self.snapshot.version != self.board.version:
+            self.snapshot = self.board.snapshot(self.snapshot)
+        return self.snapshot
+
     def api_read_stock(self):
         """returns an integer of how many cards are left in the stock"""
-        return self.board.stock.get_length()
+        return len(self.api_snapshot().stock)
 
     def api_read_waste_pile(self):
         """returns a list of strings that represent what cards are in the waste"""
-        return [str(card) for card in self.board.wp.cards] if self.board.wp.get_length() > 0 else ['None']
+        waste = self.api_snapshot().waste
+        return [CODE_NAMES[code] for code in waste] if len(waste) > 0 else ['None']
 
     def api_read_foundations(self):
         """returns a list of strings that represent what top level cards are in the foundations"""
-        return [str(found.get_topmost_card()) for found in self.board.foundations]
+        return [CODE_NAMES[found[-1]] if len(found) > 0 else 'None' for found in self.api_snapshot().foundations]
 
     def api_read_tableaus(self):
         """
         returns a list of lists, with each enclosed list representing a single tableau and its cards
         NOTE: tableau index 0 is furthest left pile and the card index 0 is the very top card on the pile
         """
-        return [[str(card) for card in tableau.cards][::-1] for tableau in self.board.tableaus]
+        return [[CODE_NAMES[code] for code in reversed(tableau)] for tableau in self.api_snapshot().tableaus]
+
+    def api_enable_stats(self, dump_path=None, dump_interval=DEFAULT_DUMP_INTERVAL):
+        """
+        starts counting and timing moves, undos, journal records, snapshots and
+        GUI frames (see instrumentation.py) for this and every later board
+        if dump_path is given, the stats are written there as JSON every dump_interval seconds
+        can be called before new_game (needed for GUI games, whose loop never returns)
+        """
+        self.stats = Stats(dump_path, dump_interval)
+        if hasattr(self, 'board'):
+            instrument_board(self.board, self.stats)
+
+    def api_get_stats(self):
+        """returns the stats as a dictionary (see Stats.as_dict), or None if they are off"""
+        return None if self.stats is None else self.stats.as_dict()
+
+    def api_disable_stats(self):
+        """
+        stops counting (the board runs at full speed again), writes the dump file
+        one last time and returns the final stats (None if they were off)
+        """
+        if self.stats is None:
+            return None
+        if hasattr(self, 'board'):
+            uninstrument_board(self.board)
+        if self.stats.dump_path is not None:
+            self.stats.dump()
+        final_stats = self.stats.as_dict()
+        self.stats = None
+        return final_stats
 
     def api_print_board(self):
         """
@@ -190,52 +281,11 @@ class Game:
     #============== PyGame-Related Methods ==============#
 
     def init_pygame(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        pygame.display.set_caption("Solitaire")
-        self.clock = pygame.time.Clock()
-
-        self.bg = BoardGraphics(self.board, self.screen)
-
-        self.game_loop()
-
-    def game_loop(self):
-        dragging = False
-        while True:
-            # event loop
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    retrieval_move = self.bg.card_pos.detect_collision(pygame.mouse.get_pos())
-                    dragging = True
-                if event.type == pygame.MOUSEBUTTONUP:
-                    destination_move = self.bg.card_pos.detect_collision(pygame.mouse.get_pos())
-                    dragging = False
-                    self.process_move(retrieval_move, destination_move)
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        self.board.undo_move()
-                    if event.key == pygame.K_s:
-                        print(f'Seed: {self.get_seed()}')
-
-            # update
-            self.bg.update()
-
-            # draw
-            self.bg.draw(self.screen)
-
-            # apply draw
-            pygame.display.update()
-
-
-    def process_move(self, retrieval, destination):
-        """
-        retrieval and destination should both be 2 element lists 
-        provided from CardPosition.detect_collision
-        """
-        self.board.attempt_move([retrieval[0], retrieval[1], destination[0]])
+        # pygame is only imported once the GUI is actually used,
+        # so API and command line games never pay for it
+        from .gui import GameWindow
+        self.window = GameWindow(self)
+        self.window.game_loop()
 
 
     #============== Commandline-Related Methods ==============#
@@ -248,7 +298,7 @@ class Game:
             if user_event == 'undo':
                 self.board.undo_move()
             else:
-                print(self.board.attempt_move(user_event))
+                print(self.api_make_move(user_event))
 
     def get_move_from_user(self):
         """
@@ -279,184 +329,10 @@ class Game:
                     deck_list[0].combine_decks(deck)
             deck = deck_list[0]
             deck.shuffle()
+        elif isinstance(custom_seed, int):
+            deck = data.seed_processor.deal_to_deck(custom_seed, self.decks)
         else:
+            self.decks = data.seed_processor.seed_decks(custom_seed)
             deck = data.seed_processor.seed_to_deck(custom_seed)
         
         return deck
-
-
-class CardPositions:
-
-    def __init__(self, board):
-        """
-        determines clickable locations and stores positions 
-        as rect's to make collision detection easy
-        """
-        self.board = board
-        self.tableaus = []      # any exposed card is clickable
-        self.foundations = []   # only top card is clickable
-        self.waste = []         # only top card is clickable
-        self.stock = []         # only top card is clickable
-
-    def detect_collision(self, pos):
-        """
-        determines if a mouseclick is within any of the clickable 
-        areas and returns a piece of an attempted move (to be used
-        in the process_move method of Game class)
-        """
-        for rect in self.stock:
-            if rect.collidepoint((pos)):
-                return ['S0', 0]
-        for rect in self.waste:
-            if rect.collidepoint((pos)):
-                return ['W0', 0]
-        for i, rect in enumerate(self.foundations):
-            if rect.collidepoint((pos)):
-                return ['F'+str(i), 0]
-        for rect in self.tableaus:
-            if rect[0].collidepoint((pos)):
-                return rect[1]
-
-        return [0,0]
-
-    def update_positions(self):
-        self.get_stk_pos()
-        self.get_wst_pos()
-        self.get_fnd_pos()
-        self.get_tab_pos()
-
-    def get_tab_pos(self):
-        """
-        stores a list of lists as tableau positions
-        [ [rect object, [TN, M]], ...] with [TN, M] being a move Nth index Tableau, Mth index Card
-        """
-        self.tableaus = []
-        for tableau_index, tableau in enumerate(self.board.tableaus):
-            x_pos = TABLEAU_START_POS[0] + tableau_index*(CARD_WIDTH+CARD_HORI_DIST)
-            if tableau.get_length() == 0:
-                y_pos = TABLEAU_START_POS[1]
-                associated_move = ['T' + str(tableau_index), 0]
-                self.tableaus.append([pygame.image.load(CARD_BLANK).get_rect(topleft=(x_pos, y_pos)), associated_move])
-            for card_index in range(tableau.get_length())[::-1]:
-                y_pos = TABLEAU_START_POS[1] + card_index*CARD_VERT_DIST
-                associated_move = ['T' + str(tableau_index), tableau.get_length() - card_index - 1]
-                self.tableaus.append([pygame.image.load(CARD_BLANK).get_rect(topleft=(x_pos, y_pos)), associated_move])
-
-    def get_fnd_pos(self):
-        self.foundations = []
-        for i, foundation in enumerate(self.board.foundations):
-            found_pos_topleft = (FOUND_START_POS[0] + i*(CARD_WIDTH+CARD_HORI_DIST), FOUND_START_POS[1])
-            self.foundations.append(pygame.image.load(CARD_BLANK).get_rect(topleft=found_pos_topleft))
-
-    def get_wst_pos(self):
-        if self.board.wp.get_length() > 3:
-            i = 3
-        else:
-            i = self.board.wp.get_length()
-
-        waste_pos_topleft = (WASTE_POS[0] + (i-1)*WASTE_SPACING, WASTE_POS[1])
-        self.waste = [pygame.image.load(CARD_BLANK).get_rect(topleft=waste_pos_topleft)]
-
-    def get_stk_pos(self):
-        if self.board.stock.get_length() > MAX_STOCK_DISPLAYED:
-            i = MAX_STOCK_DISPLAYED
-        else:
-            i = self.board.stock.get_length()
-
-        stock_pos_topleft = (STOCK_POS[0] + (i-1)*STOCK_SPACING, STOCK_POS[1])
-        self.stock = [pygame.image.load(CARD_BLANK).get_rect(topleft=stock_pos_topleft)]
-
-
-class BoardGraphics:
-
-    def __init__(self, board, screen):
-        self.board = board
-        self.load_card_images(screen)
-        self.main_font = pygame.font.Font(FONT_FILE, FONT_SIZE)
-        self.card_pos = CardPositions(self.board)
-
-    def update(self):
-        self.card_pos.update_positions()
-
-    def draw(self, screen):
-        stock_card = self.board.stock.get_topmost_card()
-        waste_card = self.board.wp.get_topmost_card()
-        foundations = self.board.foundations
-        tableaus = self.board.tableaus
-
-        # draw playing mat
-        mat_surf = pygame.image.load(MAT_IMG).convert_alpha()
-        mat_surf = pygame.transform.scale(mat_surf, (WIDTH, HEIGHT))
-        mat_rect = mat_surf.get_rect(topleft=(0,0))
-        screen.blit(mat_surf, mat_rect)
-
-        # draw text
-        self.draw_text(screen, f'Moves: {self.board.moves}', (WIDTH*0.7, FOUND_START_POS[1]/2))
-        self.draw_text(screen, 'Press SPACEBAR to undo moves', (350, FOUND_START_POS[1]/2))
-
-        # draw Stock at STOCK_POS
-        if self.board.stock.get_length() > 1:
-            for i in range(self.board.stock.get_length()):
-                self.draw_card(screen, stock_card, (STOCK_POS[0] + STOCK_SPACING*i, STOCK_POS[1]))
-                if i >= MAX_STOCK_DISPLAYED-1:
-                    break
-        else:
-            self.draw_card(screen, stock_card, STOCK_POS)
-
-        # draw Waste at WASTE_POS
-        if self.board.wp.get_length() > 1:
-            temp_list = []
-            for i in range(self.board.wp.get_length()):
-                temp_list.append(self.board.wp.get_n_card(i+1))
-                if i >= 2:
-                    break
-            for i, crd in enumerate(temp_list[::-1]):
-                self.draw_card(screen, crd, (WASTE_POS[0] + WASTE_SPACING*i, WASTE_POS[1]))
-        else:
-            self.draw_card(screen, waste_card, WASTE_POS)
-
-        # draw Foundation piles at FOUND_START_POS
-        for i, foundation in enumerate(foundations):
-            draw_pos = (FOUND_START_POS[0] + (CARD_HORI_DIST+CARD_WIDTH)*i, FOUND_START_POS[1])
-            self.draw_card(screen, foundation.get_topmost_card(), draw_pos)
-
-        # draw Tableau piles at TABLEAU_START_POS
-        tab_card_ind = 0
-        remaining_tabs = len(tableaus)
-
-        while remaining_tabs > 0:
-            remaining_tabs = len(tableaus)
-            for tab_ind, tableau in enumerate(tableaus):
-                draw_pos = (TABLEAU_START_POS[0] + (CARD_HORI_DIST+CARD_WIDTH)*tab_ind, TABLEAU_START_POS[1] + CARD_VERT_DIST*tab_card_ind)
-                if tableau.get_length() == 0 and tab_card_ind == 0:
-                    self.draw_card(screen, None, draw_pos)
-                if tab_card_ind < tableau.get_length():
-                    self.draw_card(screen, tableau.cards[tab_card_ind], draw_pos)
-                else:
-                    remaining_tabs -= 1
-            tab_card_ind += 1 
-
-    def draw_text(self, screen, message, pos, color=DEFAULT_TEXT_COLOR):
-        text_surf = self.main_font.render(message, True, color)
-        text_rect = text_surf.get_rect(center=pos)
-        screen.blit(text_surf, text_rect)
-
-    def draw_card(self, screen, card_obj, pos):
-        if card_obj is None:
-            card_suit_rank = 'blank'
-        elif card_obj.get_exposed():
-            card_suit_rank = card_obj.get_suit() + card_obj.get_rank()
-        else:
-            card_suit_rank = 'back'
-        card_surf = self.card_surfaces[card_suit_rank]
-        card_rect = card_surf.get_rect(topleft=pos)
-        screen.blit(card_surf, card_rect)
-
-    def load_card_images(self, screen):
-        self.card_surfaces = {}
-        for suit in SUITS:
-            for rank in RANKS:
-                image_path = CARD_PREFIX + CARD_STRINGS[suit] + CARD_STRINGS[rank] + CARD_SUFFIX
-                self.card_surfaces[suit+rank] = pygame.image.load(image_path)
-        self.card_surfaces['back'] = pygame.image.load(CARD_BACK).convert_alpha()
-        self.card_surfaces['blank'] = pygame.image.load(CARD_BLANK).convert_alpha()
@@ -0,0 +1,366 @@
+"""
+a compact binary format for archiving played games, and a replayer for them
+
+a game record is the seed a game was dealt from plus every move that was passed to
+Board.attempt_move, in the ['RX', Y, 'DZ'] format. each move is stored in one or two
+bytes (see MoveCodec), so a typical game takes a couple of hundred bytes
+
+file layout (all numbers little endian):
+    FILE_MAGIC (8 bytes), then any number of records, each one being
+    RECORD_HEADER: flags, number of tableaus, number of decks, unused byte,
+                   number of moves (uint32), size of the moves in bytes (uint32)
+    seed:          a deal id (uint64) if flags has DEAL_ID_FLAG,
+                   otherwise the card codes of the seed (52 bytes per deck)
+    moves:         the encoded moves
+
+every record says how big it is up front, so a reader can skip over records
+(or just count their moves) without decoding anything
+
+examples:
+    with RecordWriter('games.bin') as writer:
+        writer.write(seed, moves, deal_3=True)
+
+    for record in read_file('games.bin'):       # the file is memory mapped, not loaded
+        board = replay(record, 40)              # the board after the first 40 moves
+"""
+
+import mmap
+import struct
+from collections import namedtuple
+from . import seed_processor
+from .compact_objects import CompactBoard
+from .solitaire_objects import STOCK_DRAW_MOVE, UNDO_MOVE, DEFAULT_TABLEAUS, DEFAULT_DECKS
+
+
+#============= GLOBAL DEFINITIONS =============#
+FILE_MAGIC = b'SOLREC\x01\x00'     # the second to last byte is the format version
+RECORD_HEADER = struct.Struct('<BBBxII')
+DEAL_ID = struct.Struct('<Q')
+
+# record header flags
+DEAL_3_FLAG = 1
+AUTO_FLIP_TAB_FLAG = 2
+DEAL_ID_FLAG = 4
+
+LONG_MOVE_FLAG = 0x80       # set in the first byte of every two byte move
+MAX_SHORT_MOVES = LONG_MOVE_FLAG
+MAX_LONG_MOVES = 0x8000
+
+# seed is a seed string or a deal id (int), moves is the encoded moves (bytes)
+GameRecord = namedtuple('GameRecord', ['seed', 'deal_3', 'auto_flip_tab', 'num_tableaus', 'decks', 'num_moves', 'moves'])
+
+codecs = {} # (num_tableaus, num_foundations) => MoveCodec, see get_codec
+
+
+#============= CLASS DEFINITIONS =============#
+class MoveCodec:
+    """
+    turns moves into bytes and back for one size of board
+
+    the piles are numbered tableaus first, then foundations, then the wastepile
+    * one byte moves (below LONG_MOVE_FLAG) index short_moves, which holds the
+      stock draw, undo, tableau flips and the moves that pick up a single card
+    * two byte moves hold (orig pile * number of piles + dest pile) * index_range + index,
+      with LONG_MOVE_FLAG set in the first byte
+    """
+
+    def __init__(self, num_tableaus=DEFAULT_TABLEAUS, num_foundations=DEFAULT_DECKS * 4):
+        tab_keys = ['T'+str(ind) for ind in range(num_tableaus)]
+        found_keys = ['F'+str(ind) for ind in range(num_foundations)]
+        self.keys = tab_keys + found_keys + ['W0']
+
+        # the deepest card that can be picked up is the bottom of a king to ace run
+        # sitting on top of the most face down cards any tableau is dealt
+        self.index_range = num_tableaus - 1 + 13
+        if len(self.keys) ** 2 * self.index_range > MAX_LONG_MOVES:
+            raise ValueError(f'too many piles to encode moves: {num_tableaus} tableaus, {num_foundations} foundations')
+
+        # most played moves first, in case they don't all fit
+        short_moves = [STOCK_DRAW_MOVE, UNDO_MOVE] + [[key, 0, key] for key in tab_keys]
+        for orig_keys, dest_keys in [(['W0'], found_keys), (['W0'], tab_keys), (tab_keys, found_keys),
+                                     (tab_keys, tab_keys), (found_keys, tab_keys), (found_keys, found_keys)]:
+            short_moves += [[orig, 0, dest] for orig in orig_keys for dest in dest_keys if orig != dest]
+        self.short_moves = [tuple(move) for move in short_moves[:MAX_SHORT_MOVES]]
+
+        self.long_moves = {}
+        for orig_ind, orig in enumerate(self.keys):
+            for dest_ind, dest in enumerate(self.keys[:-1]):
+                for index in range(self.index_range):
+                    value = (orig_ind * len(self.keys) + dest_ind) * self.index_range + index
+                    self.long_moves[value] = (orig, index, dest)
+
+        # encoding is a single dictionary lookup, using the short form whenever there is one
+        self.encodings = {move: bytes([LONG_MOVE_FLAG | value >> 8, value & 0xff]) for value, move in self.long_moves.items()}
+        for code, move in enumerate(self.short_moves):
+            self.encodings[move] = bytes([code])
+
+    def encode(self, moves):
+        """
+        returns the bytes for an iterable of moves
+        raises ValueError for a move that names a pile this board doesn't have
+        (or a card deeper than any tableau can be)
+        """
+        encodings = self.encodings
+        try:
+            return b''.join([encodings[tuple(move)] for move in moves])
+        except (KeyError, TypeError):
+            bad_moves = [move for move in moves if not isinstance(move, (list, tuple)) or tuple(move) not in encodings]
+            raise ValueError(f'move cannot be encoded: {bad_moves[0]!r}') from None
+
+    def iter_decode(self, data):
+        """
+        yields every move (as a new list, ready for attempt_move) in bytes of encoded moves
+        """
+        short_moves = self.short_moves
+        long_moves = self.long_moves
+        index = 0
+        length = len(data)
+        while index < length:
+            byte = data[index]
+            if byte < LONG_MOVE_FLAG:
+                yield list(short_moves[byte])
+                index += 1
+            else:
+                if index + 1 == length:
+                    raise ValueError('encoded moves end in the middle of a move')
+                move = long_moves.get((byte & ~LONG_MOVE_FLAG) << 8 | data[index + 1])
+                if move is None:
+                    raise ValueError(f'not an encoded move: {bytes(data[index:index + 2])!r}')
+                yield list(move)
+                index += 2
+
+    def decode(self, data):
+        return list(self.iter_decode(data))
+
+
+class RecordWriter:
+    """
+    writes game records to a file (a path or a binary file opened for writing)
+    records are written as they come, so any number of games can be archived
+    """
+
+    def __init__(self, file):
+        self.owns_file = isinstance(file, (str, bytes)) or hasattr(file, '__fspath__')
+        self.file = open(file, 'wb') if self.owns_file else file
+        self.file.write(FILE_MAGIC)
+        self.records = 0
+
+    def write(self, seed, moves, deal_3=False, auto_flip_tab=True, num_tableaus=DEFAULT_TABLEAUS, decks=None):
+        """
+        writes a game: seed is a seed string or a deal id, moves is every move that was
+        passed to attempt_move (including undos)
+        decks only needs to be given for a deal id, a seed string knows its own
+        """
+        if decks is None:
+            decks = DEFAULT_DECKS if isinstance(seed, int) else seed_processor.seed_decks(seed)
+        moves = list(moves)
+        encoded = get_codec(num_tableaus, decks * 4).encode(moves)
+        self.write_record(GameRecord(seed, deal_3, auto_flip_tab, num_tableaus, decks, len(moves), encoded))
+
+    def write_record(self, record):
+        """
+        writes a GameRecord whose moves are already encoded (e.g. one from a reader)
+        """
+        flags = DEAL_3_FLAG * bool(record.deal_3) | AUTO_FLIP_TAB_FLAG * bool(record.auto_flip_tab)
+        if isinstance(record.seed, int):
+            flags |= DEAL_ID_FLAG
+            seed_bytes = DEAL_ID.pack(record.seed)
+        else:
+            if isinstance(record.seed, str):
+                seed_bytes = seed_processor.validate_seed(record.seed)
+            else:
+                seed_bytes = bytes(record.seed)     # card codes, from a reader with decode_seeds=False
+            if len(seed_bytes) != seed_processor.NUM_SEED_CHARS * record.decks:
+                raise ValueError(f'seed is not for {record.decks} deck(s): {record.seed!r}')
+        header = RECORD_HEADER.pack(flags, record.num_tableaus, record.decks, record.num_moves, len(record.moves))
+        self.file.write(header + seed_bytes + record.moves)
+        self.records += 1
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Replayer:
+    """
+    plays back a GameRecord and can jump to the position after any number of its moves
+
+    moving forward plays the moves, moving backward reverses the board's move journal
+    (a game with undos in it is dealt again instead, since undo throws journal records away)
+    """
+
+    def __init__(self, record, board_class=CompactBoard):
+        self.record = record
+        self.board_class = board_class
+        self.moves = get_codec(record.num_tableaus, record.decks * 4).decode(record.moves)
+        self.has_undo = UNDO_MOVE in self.moves
+        self.results = []   # what attempt_move returned for each move played so far
+        self.reset()
+
+    def reset(self):
+        """
+        deals the record's seed onto a new board
+        """
+        record = self.record
+        self.board = self.board_class(num_tableaus=record.num_tableaus, num_decks=record.decks,
+                                      deal_3=record.deal_3, auto_flip_tab=record.auto_flip_tab)
+        self.board.init_move_dict()
+        if isinstance(record.seed, int):
+            self.board.deal(seed_processor.deal_to_deck(record.seed, record.decks))
+        else:
+            self.board.deal(seed_processor.seed_to_deck(record.seed))
+        self.position = 0
+        self.journal_lengths = [0]  # journal length and move count after each move played
+        self.move_counts = [0]
+        self.results = []
+
+    def seek(self, position):
+        """
+        returns the board after the first position moves of the record
+        (a negative position counts back from the end, like a list index)
+        the board is reused, so copy it before seeking again if it needs to be kept
+        """
+        if position < 0:
+            position += len(self.moves)
+        if not 0 <= position <= len(self.moves):
+            raise IndexError(f'position out of range: {position}')
+
+        if position < self.position:
+            if self.has_undo:
+                self.reset()
+            else:
+                journal = self.board.move_journal
+                while len(journal) > self.journal_lengths[position]:
+                    self.board.reverse_record(journal.pop())
+                self.board.moves = self.move_counts[position]
+                del self.journal_lengths[position + 1:]
+                del self.move_counts[position + 1:]
+                del self.results[position:]
+                self.position = position
+
+        board = self.board
+        for move in self.moves[self.position:position]:
+            self.results.append(board.attempt_move(move))
+            self.journal_lengths.append(len(board.move_journal))
+            self.move_counts.append(board.moves)
+        self.position = position
+        return board
+
+    def __len__(self):
+        return len(self.moves)
+
+
+#============= FUNCTION DEFINITIONS =============#
+def get_codec(num_tableaus=DEFAULT_TABLEAUS, num_foundations=DEFAULT_DECKS * 4):
+    """
+    returns the MoveCodec for a size of board, building it the first time it is needed
+    """
+    key = (num_tableaus, num_foundations)
+    if key not in codecs:
+        codecs[key] = MoveCodec(num_tableaus, num_foundations)
+    return codecs[key]
+
+
+def encode_moves(moves, num_tableaus=DEFAULT_TABLEAUS, decks=DEFAULT_DECKS):
+    return get_codec(num_tableaus, decks * 4).encode(moves)
+
+
+def decode_moves(record):
+    """
+    returns the moves of a GameRecord as a list of ['RX', Y, 'DZ'] lists
+    """
+    return get_codec(record.num_tableaus, record.decks * 4).decode(record.moves)
+
+
+def unpack_header(header):
+    """
+    returns (flags, num_tableaus, decks, num_moves, moves size, seed size) for a record header
+    """
+    flags, num_tableaus, decks, num_moves, moves_size = RECORD_HEADER.unpack(header)
+    seed_size = DEAL_ID.size if flags & DEAL_ID_FLAG else seed_processor.NUM_SEED_CHARS * decks
+    return flags, num_tableaus, decks, num_moves, moves_size, seed_size
+
+
+def make_record(flags, num_tableaus, decks, num_moves, seed_bytes, moves, decode_seed=True):
+    """
+    returns a GameRecord from the fields of a record header, its seed and its moves
+    if decode_seed is False, a seed that isn't a deal id is left as its card codes
+    """
+    if flags & DEAL_ID_FLAG:
+        seed = DEAL_ID.unpack(seed_bytes)[0]
+    elif decode_seed:
+        seed = seed_processor.codes_to_seed(seed_bytes)
+    else:
+        seed = seed_bytes
+    return GameRecord(seed, bool(flags & DEAL_3_FLAG), bool(flags & AUTO_FLIP_TAB_FLAG), num_tableaus, decks, num_moves, moves)
+
+
+def read_records(data, decode_seeds=True):
+    """
+    yields every GameRecord in a bytes-like object holding a whole record file
+    (bytes, or an mmap so that only the records being read are loaded)
+    if decode_seeds is False, seeds that aren't deal ids are left as their card codes (bytes),
+    which is quicker when only the moves or the header fields are needed
+    """
+    if data[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError('not a game record file (or an unsupported version)')
+    offset = len(FILE_MAGIC)
+    length = len(data)
+    while offset < length:
+        if offset + RECORD_HEADER.size > length:
+            raise ValueError(f'game record file ends in the middle of a record (at byte {offset})')
+        flags, num_tableaus, decks, num_moves, moves_size, seed_size = unpack_header(data[offset:offset + RECORD_HEADER.size])
+        seed_start = offset + RECORD_HEADER.size
+        moves_start = seed_start + seed_size
+        offset = moves_start + moves_size
+        if offset > length:
+            raise ValueError(f'game record file ends in the middle of a record (at byte {seed_start - RECORD_HEADER.size})')
+        yield make_record(flags, num_tableaus, decks, num_moves, data[seed_start:moves_start],
+                          data[moves_start:offset], decode_seeds)
+
+
+def read_file(path, decode_seeds=True):
+    """
+    yields every GameRecord in a record file, memory mapping it instead of reading it in
+    """
+    with open(path, 'rb') as record_file:
+        if record_file.seek(0, 2) == 0:
+            raise ValueError(f'not a game record file (empty): {path}')
+        with mmap.mmap(record_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from read_records(data, decode_seeds)
+
+
+def read_stream(file, decode_seeds=True):
+    """
+    yields every GameRecord from a binary file object that can only be read in order
+    (a pipe, a socket file, gzip.open, etc.)
+    """
+    if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        raise ValueError('not a game record file (or an unsupported version)')
+    while True:
+        header = file.read(RECORD_HEADER.size)
+        if len(header) == 0:
+            return
+        if len(header) != RECORD_HEADER.size:
+            raise ValueError('game record stream ends in the middle of a record')
+        flags, num_tableaus, decks, num_moves, moves_size, seed_size = unpack_header(header)
+        body = file.read(seed_size + moves_size)
+        if len(body) != seed_size + moves_size:
+            raise ValueError('game record stream ends in the middle of a record')
+        yield make_record(flags, num_tableaus, decks, num_moves, body[:seed_size], body[seed_size:], decode_seeds)
+
+
+def replay(record, position=None, board_class=CompactBoard):
+    """
+    returns a new board after the first position moves of a record (all of them if None)
+    """
+    replayer = Replayer(record, board_class)
+    return replayer.seek(len(replayer) if position is None else position)
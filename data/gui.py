@@ -0,0 +1,448 @@
+"""
+the PyGame front end for a Game
+only imported by Game.init_pygame, so the rest of the package
+can be used without pygame installed
+
+"""
+
+import sys
+import time
+import os
+import collections
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
+import pygame
+from .deck_of_cards import SUITS, RANKS
+
+
+#============= GLOBAL DEFINITIONS =============#
+WIDTH = 1500
+HEIGHT = 1000
+MAX_FPS = 60
+
+STOCK_POS = (50, 100)
+STOCK_SPACING = 3
+MAX_STOCK_DISPLAYED = 23
+
+WASTE_POS = (325, 100)
+WASTE_SPACING = 40
+
+FOUND_START_POS = (650, 100)
+MOVES_TEXT_AREA = pygame.Rect(0, 0, 400, 60)
+MOVES_TEXT_AREA.center = (WIDTH*0.7, FOUND_START_POS[1]/2)
+TABLEAU_START_POS = (50, 350)
+CARD_HORI_DIST = 60
+CARD_VERT_DIST = 40
+
+CARD_HEIGHT = 190
+CARD_WIDTH = 140
+CARD_SIZE = (CARD_WIDTH, CARD_HEIGHT)   # size of every image in assets/cards
+
+MAT_IMG = 'assets/board.png'
+CARD_BACK = 'assets/cards/cardBack_blue5.png'
+CARD_BLANK = 'assets/cards/cardBlank2.png'
+CARD_PREFIX = 'assets/cards/card'
+CARD_SUFFIX = '.png'
+CARD_STRINGS = {'H': 'Hearts', 'S': 'Spades', 'D': 'Diamonds', 'C': 'Clubs',
+                'A': 'A', '2': '2', '3': '3', '4': '4', '5': '5', '6': '6',
+                '7': '7', '8': '8', '9': '9', 'T': '10', 'J': 'J', 'Q': 'Q',
+                'K': 'K'}
+CARD_IMAGES = {suit + rank: CARD_PREFIX + CARD_STRINGS[suit] + CARD_STRINGS[rank] + CARD_SUFFIX
+               for suit in SUITS for rank in RANKS}
+CARD_IMAGES['back'] = CARD_BACK
+CARD_IMAGES['blank'] = CARD_BLANK
+
+FONT_FILE = 'assets/OpenSans-Regular.ttf'
+FONT_SIZE = 40
+DEFAULT_TEXT_COLOR = (0, 0, 0)
+MAX_CACHED_TEXTS = 32       # the move counter changes every move, so only the latest texts are kept
+
+
+#============= FUNCTION DEFINITIONS =============#
+def card_rect(topleft):
+    """
+    returns the rect a card takes up on screen, without needing to load an image
+    """
+    return pygame.Rect(topleft, CARD_SIZE)
+
+
+#============= CLASS DEFINITIONS =============#
+class AssetCache:
+    """
+    loads every image (and renders every piece of text) once, converted
+    to the display's pixel format so blitting it each frame is cheap
+    hits and misses count how many requests were served from the cache,
+    card_hits and card_misses count the card images drawn every frame
+    """
+
+    def __init__(self):
+        self.surfaces = {}
+        self.texts = collections.OrderedDict()     # least recently used first
+        self.cards = {}
+        self.hits = 0
+        self.misses = 0
+        self.card_hits = 0
+        self.card_misses = 0
+
+    def get_image(self, path, size=None):
+        """
+        returns the image at path, scaled to size if one is given
+        """
+        key = (path, size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = pygame.image.load(path).convert_alpha()
+        if size is not None:
+            surface = pygame.transform.scale(surface, size)
+        self.surfaces[key] = surface
+        return surface
+
+    def get_card(self, name):
+        """
+        returns the image of a card from CARD_IMAGES (such as 'HA', 'back' or 'blank')
+        """
+        surface = self.cards.get(name)
+        if surface is not None:
+            self.card_hits += 1
+            return surface
+
+        self.card_misses += 1
+        surface = self.get_image(CARD_IMAGES[name])
+        self.cards[name] = surface
+        return surface
+
+    def get_text(self, font, message, color):
+        """
+        returns the text rendered with font
+        only the MAX_CACHED_TEXTS most recently used texts are kept
+        """
+        key = (font, message, color)
+        surface = self.texts.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.texts.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(message, True, color)
+        self.texts[key] = surface
+        if len(self.texts) > MAX_CACHED_TEXTS:
+            self.texts.popitem(last=False)
+        return surface
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'surfaces': len(self.surfaces), 'texts': len(self.texts),
+                'card_hits': self.card_hits, 'card_misses': self.card_misses}
+
+
+class GameWindow:
+    """
+    opens the game window and runs the game loop for a Game
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.board = game.board
+        pygame.init()
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Solitaire")
+        pygame.event.set_blocked(pygame.MOUSEMOTION)   # nothing follows the mouse, so don't wake up for it
+        self.clock = pygame.time.Clock()
+
+        self.bg = BoardGraphics(self.board, self.screen)
+
+    def game_loop(self):
+        dragging = False
+        self.bg.update()
+        self.bg.draw(self.screen)
+        pygame.display.update()
+        while True:
+            # event loop
+            # waits here (using no cpu) until there is some input
+            full_redraw = False
+            events = [pygame.event.wait()] + pygame.event.get()
+            stats = self.game.stats
+            if stats is not None:
+                frame_start = time.perf_counter()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    retrieval_move = self.bg.card_pos.detect_collision(pygame.mouse.get_pos())
+                    dragging = True
+                if event.type == pygame.MOUSEBUTTONUP:
+                    destination_move = self.bg.card_pos.detect_collision(pygame.mouse.get_pos())
+                    dragging = False
+                    self.process_move(retrieval_move, destination_move)
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        self.board.undo_move()
+                    if event.key == pygame.K_s:
+                        print(f'Seed: {self.game.get_seed()}')
+                if event.type == pygame.VIDEOEXPOSE:
+                    full_redraw = True
+
+            # update
+            self.bg.update()
+
+            # draw and apply only what changed
+            if full_redraw:
+                self.bg.draw(self.screen)
+                pygame.display.update()
+            else:
+                dirty_rects = self.bg.draw_changes(self.screen)
+                if dirty_rects:
+                    pygame.display.update(dirty_rects)
+            if stats is not None:
+                stats.add_frame(time.perf_counter() - frame_start)
+
+            self.clock.tick(MAX_FPS)
+
+    def process_move(self, retrieval, destination):
+        """
+        retrieval and destination should both be 2 element lists 
+        provided from CardPosition.detect_collision
+        """
+        # made through the game, so its auto_play and auto_complete options apply
+        self.game.api_make_move([retrieval[0], retrieval[1], destination[0]])
+
+
+class CardPositions:
+
+    def __init__(self, board):
+        """
+        determines clickable locations and indexes them so a click
+        can be looked up without checking every card
+        * the stock, waste and foundations are single rects (only the top card is clickable)
+        * the tableaus are columns: the column is worked out from x and the card from y
+        the index is only rebuilt when the board's version changes
+        """
+        self.board = board
+        self.version = None
+        self.tableau_lengths = []   # any card in a tableau is clickable
+        self.num_foundations = 0    # only top card is clickable
+        self.waste = None           # only top card is clickable
+        self.stock = None           # only top card is clickable
+
+    def detect_collision(self, pos):
+        """
+        determines if a mouseclick is within any of the clickable 
+        areas and returns a piece of an attempted move (to be used
+        in the process_move method of Game class)
+        """
+        if self.stock.collidepoint(pos):
+            return ['S0', 0]
+        if self.waste.collidepoint(pos):
+            return ['W0', 0]
+        if pos[1] < TABLEAU_START_POS[1]:
+            found_ind = self.get_column(pos[0], FOUND_START_POS[0], self.num_foundations)
+            if found_ind is not None and FOUND_START_POS[1] <= pos[1] < FOUND_START_POS[1] + CARD_HEIGHT:
+                return ['F'+str(found_ind), 0]
+            return [0,0]
+
+        tab_ind = self.get_column(pos[0], TABLEAU_START_POS[0], len(self.tableau_lengths))
+        if tab_ind is None:
+            return [0,0]
+        length = self.tableau_lengths[tab_ind]
+        # the card drawn last (lowest on the screen) that covers y is the one clicked
+        card_index = min((pos[1] - TABLEAU_START_POS[1]) // CARD_VERT_DIST, max(length - 1, 0))
+        if pos[1] >= TABLEAU_START_POS[1] + card_index*CARD_VERT_DIST + CARD_HEIGHT:
+            return [0,0]
+        return ['T' + str(tab_ind), max(length - card_index - 1, 0)]
+
+    def get_column(self, x_pos, start_x, num_columns):
+        """
+        returns the index of the column of cards (starting at start_x) that x_pos is on,
+        or None if it is off the end or in the gap between two columns
+        """
+        column, offset = divmod(x_pos - start_x, CARD_WIDTH + CARD_HORI_DIST)
+        if 0 <= column < num_columns and offset < CARD_WIDTH:
+            return column
+        return None
+
+    def update_positions(self):
+        if self.version == self.board.version:
+            return
+        self.version = self.board.version
+        self.get_stk_pos()
+        self.get_wst_pos()
+        self.get_fnd_pos()
+        self.get_tab_pos()
+
+    def get_tab_pos(self):
+        """
+        stores how many cards are in each tableau, which is all that is needed
+        to find a card from a position
+        """
+        self.tableau_lengths = [tableau.get_length() for tableau in self.board.tableaus]
+
+    def get_fnd_pos(self):
+        self.num_foundations = len(self.board.foundations)
+
+    def get_wst_pos(self):
+        if self.board.wp.get_length() > 3:
+            i = 3
+        else:
+            i = self.board.wp.get_length()
+
+        waste_pos_topleft = (WASTE_POS[0] + (i-1)*WASTE_SPACING, WASTE_POS[1])
+        self.waste = card_rect(waste_pos_topleft)
+
+    def get_stk_pos(self):
+        if self.board.stock.get_length() > MAX_STOCK_DISPLAYED:
+            i = MAX_STOCK_DISPLAYED
+        else:
+            i = self.board.stock.get_length()
+
+        stock_pos_topleft = (STOCK_POS[0] + (i-1)*STOCK_SPACING, STOCK_POS[1])
+        self.stock = card_rect(stock_pos_topleft)
+
+
+class BoardGraphics:
+
+    def __init__(self, board, screen):
+        self.board = board
+        self.assets = AssetCache()
+        self.load_card_images(screen)
+        # the mat image has see-through pixels, flatten it onto black once so that
+        # blitting part of it over an old frame always gives the same result
+        self.mat_surf = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.mat_surf.fill((0, 0, 0))
+        self.mat_surf.blit(self.assets.get_image(MAT_IMG, (WIDTH, HEIGHT)), (0, 0))
+        self.main_font = pygame.font.Font(FONT_FILE, FONT_SIZE)
+        self.card_pos = CardPositions(self.board)
+        self.drawn_version = None
+
+    def update(self):
+        self.card_pos.update_positions()
+
+    def draw(self, screen):
+        """
+        draws the whole board
+        """
+        screen.blit(self.mat_surf, (0, 0))
+        self.draw_text(screen, 'Press SPACEBAR to undo moves', (350, FOUND_START_POS[1]/2))
+        self.draw_moves(screen)
+        for key in self.pile_areas():
+            self.draw_pile(screen, key)
+        self.board.pop_changed_piles()
+        self.drawn_version = self.board.version
+
+    def draw_changes(self, screen):
+        """
+        redraws only the piles that have changed since the last draw
+        returns a list of the rects that were drawn over (to pass to pygame.display.update)
+        """
+        dirty_rects = []
+        if self.board.version == self.drawn_version:
+            return dirty_rects
+
+        for key in self.board.pop_changed_piles():
+            area = self.pile_area(key)
+            self.draw_background(screen, area)
+            screen.set_clip(area)
+            self.draw_pile(screen, key)
+            screen.set_clip(None)
+            dirty_rects.append(area)
+
+        self.draw_background(screen, MOVES_TEXT_AREA)
+        self.draw_moves(screen)
+        dirty_rects.append(MOVES_TEXT_AREA)
+        self.drawn_version = self.board.version
+        return dirty_rects
+
+    def draw_background(self, screen, area):
+        screen.blit(self.mat_surf, area, area)
+
+    def draw_moves(self, screen):
+        self.draw_text(screen, f'Moves: {self.board.moves}', MOVES_TEXT_AREA.center)
+
+    def pile_areas(self):
+        """
+        returns a dictionary of every pile key and the area of the screen it is drawn in
+        """
+        areas = {'S0': self.pile_area('S0'), 'W0': self.pile_area('W0')}
+        for i in range(len(self.board.foundations)):
+            areas['F'+str(i)] = self.pile_area('F'+str(i))
+        for i in range(len(self.board.tableaus)):
+            areas['T'+str(i)] = self.pile_area('T'+str(i))
+        return areas
+
+    def pile_area(self, key):
+        """
+        returns the area of the screen a pile is drawn in
+        """
+        if key == 'S0':
+            return pygame.Rect(STOCK_POS, (STOCK_SPACING*(MAX_STOCK_DISPLAYED-1) + CARD_WIDTH, CARD_HEIGHT))
+        if key == 'W0':
+            return pygame.Rect(WASTE_POS, (WASTE_SPACING*2 + CARD_WIDTH, CARD_HEIGHT))
+        if key[0] == 'F':
+            return card_rect((FOUND_START_POS[0] + (CARD_HORI_DIST+CARD_WIDTH)*int(key[1:]), FOUND_START_POS[1]))
+        x_pos = TABLEAU_START_POS[0] + (CARD_HORI_DIST+CARD_WIDTH)*int(key[1:])
+        return pygame.Rect((x_pos, TABLEAU_START_POS[1]), (CARD_WIDTH, HEIGHT - TABLEAU_START_POS[1]))
+
+    def draw_pile(self, screen, key):
+        if key == 'S0':
+            self.draw_stock(screen)
+        elif key == 'W0':
+            self.draw_waste(screen)
+        elif key[0] == 'F':
+            self.draw_card(screen, self.board.foundations[int(key[1:])].get_topmost_card(), self.pile_area(key).topleft)
+        else:
+            self.draw_tableau(screen, int(key[1:]))
+
+    def draw_stock(self, screen):
+        # draw Stock at STOCK_POS
+        stock_card = self.board.stock.get_topmost_card()
+        if self.board.stock.get_length() > 1:
+            for i in range(self.board.stock.get_length()):
+                self.draw_card(screen, stock_card, (STOCK_POS[0] + STOCK_SPACING*i, STOCK_POS[1]))
+                if i >= MAX_STOCK_DISPLAYED-1:
+                    break
+        else:
+            self.draw_card(screen, stock_card, STOCK_POS)
+
+    def draw_waste(self, screen):
+        # draw Waste at WASTE_POS
+        if self.board.wp.get_length() > 1:
+            temp_list = []
+            for i in range(self.board.wp.get_length()):
+                temp_list.append(self.board.wp.get_n_card(i+1))
+                if i >= 2:
+                    break
+            for i, crd in enumerate(temp_list[::-1]):
+                self.draw_card(screen, crd, (WASTE_POS[0] + WASTE_SPACING*i, WASTE_POS[1]))
+        else:
+            self.draw_card(screen, self.board.wp.get_topmost_card(), WASTE_POS)
+
+    def draw_tableau(self, screen, tab_ind):
+        # draw Tableau pile at TABLEAU_START_POS
+        x_pos = TABLEAU_START_POS[0] + (CARD_HORI_DIST+CARD_WIDTH)*tab_ind
+        cards = self.board.tableaus[tab_ind].get_card_list()
+        if len(cards) == 0:
+            self.draw_card(screen, None, (x_pos, TABLEAU_START_POS[1]))
+        for tab_card_ind, card in enumerate(cards):
+            self.draw_card(screen, card, (x_pos, TABLEAU_START_POS[1] + CARD_VERT_DIST*tab_card_ind))
+
+    def draw_text(self, screen, message, pos, color=DEFAULT_TEXT_COLOR):
+        text_surf = self.assets.get_text(self.main_font, message, color)
+        text_rect = text_surf.get_rect(center=pos)
+        screen.blit(text_surf, text_rect)
+
+    def draw_card(self, screen, card_obj, pos):
+        if card_obj is None:
+            card_suit_rank = 'blank'
+        elif card_obj.get_exposed():
+            card_suit_rank = card_obj.get_suit() + card_obj.get_rank()
+        else:
+            card_suit_rank = 'back'
+        screen.blit(self.assets.get_card(card_suit_rank), pos)
+
+    def load_card_images(self, screen):
+        # loaded up front so the first frame doesn't wait on the disk
+        for name in CARD_IMAGES:
+            self.assets.get_card(name)
@@ -0,0 +1,242 @@
+"""
+opt-in counters and timers for a board (and the GUI drawing it)
+
+nothing here runs unless it is switched on: instrument_board swaps a board's
+attempt_move, undo_move, record_move and snapshot methods for timed versions
+on that one board only, and uninstrument_board puts the class methods back,
+so a board without stats runs exactly the same code as before
+
+what is counted (see Stats.as_dict for the layout):
+- moves: attempt_move calls by move type (see move_kind), accepted and
+  rejected, and the time spent in them
+- journal: every record a move saves to undo it later, how many bytes the
+  records take up and the time spent saving them (this is what the board
+  keeps of its state, since the board no longer saves whole copies of itself)
+- snapshots: Board.snapshot calls, bytes copied and time
+- undo: undo calls, how many undos in a row (undo depth) and how deep the
+  journal got
+- frames: time the GUI spends on a frame in GameWindow.game_loop, from the
+  input arriving to the screen being updated
+
+usage:
+    game = Game(api_use=True)
+    game.api_enable_stats('stats.json', dump_interval=10)
+    game.new_game()
+    ...
+    print(game.api_get_stats())
+
+the stats are written to the dump file as JSON every dump_interval seconds
+(checked whenever something is counted) and once more when switched off
+"""
+
+import json
+import os
+import sys
+import time
+from .solitaire_objects import STOCK_DRAW_MOVE, UNDO_MOVE
+
+#============= GLOBAL DEFINITIONS =============#
+DEFAULT_DUMP_INTERVAL = 30.0   # seconds between dumps to the stats file
+INSTRUMENTED_METHODS = ('attempt_move', 'undo_move', 'record_move', 'snapshot')
+
+PILE_NAMES = {'S': 'stock', 'W': 'waste', 'F': 'foundation', 'T': 'tableau'}
+MOVE_KINDS = {(orig, dest): f'{orig_name}_to_{dest_name}'
+              for orig, orig_name in PILE_NAMES.items() for dest, dest_name in PILE_NAMES.items()}
+DRAW_KIND = 'draw'
+RECYCLE_KIND = 'recycle'
+UNDO_KIND = 'undo'
+FLIP_KIND = 'flip'
+INVALID_KIND = 'invalid'
+
+
+#============= CLASS DEFINITIONS =============#
+class Stats:
+    """
+    the counters for one game (shared by every board it deals)
+    every count is kept as a plain number or list so that counting is cheap,
+    as_dict turns them into the exported layout
+    """
+
+    def __init__(self, dump_path=None, dump_interval=DEFAULT_DUMP_INTERVAL):
+        """
+        dump_path is the file the stats are written to (None to never write them)
+        dump_interval is how many seconds to wait between writes
+        """
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.next_dump = time.monotonic() + self.dump_interval
+        self.dumps = 0
+        self.moves = {}                 # move kind => [calls, accepted, seconds]
+        self.journal_records = 0
+        self.journal_bytes = 0
+        self.journal_seconds = 0.0
+        self.journal_max_depth = 0
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self.snapshot_seconds = 0.0
+        self.undos = 0
+        self.undo_seconds = 0.0
+        self.undo_depth = 0             # undos in a row since the last move
+        self.undo_max_depth = 0
+        self.frames = 0
+        self.frame_seconds = 0.0
+        self.frame_max_seconds = 0.0
+
+    def add_move(self, kind, accepted, seconds):
+        counts = self.moves.get(kind)
+        if counts is None:
+            counts = self.moves[kind] = [0, 0, 0.0]
+        counts[0] += 1
+        counts[2] += seconds
+        if accepted:
+            counts[1] += 1
+            if kind != UNDO_KIND:
+                self.undo_depth = 0
+        self.check_dump()
+
+    def add_journal_record(self, record, depth, seconds):
+        self.journal_records += 1
+        self.journal_bytes += sys.getsizeof(record)
+        self.journal_seconds += seconds
+        if depth > self.journal_max_depth:
+            self.journal_max_depth = depth
+
+    def add_snapshot(self, snapshot, seconds):
+        self.snapshots += 1
+        self.snapshot_bytes += (len(snapshot.stock) + len(snapshot.waste) + sum(map(len, snapshot.foundations))
+                                + sum(map(len, snapshot.tableaus)))
+        self.snapshot_seconds += seconds
+
+    def add_undo(self, seconds):
+        self.undos += 1
+        self.undo_seconds += seconds
+        self.undo_depth += 1
+        if self.undo_depth > self.undo_max_depth:
+            self.undo_max_depth = self.undo_depth
+
+    def add_frame(self, seconds):
+        self.frames += 1
+        self.frame_seconds += seconds
+        if seconds > self.frame_max_seconds:
+            self.frame_max_seconds = seconds
+        self.check_dump()
+
+    def check_dump(self):
+        """
+        writes the stats to the dump file if dump_interval has gone by since the last write
+        """
+        if self.dump_path is not None and time.monotonic() >= self.next_dump:
+            self.dump()
+
+    def dump(self, path=None):
+        """
+        writes the stats to path (or the dump file) as JSON
+        the file is written next to the old one and then swapped in,
+        so a reader never sees half of it
+        """
+        path = self.dump_path if path is None else path
+        self.next_dump = time.monotonic() + self.dump_interval
+        self.dumps += 1
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as stats_file:
+            json.dump(self.as_dict(), stats_file, indent=1)
+        os.replace(temp_path, path)
+
+    def as_dict(self):
+        """
+        returns every counter as a dictionary of plain numbers (times are in seconds)
+        """
+        moves = {}
+        for kind, (calls, accepted, seconds) in sorted(self.moves.items()):
+            moves[kind] = {'calls': calls, 'accepted': accepted, 'rejected': calls - accepted,
+                           'seconds': seconds, 'us_per_call': seconds / calls * 1e6}
+        calls = sum(counts[0] for counts in self.moves.values())
+        accepted = sum(counts[1] for counts in self.moves.values())
+        return {
+            'started': self.started,
+            'elapsed': time.time() - self.started,
+            'dumps': self.dumps,
+            'moves': moves,
+            'total_moves': {'calls': calls, 'accepted': accepted, 'rejected': calls - accepted,
+                            'seconds': sum(counts[2] for counts in self.moves.values())},
+            'journal': {'records': self.journal_records, 'bytes': self.journal_bytes,
+                        'seconds': self.journal_seconds, 'max_depth': self.journal_max_depth},
+            'snapshots': {'calls': self.snapshots, 'bytes': self.snapshot_bytes, 'seconds': self.snapshot_seconds},
+            'undo': {'calls': self.undos, 'seconds': self.undo_seconds,
+                     'depth': self.undo_depth, 'max_depth': self.undo_max_depth},
+            'frames': {'count': self.frames, 'seconds': self.frame_seconds,
+                       'mean_ms': self.frame_seconds / self.frames * 1e3 if self.frames else 0.0,
+                       'max_ms': self.frame_max_seconds * 1e3},
+        }
+
+
+#============= FUNCTION DEFINITIONS =============#
+def move_kind(board, move_input):
+    """
+    returns the type of a move for attempt_move, such as 'draw', 'undo', 'flip'
+    or 'waste_to_tableau', without making it
+    ('invalid' if the move doesn't name two piles on the board)
+    """
+    if move_input == UNDO_MOVE:
+        return UNDO_KIND
+    if move_input == STOCK_DRAW_MOVE:
+        return DRAW_KIND if board.stock.get_length() != 0 else RECYCLE_KIND
+    if len(move_input) != 3 or move_input[0] not in board.move_dict or move_input[2] not in board.move_dict:
+        return INVALID_KIND
+    if move_input[0] == move_input[2] and move_input[0][0] == 'T' and move_input[1] == 0:
+        return FLIP_KIND
+    return MOVE_KINDS[move_input[0][0], move_input[2][0]]
+
+
+def instrument_board(board, stats):
+    """
+    counts and times everything board does into stats, until uninstrument_board is called
+    the timed methods are set on the board itself, so other boards are left alone
+    """
+    uninstrument_board(board)
+    attempt_move = board.attempt_move
+    undo_move = board.undo_move
+    record_move = board.record_move
+    snapshot = board.snapshot
+    perf_counter = time.perf_counter
+    journal = board.move_journal
+
+    def timed_attempt_move(move_input):
+        kind = move_kind(board, move_input)
+        start_time = perf_counter()
+        accepted = attempt_move(move_input)
+        stats.add_move(kind, accepted, perf_counter() - start_time)
+        return accepted
+
+    def timed_undo_move():
+        start_time = perf_counter()
+        undo_move()
+        stats.add_undo(perf_counter() - start_time)
+
+    def timed_record_move(record):
+        start_time = perf_counter()
+        record_move(record)
+        stats.add_journal_record(record, len(journal), perf_counter() - start_time)
+
+    def timed_snapshot(previous=None):
+        start_time = perf_counter()
+        result = snapshot(previous)
+        stats.add_snapshot(result, perf_counter() - start_time)
+        return result
+
+    board.attempt_move = timed_attempt_move
+    board.undo_move = timed_undo_move
+    board.record_move = timed_record_move
+    board.snapshot = timed_snapshot
+
+
+def uninstrument_board(board):
+    """
+    puts back the board's own methods (does nothing if board isn't instrumented)
+    """
+    for name in INSTRUMENTED_METHODS:
+        board.__dict__.pop(name, None)
@@ -0,0 +1,304 @@
+"""
+Monte Carlo playouts: estimates how often each legal move leads to a win
+by playing many games out to the end from the position after it
+
+the cards a player can't see (face down tableau cards and the stock) are not
+read from the board: every playout deals them out again at random from the
+cards that aren't visible anywhere (a determinization), so the estimate only
+uses what the player knows. one determinization is shared by every move, so
+the moves are compared on the same hidden cards, and each move is tried on a
+fork of it (see Board.fork)
+
+a playout follows a policy until the game is won, stuck or max_moves long:
+- HEURISTIC_POLICY plays the most useful kind of move there is (cards to the
+  foundations and moves that reveal a face down card first, then waste to
+  tableau moves, then stock draws) and never moves cards back and forth
+- RANDOM_POLICY picks uniformly from every legal move
+once every card is face up (Board.is_winnable) the game is finished with
+Board.auto_complete
+
+usage:
+    estimates = estimate_moves(game.board, playouts=200, time_budget=0.1)
+    best = estimates[0].move
+
+    with PlayoutEngine(workers=4) as engine:    # keep it around between queries,
+        engine.best_move(game.board, time_budget=0.1)   # its processes start once
+"""
+
+import concurrent.futures
+import os
+import random
+import time
+from collections import namedtuple
+from .compact_objects import CompactBoard
+from .deck_of_cards import NUM_CARD_CODES, FACE_UP, CODE_MASK
+from .solitaire_objects import STOCK_DRAW_MOVE, HIDDEN_CODE
+
+#============= GLOBAL DEFINITIONS =============#
+HEURISTIC_POLICY = 'heuristic'
+RANDOM_POLICY = 'random'
+DEFAULT_PLAYOUTS = 200          # determinizations (each one plays out every move once)
+DEFAULT_MAX_MOVES = 300         # most moves in one playout
+DEFAULT_BATCH_SIZE = 4          # determinizations sent to a worker process at a time
+RESULT_GRACE = 0.01             # seconds past the time budget to wait for batches still running
+
+# a move's estimate: playouts => games played out after the move, wins => how many were won,
+# foundation_cards => cards on the foundations at the end, on average (ranks moves that never win)
+MoveEstimate = namedtuple('MoveEstimate', ['move', 'playouts', 'wins', 'win_rate', 'foundation_cards'])
+
+# the board settings a position is played with: (num_tableaus, num_decks, deal_3, auto_flip_tab)
+BoardOptions = namedtuple('BoardOptions', ['num_tableaus', 'num_decks', 'deal_3', 'auto_flip_tab'])
+
+
+#============= CLASS DEFINITIONS =============#
+class PlayoutEngine:
+    """
+    runs playouts for estimate_moves, spread over workers processes
+    (or in this process if workers is 0)
+    batch_size => determinizations handed to a worker process at a time
+    policy => HEURISTIC_POLICY or RANDOM_POLICY
+    max_moves => most moves in one playout
+    seed => seeds the determinizations and playouts, for repeatable estimates
+        (with a time budget, how many playouts finish can still differ)
+    the worker processes are started up front and kept until close is called
+    """
+
+    def __init__(self, workers=0, batch_size=DEFAULT_BATCH_SIZE, policy=HEURISTIC_POLICY,
+                 max_moves=DEFAULT_MAX_MOVES, seed=None):
+        if policy not in (HEURISTIC_POLICY, RANDOM_POLICY):
+            raise ValueError(f"unknown playout policy '{policy}'")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.policy = policy
+        self.max_moves = max_moves
+        self.rng = random.Random(seed)
+        self.executor = None
+        if workers > 0:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            # start every process now rather than during the first (timed) query
+            for future in [self.executor.submit(os.getpid) for i in range(workers)]:
+                future.result()
+
+    def estimate_moves(self, board, playouts=DEFAULT_PLAYOUTS, time_budget=None):
+        """
+        returns a MoveEstimate for every legal move on board, best first (highest
+        win rate, then most foundation cards)
+        playouts => how many determinizations to play every move out on
+        time_budget => seconds to stop after, even if fewer playouts were played
+            (None for no limit). the estimates are returned shortly after it ends,
+            and every move has been played out on the same determinizations
+        """
+        moves = board.legal_moves()
+        snapshot = board.snapshot()
+        options = BoardOptions(board.num_tableaus, board.num_foundations // 4, board.stock.deal_3, board.auto_flip_tab)
+        unknown_codes(snapshot, options.num_decks)  # fails early on a board that can't be dealt out again
+        deadline = None if time_budget is None else time.time() + time_budget
+        totals = [[0, 0, 0] for move in moves]  # per move: playouts, wins, foundation cards
+
+        if len(moves) != 0:
+            if self.executor is None:
+                seeds = (self.rng.getrandbits(64) for i in range(playouts))
+                add_totals(totals, play_batch(snapshot, options, moves, seeds, self.policy, self.max_moves, deadline))
+            else:
+                self.run_batches(snapshot, options, moves, playouts, deadline, totals)
+
+        estimates = [MoveEstimate(move, played, wins, wins / played if played else 0.0,
+                                  foundation_cards / played if played else 0.0)
+                     for move, (played, wins, foundation_cards) in zip(moves, totals)]
+        estimates.sort(key=lambda estimate: (estimate.win_rate, estimate.foundation_cards), reverse=True)
+        return estimates
+
+    def best_move(self, board, playouts=DEFAULT_PLAYOUTS, time_budget=None):
+        """
+        returns the move with the best estimate (None if there are no legal moves)
+        """
+        estimates = self.estimate_moves(board, playouts, time_budget)
+        return estimates[0].move if len(estimates) != 0 else None
+
+    def run_batches(self, snapshot, options, moves, playouts, deadline, totals):
+        """
+        keeps every worker process busy with batches of determinizations until
+        playouts have been sent or the deadline has passed, adding up the results
+        batches that aren't back RESULT_GRACE seconds after the deadline are dropped
+        """
+        pending = set()
+        sent = 0
+        while True:
+            while (len(pending) < 2 * self.workers and sent < playouts
+                   and (deadline is None or time.time() < deadline)):
+                seeds = [self.rng.getrandbits(64) for i in range(min(self.batch_size, playouts - sent))]
+                pending.add(self.executor.submit(play_batch, snapshot, options, moves, seeds,
+                                                 self.policy, self.max_moves, deadline))
+                sent += len(seeds)
+            if len(pending) == 0:
+                return
+            timeout = None if deadline is None else max(0.0, deadline - time.time()) + RESULT_GRACE
+            done, pending = concurrent.futures.wait(pending, timeout, concurrent.futures.FIRST_COMPLETED)
+            if len(done) == 0:
+                for future in pending:
+                    future.cancel()
+                return
+            for future in done:
+                add_totals(totals, future.result())
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+#============= FUNCTION DEFINITIONS =============#
+def estimate_moves(board, playouts=DEFAULT_PLAYOUTS, time_budget=None, workers=0, **engine_options):
+    """
+    shortcut for PlayoutEngine(workers, **engine_options).estimate_moves(board, playouts, time_budget)
+    (starting worker processes takes a while, so keep a PlayoutEngine to answer many queries)
+    """
+    with PlayoutEngine(workers, **engine_options) as engine:
+        return engine.estimate_moves(board, playouts, time_budget)
+
+
+def add_totals(totals, batch_totals):
+    for move_totals, move_batch_totals in zip(totals, batch_totals):
+        for i in range(3):
+            move_totals[i] += move_batch_totals[i]
+
+
+def play_batch(snapshot, options, moves, seeds, policy, max_moves, deadline):
+    """
+    deals out one determinization of snapshot per seed (seeds can be any iterable)
+    and plays every move out
+    once on it, stopping when the deadline (a time.time() value or None) passes
+    the deadline is only checked before a determinization: once started, it is
+    played out for every move, so every move gets the same playouts on the same
+    hidden cards (the last one can run a little past the deadline)
+    returns [playouts, wins, foundation cards] for every move
+    (this is what runs in the worker processes)
+    """
+    totals = [[0, 0, 0] for move in moves]
+    unknown = unknown_codes(snapshot, options.num_decks)
+    for seed in seeds:
+        if deadline is not None and time.time() >= deadline:
+            return totals
+        rng = random.Random(seed)
+        board = determinize(snapshot, options, unknown, rng)
+        for move, move_totals in zip(moves, totals):
+            fork = board.fork()
+            fork.attempt_move(move)
+            won = play_out(fork, rng, policy, max_moves)
+            move_totals[0] += 1
+            move_totals[1] += won
+            move_totals[2] += sum(foundation.get_length() for foundation in fork.foundations)
+    return totals
+
+
+def unknown_codes(snapshot, num_decks):
+    """
+    returns bytes of the codes of every card that isn't visible in snapshot
+    (one per face down card on the board)
+    """
+    counts = [num_decks] * NUM_CARD_CODES
+    hidden = 0
+    for pile in (snapshot.stock, snapshot.waste) + snapshot.foundations + snapshot.tableaus:
+        for code in pile:
+            if code == HIDDEN_CODE:
+                hidden += 1
+            else:
+                counts[code & CODE_MASK] -= 1
+    if hidden != sum(counts) or min(counts) < 0:
+        raise ValueError(f"the board doesn't hold {num_decks} whole deck(s), so its hidden cards can't be dealt out again")
+    return bytes(code for code in range(NUM_CARD_CODES) for i in range(counts[code]))
+
+
+def determinize(snapshot, options, unknown, rng):
+    """
+    returns a new CompactBoard with the visible cards of snapshot, and its face
+    down cards dealt out at random from the unknown codes
+    """
+    shuffled = list(unknown)
+    rng.shuffle(shuffled)
+    dealt = iter(shuffled)
+    board = CompactBoard(*options)
+    board.init_move_dict()
+    piles = [board.stock, board.wp] + board.foundations + board.tableaus
+    pile_codes = (snapshot.stock, snapshot.waste) + snapshot.foundations + snapshot.tableaus
+    for pile, codes in zip(piles, pile_codes):
+        if len(codes) != 0:
+            pile.cards[:] = bytes(next(dealt) if code == HIDDEN_CODE else code for code in codes)
+            pile.rehash()
+    return board
+
+
+def play_out(board, rng, policy, max_moves):
+    """
+    plays board with policy until it is won, stuck, or max_moves moves were made
+    returns True if it was won
+    """
+    draws = 0   # draws since any other move
+    for i in range(max_moves):
+        if board.is_winnable():
+            board.auto_complete()
+            return board.is_won()
+        moves = board.legal_moves()
+        if policy == HEURISTIC_POLICY:
+            move = heuristic_move(board, moves, rng)
+        else:
+            move = rng.choice(moves) if len(moves) != 0 else None
+        if move is None:
+            return False
+        if move == STOCK_DRAW_MOVE:
+            # a whole trip through the stock and waste without another move is a dead end
+            draws += 1
+            if draws > board.stock.get_length() + board.wp.get_length() + 1:
+                return False
+        else:
+            draws = 0
+        board.attempt_move(move)
+    return board.is_won()
+
+
+def heuristic_move(board, moves, rng):
+    """
+    returns one of the moves with the highest move_priority, picked at random
+    (None if every move is one that is never worth making)
+    """
+    best = []
+    best_priority = 0
+    for move in moves:
+        priority = move_priority(board, move)
+        if priority > best_priority:
+            best = [move]
+            best_priority = priority
+        elif priority == best_priority and priority != 0:
+            best.append(move)
+    return rng.choice(best) if len(best) != 0 else None
+
+
+def move_priority(board, move):
+    """
+    4 => a card goes to a foundation, or a face down card gets flipped or uncovered
+    3 => a whole tableau is moved onto another card (freeing up the tableau)
+    2 => the top waste card goes to a tableau
+    1 => a stock draw
+    0 => never worth making: cards going back down from a foundation, or moves
+         between tableaus that uncover nothing (they could just be moved back)
+    """
+    orig, index, dest = move
+    if orig == 'S0':
+        return 1
+    if orig[0] == 'F':
+        return 0
+    if dest[0] == 'F' or orig == dest:
+        return 4
+    if orig[0] == 'W':
+        return 2
+    pile = board.move_dict[orig]
+    below = pile.get_length() - index - 2
+    if below < 0:
+        return 3 if board.move_dict[dest].get_length() != 0 else 0
+    return 4 if not pile.get_code_list()[below] & FACE_UP else 0
@@ -1,9 +1,19 @@
 """
 generates a deck of cards based on a given seed
 can also generate a seed with a given deck of cards
+
+seed formats:
+* a single deck is 52 characters, one per card (see hash_dict), e.g.
+  'QgqEnPeXiUoSpCFHcdshvaTDyumGzKxZIBkVMbRWLOAftwYJlrjN'
+* any number of decks is 'v<version>-<decks>-<characters>' (version 1),
+  with every card character appearing once per deck
+  single deck seeds are always written in the first format
+
+a deal id is an integer from 0 to 2**64 - 1 that always deals the same deck
+(see deal_codes), so ranges of ids can be split up between workers or machines
 """
 import random
-from .deck_of_cards import Card, Deck
+from .deck_of_cards import Card, Deck, card_from_code, CODE_MASK
 
 chars = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 SUITS = "HSDC"
@@ -31,21 +41,97 @@ def generate_hash_dict():
 			i += 1
 	print(hash_dict)
 
-def seed_to_list(seed):
-	cards = []
-	for char in seed:
-		suit = hash_dict[char][1]
-		rank = hash_dict[char][0]
-		cards.append(Card(suit, rank))
+SEED_VERSION = 1
+MAX_DEAL_ID = 2**64 - 1
+
+# the character for a card is chars[card code] (see Card.get_code), so a seed
+# can be converted with two lookup tables instead of searching hash_dict
+NUM_SEED_CHARS = len(chars)
+CODE_CHARS = chars
+INVALID_CODE = 255
+CHAR_CODES = bytes(chars.index(chr(i)) if chr(i) in chars else INVALID_CODE for i in range(256))
+DECK_CODES = bytes(range(NUM_SEED_CHARS))
+
 
-	return cards
+def split_seed(seed):
+	"""
+	returns a tuple (number of decks, card characters) for a seed of either format
+	"""
+	if '-' not in seed:
+		return 1, seed
+	try:
+		version, decks, cards = seed.split('-')
+		version = int(version[1:]) if version[0] == 'v' else None
+		decks = int(decks)
+	except (ValueError, IndexError):
+		raise ValueError(f'invalid seed: {seed!r}') from None
+	if version != SEED_VERSION or decks < 1:
+		raise ValueError(f'unsupported seed version or number of decks: {seed!r}')
+	return decks, cards
+
+def seed_decks(seed):
+	"""
+	returns how many decks a seed is for
+	"""
+	return split_seed(seed)[0]
+
+def seed_to_codes(seed):
+	"""
+	returns the card codes of a seed as bytes (face down)
+	raises ValueError if the seed has a character that is not a card
+	"""
+	cards = split_seed(seed)[1]
+	try:
+		codes = cards.encode('ascii').translate(CHAR_CODES)
+	except UnicodeEncodeError:
+		raise ValueError(f'invalid seed: {seed!r}') from None
+	if INVALID_CODE in codes:
+		raise ValueError(f'invalid seed: {seed!r}')
+	return codes
+
+def codes_to_seed(codes):
+	"""
+	returns the seed for an iterable of card codes (face up or down) making up
+	one or more full decks
+	"""
+	cards = ''.join([CODE_CHARS[code & CODE_MASK] for code in codes])
+	if len(cards) == NUM_SEED_CHARS:
+		return cards
+	return f'v{SEED_VERSION}-{len(cards) // NUM_SEED_CHARS}-{cards}'
+
+def validate_seed(seed):
+	"""
+	raises ValueError unless the seed holds every card of its decks exactly once per deck
+	returns the seed's card codes
+	"""
+	decks = seed_decks(seed)
+	codes = seed_to_codes(seed)
+	if len(codes) != NUM_SEED_CHARS * decks:
+		raise ValueError(f'seed does not hold {decks} full deck(s): {seed!r}')
+	if decks == 1:
+		is_full = len(set(codes)) == NUM_SEED_CHARS
+	else:
+		is_full = bytes(sorted(codes)) == bytes(code for code in DECK_CODES for i in range(decks))
+	if not is_full:
+		raise ValueError(f'seed does not hold {decks} full deck(s): {seed!r}')
+	return codes
+
+def is_valid_seed(seed):
+	try:
+		validate_seed(seed)
+	except (ValueError, AttributeError):
+		return False
+	return True
+
+def seed_to_list(seed):
+	return [card_from_code(code) for code in seed_to_codes(seed)]
 
 def seed_to_deck(seed):
 	"""
 	returns a new deck object with cards ordered by the input seed
 	"""
 	deck = Deck()
-	deck.cards = seed_to_list(seed)
+	deck.cards = [card_from_code(code) for code in validate_seed(seed)]
 
 	return deck
 
@@ -53,21 +139,52 @@ def deck_to_seed(deck):
 	"""
 	takes a Deck object and returns its corresponding seed
 	"""
-	seed = ''
-	for card in deck.cards:
-		for char, crd in hash_dict.items():
-			if crd == f'{card.get_rank()}{card.get_suit()}':
-				seed += char
+	return codes_to_seed(card.get_code() for card in deck.cards)
+
+def generate_random_seed(decks=1):
+	return codes_to_seed(random.sample(DECK_CODES * decks, NUM_SEED_CHARS * decks))
+
+def deal_codes(deal_id, decks=1):
+	"""
+	returns the card codes (as bytes) of the deck dealt by a deal id
+	the cards are put in order by a Fisher-Yates shuffle (random.Random.shuffle)
+	using a random number generator seeded with the deal id, so a deal id gives
+	the same deck in every process, without touching the global random module
+	"""
+	if not 0 <= deal_id <= MAX_DEAL_ID:
+		raise ValueError(f'deal id must be from 0 to {MAX_DEAL_ID}: {deal_id}')
+	codes = bytearray(DECK_CODES * decks)
+	random.Random(deal_id).shuffle(codes)
+	return bytes(codes)
+
+def deal_to_seed(deal_id, decks=1):
+	return codes_to_seed(deal_codes(deal_id, decks))
+
+def deal_to_deck(deal_id, decks=1):
+	"""
+	returns a new deck object for a deal id (see deal_codes)
+	"""
+	deck = Deck()
+	deck.cards = [card_from_code(code) for code in deal_codes(deal_id, decks)]
 
-	return seed
+	return deck
 
-def generate_random_seed():
-	temp_list = list(hash_dict.keys())
-	seed = ''
-	for i in range(len(temp_list)):
-		seed += temp_list.pop(random.randrange(len(temp_list)))
+def encode_many(decks):
+	"""
+	yields the seed of every Deck object in an iterable
+	"""
+	for deck in decks:
+		yield deck_to_seed(deck)
 
-	return seed
+def decode_many(seeds, validate=True):
+	"""
+	yields the card codes (as bytes) of every seed in an iterable, which is all
+	that is needed to compare, hash or deal them (see Board.deal and card_from_code)
+	if validate is True, a ValueError is raised for any seed that is not a full deck
+	"""
+	to_codes = validate_seed if validate else seed_to_codes
+	for seed in seeds:
+		yield to_codes(seed)
 
 # THIS PROGRAM SHOULD NOT BE RUN AS A SCRIPT
 # def main():
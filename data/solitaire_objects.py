@@ -1,4 +1,6 @@
-import copy
+import random
+from collections import namedtuple
+from .deck_of_cards import SUITS, COLORS, NUM_CARD_CODES, FACE_UP, CODE_MASK, CODE_RANK_VALUES, CODE_SUITS, CODE_COLORS
 
 #============= GLOBAL DEFINITIONS =============#
 FANNED = 'fanned'
@@ -6,6 +8,66 @@ SQUARED = 'squared'
 DEFAULT_DECKS = 1
 DEFAULT_TABLEAUS = 7
 
+# move journal record types (first element of every journal record)
+# (MOVE_CARDS, orig_key, dest_key, num_cards, flipped)
+# (DRAW_STOCK, num_cards)
+# (RECYCLE_WASTE, num_cards)
+# (REVEAL_CARD, tableau_key)
+# (BATCH_MOVES, tuple of records) => several moves undone as one (see Board.join_records)
+MOVE_CARDS = 'move'
+DRAW_STOCK = 'draw'
+RECYCLE_WASTE = 'recycle'
+REVEAL_CARD = 'reveal'
+BATCH_MOVES = 'batch'
+
+STOCK_DRAW_MOVE = ['S0', 0, 'S0']
+UNDO_MOVE = ['UN', 0, 'UN']
+
+# a read-only copy of what a player can see on a board (see Board.snapshot)
+# every pile is bytes of card codes, bottom card first, with face down cards as HIDDEN_CODE
+BoardSnapshot = namedtuple('BoardSnapshot', ['version', 'moves', 'stock', 'waste', 'foundations', 'tableaus'])
+HIDDEN_CODE = CODE_MASK
+VISIBLE_CODES = bytes(code if code & FACE_UP else HIDDEN_CODE for code in range(256))
+
+
+def _build_placement_tables():
+    """
+    lookup tables of the placement rules, indexed by card codes with the FACE_UP bit masked off
+    FOUNDATION_NEXT[top code] => the code of the only card that can be placed on it (or None)
+    TABLEAU_NEXT[top code] => the codes of the cards that can be placed on it
+    TABLEAU_ACCEPTS[top code * NUM_CARD_CODES + card code] => 1 if card can be placed on top
+    """
+    foundation_next = []
+    tableau_next = []
+    tableau_accepts = bytearray(NUM_CARD_CODES * NUM_CARD_CODES)
+    for top in range(NUM_CARD_CODES):
+        foundation_next.append(top + 1 if CODE_RANK_VALUES[top] != 13 else None)
+        tableau_next.append(())
+        for card in range(NUM_CARD_CODES):
+            if (CODE_COLORS[top] != CODE_COLORS[card] and
+                    CODE_RANK_VALUES[top] - 1 == CODE_RANK_VALUES[card]):
+                tableau_accepts[top * NUM_CARD_CODES + card] = 1
+                tableau_next[top] += (card,)
+    return foundation_next, tableau_next, bytes(tableau_accepts)
+
+FOUNDATION_NEXT, TABLEAU_NEXT, TABLEAU_ACCEPTS = _build_placement_tables()
+ACE_CODES = tuple(code for code in range(NUM_CARD_CODES) if CODE_RANK_VALUES[code] == 1)
+KING_CODES = tuple(code for code in range(NUM_CARD_CODES) if CODE_RANK_VALUES[code] == 13)
+
+# Zobrist hashing (see Board.position_key)
+# every kind of pile has its own table of random 64 bit numbers, with one row per
+# depth in the pile (0 is the bottom card) and one column per card code (face up or down)
+# a pile's zobrist_key is every card's number xor'd together, so it can be kept up to
+# date by xor'ing in only the cards that are added, removed or flipped
+ZOBRIST_SEED = 0x5017
+ZOBRIST_MASK = 2**64 - 1
+ZOBRIST_STOCK = 1
+ZOBRIST_WASTE = 2
+ZOBRIST_FOUNDATION = 3
+ZOBRIST_TABLEAU = 4
+ZOBRIST_TABLES = {kind: [] for kind in (ZOBRIST_STOCK, ZOBRIST_WASTE, ZOBRIST_FOUNDATION, ZOBRIST_TABLEAU)}
+ZOBRIST_MULTIPLIERS = [] # odd numbers that tie a foundation or tableau's key to its place on the board
+
 
 #============= CLASS DEFINITIONS =============#
 class Pile:
@@ -13,6 +75,8 @@ class Pile:
     A group of card objects that serve as the foundation for 
     the various different types of groups of cards on the board
     """
+    __slots__ = ('cards', 'stack_style', 'zobrist_key', 'shared')
+    zobrist_kind = None # which Zobrist table the pile hashes with (None for piles that aren't on a board)
 
     def __init__(self, cards, stack_style=SQUARED):
         """
@@ -21,18 +85,32 @@ class Pile:
         """
         self.cards = cards
         self.stack_style = stack_style
+        self.zobrist_key = 0
+        self.shared = False # True once boards forked from one another both use the pile (see Board.fork)
+        if self.zobrist_kind is not None and len(cards) != 0:
+            self.rehash()
+
+    def rehash(self):
+        """
+        works out zobrist_key from scratch
+        only needed if the cards have been changed without using the pile's methods
+        """
+        if self.zobrist_kind is not None:
+            self.zobrist_key = zobrist_span(self.zobrist_kind, 0, self.get_code_list())
 
     def remove_cards(self, num_cards, flip_cards=False):
         """
         removes the num_cards amount from top (end) of pile 
         and returns them as another pile object
         """
-        temp_list = self.cards[len(self.cards) - num_cards:]
-        self.cards = self.cards[:len(self.cards) - num_cards]
+        split = len(self.cards) - num_cards
+        temp_list = self.cards[split:]
+        self.cards = self.cards[:split]
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, split, [card.get_code() for card in temp_list])
 
         if flip_cards:
-            for card in temp_list:
-                card.flip_card()
+            temp_list = [card.flipped() for card in temp_list]
 
         return Pile(temp_list)
 
@@ -40,13 +118,46 @@ class Pile:
         """
         takes a pile object as input and adds it to the current pile
         """
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, len(self.cards), pile_of_cards.get_code_list())
         self.cards.extend(pile_of_cards.get_card_list())
 
+    def move_cards(self, other_pile, num_cards, flip_cards=False, reverse=False):
+        """
+        moves the num_cards amount from top (end) of pile onto the top of another
+        pile of the same kind, in place (no temporary pile)
+        flip_cards flips every moved card, reverse puts them down in the opposite order
+        moving cards onto the pile they came from leaves the pile as it is
+        """
+        if other_pile is self:
+            return
+        cards = self.cards
+        split = len(cards) - num_cards
+        if num_cards == 1:
+            moved = [cards.pop()]
+        else:
+            moved = cards[split:]
+            del cards[split:]
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, split, [card.get_code() for card in moved])
+
+        if flip_cards:
+            moved = [card.flipped() for card in moved]
+        if reverse:
+            moved.reverse()
+
+        if other_pile.zobrist_kind is not None:
+            other_pile.zobrist_key ^= zobrist_span(other_pile.zobrist_kind, len(other_pile.cards),
+                                                   [card.get_code() for card in moved])
+        other_pile.cards.extend(moved)
+
     def add_card(self, card):
         """
         takes a card object as input and adds it to the current pile
         """
         self.cards.append(card)
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_span(self.zobrist_kind, len(self.cards) - 1, (card.get_code(),))
 
     def get_card_list(self):
         """
@@ -54,6 +165,24 @@ class Pile:
         """
         return self.cards
 
+    def get_code_list(self):
+        """
+        returns the cards as a list of card codes (see Card.get_code)
+        """
+        return [card.get_code() for card in self.cards]
+
+    def get_top_code(self):
+        """
+        returns the card code of the top card in the pile (the pile must not be empty)
+        """
+        return self.cards[-1].get_code()
+
+    def get_n_code(self, n):
+        """
+        returns the card code of the nth (from the top) card in the pile
+        """
+        return self.cards[-n].get_code()
+
     def get_n_card(self, n):
         """
         gets the nth (from the top) card in the pile, but DOES NOT remove it from pile
@@ -87,11 +216,32 @@ class Pile:
         """
         return len(self.cards)
 
+    def copy(self):
+        """
+        returns a new pile of the same kind with the same cards
+        (the card objects themselves are shared, since cards on a board never change)
+        """
+        pile = object.__new__(type(self))
+        pile.cards = self.cards[:]
+        pile.stack_style = self.stack_style
+        pile.zobrist_key = self.zobrist_key
+        pile.shared = False
+        return pile
+
     def reverse_cards(self):
         """
         reverses the list of cards
         """
         self.cards.reverse()
+        self.rehash()
+
+    def flip_top_card(self):
+        """
+        flips over the top card in the pile
+        """
+        self.cards[-1] = self.cards[-1].flipped()
+        if self.zobrist_kind is not None:
+            self.zobrist_key ^= zobrist_flip(self.zobrist_kind, len(self.cards) - 1, self.cards[-1].get_code())
 
     def __str__(self):
         if self.stack_style == 'squared':
@@ -101,7 +251,7 @@ class Pile:
                 return self.get_topmost_card().format_card()
         if self.stack_style == 'fanned':
             if len(self.cards) > 0:
-                return ' '.join([f'{card.format_card()}' for card in self.cards])
+                return ' '.join([f'{card.format_card()}' for card in self.get_card_list()])
             else:
                 return str([])
 
@@ -112,11 +262,18 @@ class Stock(Pile):
     can either deal out in increments of 1 or 3 cards depending on
     game configuration
     """
-    
+    __slots__ = ('deal_3',)
+    zobrist_kind = ZOBRIST_STOCK
+
     def __init__(self, deal_3=False):
         super().__init__([], SQUARED)
         self.deal_3 = deal_3
 
+    def copy(self):
+        pile = super().copy()
+        pile.deal_3 = self.deal_3
+        return pile
+
     def deal_to_wp(self, wp):
         """
         deals out the top card in the stock to the wastepile
@@ -125,14 +282,22 @@ class Stock(Pile):
         if self.get_length() == 0:
             wp.move_to_stock(self)
         elif self.deal_3:
+            # three cards are dealt one at a time (so they land in reverse order),
+            # but fewer than three are moved over as a single pile
             if len(self.cards) > 2:
-                for i in range(3):
-                    wp.merge_pile(self.remove_cards(1, True))
-            elif len(self.cards) > 0:
-                wp.merge_pile(self.remove_cards(len(self.cards), True))
+                self.move_cards(wp, 3, True, True)
+            else:
+                self.move_cards(wp, len(self.cards), True)
         else:
-            if len(self.cards) > 0:
-                wp.merge_pile(self.remove_cards(1, True))
+            self.move_cards(wp, 1, True)
+
+    def return_from_wp(self, wp, num_cards):
+        """
+        reverses a deal_to_wp that dealt num_cards cards
+        when dealing 3 with fewer than 3 cards left, the cards were
+        moved over as a single pile, so their order is kept
+        """
+        wp.move_cards(self, num_cards, True, not (self.deal_3 and num_cards < 3))
 
 
 class Wastepile(Pile):
@@ -140,6 +305,8 @@ class Wastepile(Pile):
     a pile of cards taken from the stock and placed faceup
     the topmost card can be taken and used
     """
+    __slots__ = ()
+    zobrist_kind = ZOBRIST_WASTE
 
     def __init__(self):
         super().__init__([], SQUARED)
@@ -148,9 +315,13 @@ class Wastepile(Pile):
         """
         flips cards and puts them all back into the stock
         """
-        temp_pile = self.remove_cards(len(self.cards), True)
-        temp_pile.reverse_cards()
-        stock.merge_pile(temp_pile)
+        self.move_cards(stock, len(self.cards), True, True)
+
+    def return_from_stock(self, stock, num_cards):
+        """
+        reverses a move_to_stock that moved num_cards cards
+        """
+        stock.move_cards(self, num_cards, True, True)
 
     def is_valid_retrieval(self, card_index):
         """
@@ -166,7 +337,9 @@ class Foundation(Pile):
     Game is finished when all Foundations are filled
     Starts empty
     """
-    
+    __slots__ = ()
+    zobrist_kind = ZOBRIST_FOUNDATION
+
     def __init__(self):
         super().__init__([], SQUARED)
 
@@ -191,6 +364,18 @@ class Foundation(Pile):
         else:
             return False
 
+    def can_accept(self, code, num_cards, height):
+        """
+        the same rules as is_valid_placement, checked before anything is moved:
+        returns True if num_cards cards, the bottom one being card code code,
+        can be placed on the first height cards of this pile
+        """
+        if num_cards != 1:
+            return False
+        if height == 0:
+            return CODE_RANK_VALUES[code] == 1
+        return FOUNDATION_NEXT[self.cards[height-1].get_code() & CODE_MASK] == code & CODE_MASK
+
     def is_valid_retrieval(self, card_index):
         """
         determines whether the pile can be picked up from the 
@@ -204,6 +389,8 @@ class Tableau(Pile):
     The 7 locations where piles of cards are built down by alternate colors
     Referred to by number, left to right in ascending order
     """
+    __slots__ = ()
+    zobrist_kind = ZOBRIST_TABLEAU
 
     def __init__(self):
         super().__init__([], FANNED)
@@ -211,10 +398,22 @@ class Tableau(Pile):
     def reveal_top_card(self):
         """
         when called, will expose the top card if not already exposed
+        returns True if a card was flipped
         """
         if self.get_length() != 0:
             if not self.get_topmost_card().get_exposed():
-                self.get_topmost_card().flip_card()
+                self.flip_top_card()
+                return True
+        return False
+
+    def is_fully_exposed(self):
+        """
+        returns True if every card in the tableau is face up
+        """
+        for card in self.cards:
+            if not card.get_exposed():
+                return False
+        return True
 
     def is_valid_placement(self, other_pile):
         """
@@ -233,6 +432,15 @@ class Tableau(Pile):
             return (self.get_topmost_card().get_color() != card.get_color() and
                     self.get_topmost_card().get_rank_value() - 1 == card.get_rank_value())
 
+    def can_accept(self, code, num_cards, height):
+        """
+        the same rules as is_valid_placement, checked before anything is moved
+        (see Foundation.can_accept)
+        """
+        if height == 0:
+            return CODE_RANK_VALUES[code] == 13
+        return TABLEAU_ACCEPTS[(self.cards[height-1].get_code() & CODE_MASK) * NUM_CARD_CODES + (code & CODE_MASK)] == 1
+
     def is_valid_retrieval(self, card_index):
         """
         determines whether the pile can be picked up from the 
@@ -246,7 +454,14 @@ class Board:
     """
     can only RETRIEVE cards from: Tableau, Foundation, Wastepile
     can only PLACE cards to: Tableau, Foundation
+
+    the pile classes can be swapped out by a subclass to change how
+    cards are stored (see compact_objects.py)
     """
+    stock_class = Stock
+    wastepile_class = Wastepile
+    foundation_class = Foundation
+    tableau_class = Tableau
 
     def __init__(self, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS, deal_3=False, auto_flip_tab=True):
         self.num_foundations = num_decks * 4
@@ -254,16 +469,24 @@ class Board:
         self.auto_flip_tab = auto_flip_tab
         self.foundations = []
         self.tableaus = []
-        self.stock = Stock(deal_3)
-        self.wp = Wastepile()
+        self.stock = self.stock_class(deal_3)
+        self.wp = self.wastepile_class()
         self.move_dict = {}
         self.moves = 0
-        self.board_states = [] # will contain a history of every board state since start of game
+        self.move_journal = [] # will contain a record of every change made since start of game
+        self.version = 0 # goes up by one every time the board changes
+        self.changed_piles = set() # keys of piles changed since pop_changed_piles was last called
+        self.pile_versions = {} # key of pile => version when it last changed
+        self.pile_index = {} # key of pile => what legal_moves needs to know about it (see index_pile)
+        self.wanted_index = None # wanted_cards, kept until a foundation or tableau changes
+        self.index_keys = tuple(['F'+str(i) for i in range(self.num_foundations)] +
+                                ['T'+str(i) for i in range(self.num_tableaus)])
 
         for i in range(self.num_tableaus):
-            self.tableaus.append(Tableau())
+            self.tableaus.append(self.tableau_class())
         for i in range(self.num_foundations):
-            self.foundations.append(Foundation())
+            self.foundations.append(self.foundation_class())
+        self.zobrist_multipliers = zobrist_multipliers(self.num_foundations + self.num_tableaus)
 
     def init_move_dict(self):
         """
@@ -307,7 +530,7 @@ class Board:
 
         # dump rest of cards into stock
         self.stock.merge_pile(Pile(deck.dump_cards()))
-        self.save_board_state()
+        self.clear_index()  # the piles changed without any journal records
 
     def attempt_move(self, move_input):
         """
@@ -330,17 +553,26 @@ class Board:
         *** ['S0', 0, 'S0'] => Draws card(s) from stock onto wastepile (also returns waste to stock)
         *** ['UN', 0, 'UN']
         *** ['TN', 0, 'TN'] => Attempts to expose the top card (if it's flipped down)
+        ***                    (returns True if a card was flipped, which doesn't add to moves)
 
         """
         # handle undo move
-        if move_input == ['UN', 0, 'UN']:
+        if move_input == UNDO_MOVE:
             self.undo_move()
             return True
 
         # handle stock draw Special Action first
-        if move_input == ['S0', 0, 'S0']:
-            self.save_board_state()
+        if move_input == STOCK_DRAW_MOVE:
+            if self.stock.shared or self.wp.shared:
+                self.own_pile('S0')
+                self.own_pile('W0')
+            stock_length = self.stock.get_length()
+            waste_length = self.wp.get_length()
             self.stock.deal_to_wp(self.wp)
+            if stock_length == 0:
+                self.record_move((RECYCLE_WASTE, waste_length))
+            else:
+                self.record_move((DRAW_STOCK, stock_length - self.stock.get_length()))
             self.moves += 1
             return True
 
@@ -357,37 +589,168 @@ class Board:
         orig_pile = self.move_dict[move_input[0]]
         orig_ind = move_input[1]
         dest_pile = self.move_dict[move_input[2]]
-        if orig_ind >= orig_pile.get_length():
+        if not 0 <= orig_ind < orig_pile.get_length():
             return False
 
         # handle flip tableau card Special Action
         if move_input[0][0] == 'T' and orig_pile == dest_pile and orig_ind == 0:
-            orig_pile.reveal_top_card()
+            if orig_pile.shared:
+                orig_pile = dest_pile = self.own_pile(move_input[0])
+            if orig_pile.reveal_top_card():
+                self.record_move((REVEAL_CARD, move_input[0]))
+                return True
 
         # basic conditions have been met
-        adj_ind = orig_pile.get_length() - orig_ind - 1
-        if orig_pile.is_valid_retrieval(orig_ind):
-            self.save_board_state()
-            move_pile = orig_pile.remove_cards(orig_ind + 1)
-            if dest_pile.is_valid_placement(move_pile):
-                dest_pile.merge_pile(move_pile)
-                if move_input[0][0] == 'T' and self.auto_flip_tab:
-                    orig_pile.reveal_top_card()
-                self.moves += 1
-                return True
+        # the move is checked before any card is moved, so a move that is turned down
+        # leaves the board as it was (moving cards back onto their own pile checks
+        # them against the card they were sitting on)
+        if not orig_pile.is_valid_retrieval(orig_ind):
+            return False
+        num_cards = orig_ind + 1
+        height = orig_pile.get_length() - num_cards if orig_pile is dest_pile else dest_pile.get_length()
+        if not dest_pile.can_accept(orig_pile.get_n_code(num_cards), num_cards, height):
+            return False
+        if orig_pile.shared or dest_pile.shared:
+            orig_pile, dest_pile = self.own_pile(move_input[0]), self.own_pile(move_input[2])
+        orig_pile.move_cards(dest_pile, num_cards)
+        flipped = False
+        if move_input[0][0] == 'T' and self.auto_flip_tab:
+            flipped = orig_pile.reveal_top_card()
+        self.record_move((MOVE_CARDS, move_input[0], move_input[2], num_cards, flipped))
+        self.moves += 1
+        return True
+
+    def record_move(self, record):
+        """
+        adds a record of what a move changed to the move_journal list/stack
+        only what is needed to reverse the move is stored, so every
+        record takes up the same small amount of memory
+        """
+        self.move_journal.append(record)
+        self.note_change(record)
+
+    def reverse_record(self, record):
+        """
+        puts the board back the way it was before the recorded change
+        """
+        if record[0] == BATCH_MOVES:
+            for batched_record in reversed(record[1]):
+                self.reverse_record(batched_record)
+            return
+        if record[0] == MOVE_CARDS:
+            orig_pile = self.own_pile(record[1])
+            dest_pile = self.own_pile(record[2])
+            if record[4]:
+                orig_pile.flip_top_card()
+            dest_pile.move_cards(orig_pile, record[3])
+        elif record[0] == DRAW_STOCK:
+            self.own_pile('S0').return_from_wp(self.own_pile('W0'), record[1])
+        elif record[0] == RECYCLE_WASTE:
+            self.own_pile('W0').return_from_stock(self.own_pile('S0'), record[1])
+        elif record[0] == REVEAL_CARD:
+            self.own_pile(record[1]).flip_top_card()
+        self.note_change(record)
+
+    def redo_record(self, record):
+        """
+        plays a recorded change again (the opposite of reverse_record), on a board
+        that is back the way it was before the change
+        """
+        if record[0] == BATCH_MOVES:
+            for batched_record in record[1]:
+                self.redo_record(batched_record)
+            return
+        if record[0] == MOVE_CARDS:
+            orig_pile = self.own_pile(record[1])
+            orig_pile.move_cards(self.own_pile(record[2]), record[3])
+            if record[4]:
+                orig_pile.flip_top_card()
+        elif record[0] == DRAW_STOCK:
+            self.own_pile('S0').deal_to_wp(self.own_pile('W0'))
+        elif record[0] == RECYCLE_WASTE:
+            self.own_pile('W0').move_to_stock(self.own_pile('S0'))
+        elif record[0] == REVEAL_CARD:
+            self.own_pile(record[1]).flip_top_card()
+        self.note_change(record)
+
+    def note_change(self, record):
+        """
+        bumps the version and remembers which piles a record changes
+        """
+        self.version += 1
+        if record[0] == MOVE_CARDS:
+            keys = (record[1], record[2])
+        elif record[0] == REVEAL_CARD:
+            keys = (record[1],)
+        else:
+            keys = ('S0', 'W0')
+        for key in keys:
+            self.changed_piles.add(key)
+            self.pile_versions[key] = self.version
+            if key in self.pile_index:
+                del self.pile_index[key]
+                self.wanted_index = None
+
+    def fork(self):
+        """
+        returns a new board in the same position that can be played without
+        changing this one (and the other way round), for search and rollouts
+        the new board starts with no undo history and no moves made
+        the boards share their piles until one of them changes a pile, which
+        then gets its own copy of that pile first (see own_pile)
+        """
+        board = object.__new__(type(self))
+        board.num_foundations = self.num_foundations
+        board.num_tableaus = self.num_tableaus
+        board.auto_flip_tab = self.auto_flip_tab
+        board.foundations = self.foundations[:]
+        board.tableaus = self.tableaus[:]
+        board.stock = self.stock
+        board.wp = self.wp
+        board.move_dict = self.move_dict.copy()
+        board.moves = 0
+        board.move_journal = []
+        board.version = self.version
+        board.changed_piles = set()
+        board.pile_versions = self.pile_versions.copy()
+        board.pile_index = self.pile_index.copy()
+        board.wanted_index = self.wanted_index
+        board.index_keys = self.index_keys
+        board.zobrist_multipliers = self.zobrist_multipliers
+        self.stock.shared = True
+        for pile in self.move_dict.values():
+            pile.shared = True
+        return board
+
+    def own_pile(self, key):
+        """
+        returns the pile under key (the stock is 'S0'), first swapping it for
+        a copy if it is shared with a forked board, so it can be changed
+        """
+        pile = self.stock if key == 'S0' else self.move_dict[key]
+        if not pile.shared:
+            return pile
+        pile = pile.copy()
+        if key == 'S0':
+            self.stock = pile
+        else:
+            self.move_dict[key] = pile
+            if key == 'W0':
+                self.wp = pile
+            elif key[0] == 'F':
+                self.foundations[int(key[1:])] = pile
             else:
-                orig_pile.merge_pile(move_pile)
-                self.board_states.pop()
-                return False
-        return False
+                self.tableaus[int(key[1:])] = pile
+        return pile
 
-    def save_board_state(self):
+    def pop_changed_piles(self):
         """
-        adds a list of deep copies of stock, wastepile, foundations, and tableaus
-        to the board_states list/stack
+        returns the set of keys of piles that have changed since the last call
+        (stock is 'S0'), then starts tracking again from empty
         """
-        self.board_states.append([copy.deepcopy(self.stock), copy.deepcopy(self.wp), 
-                                  copy.deepcopy(self.foundations), copy.deepcopy(self.tableaus)])
+        changed = self.changed_piles
+        self.changed_piles = set()
+        return changed
 
     def undo_move(self):
         """
@@ -395,27 +758,174 @@ class Board:
         !! only directly use this method if you know what you're doing
         """
         # general idea:
-        # store the state of the board in a stack before every successful attempted move 
-        # when this is called, set the current board equal to the top state in the stack
-        # print("Undo")
-        # print(self)
-        # if len(self.board_states) != 0:
+        # every successful move leaves a record in the journal of what it changed
+        # when this is called, any cards flipped by hand since the last move are
+        # flipped back, then the last move is played backwards
         if self.moves != 0:
             self.moves -= 1
-            self.stock = []
-            self.wp = []
-            self.foundations = []
-            self.tableaus = []
-            self.stock, self.wp, self.foundations, self.tableaus = self.board_states.pop()
-        self.init_move_dict()
+            while self.move_journal[-1][0] == REVEAL_CARD:
+                self.reverse_record(self.move_journal.pop())
+            self.reverse_record(self.move_journal.pop())
+
+    def join_records(self, journal_start, moves_before):
+        """
+        joins every journal record from index journal_start on into one BATCH_MOVES
+        record, so that a single undo takes them all back, and counts them as one
+        move made after moves_before moves
+        """
+        records = tuple(self.move_journal[journal_start:])
+        del self.move_journal[journal_start:]
+        self.move_journal.append((BATCH_MOVES, records))
+        self.moves = moves_before + 1
+
+    def make_moves(self, moves, atomic=True, batch_undo=False):
+        """
+        makes a list of moves (in the attempt_move format, undos included), stopping
+        at the first one that attempt_move turns down
+        returns the index of that move, or None if every move was made
+        atomic => if a move is turned down, the board is put back the way it was
+            before the first move (otherwise the moves before it are kept)
+        batch_undo => the moves that were kept count as one move, so a single undo
+            takes them all back (not possible if the moves undo moves made before them)
+        """
+        if batch_undo and UNDO_MOVE in moves:
+            raise ValueError("moves that undo earlier moves can't be undone as one batch")
+        journal = self.move_journal
+        start_length, start_moves = len(journal), self.moves
+        floor = start_length    # the journal is never shorter than this during the moves
+        undone = []             # records from before the moves that the moves undid, oldest first
+        track_undos = atomic and UNDO_MOVE in moves
+        attempt_move = self.attempt_move
+        failed = None
+        for index, move in enumerate(moves):
+            if track_undos and move == UNDO_MOVE and self.moves != 0:
+                # remember the records this undo will throw away, in case they need putting back
+                first = len(journal) - 1
+                while journal[first][0] == REVEAL_CARD:
+                    first -= 1
+                if first < floor:
+                    undone[:0] = journal[first:floor]
+                    floor = first
+            if not attempt_move(move):
+                failed = index
+                break
+
+        if failed is not None and atomic:
+            while len(journal) > floor:
+                self.reverse_record(journal.pop())
+            for record in undone:
+                self.redo_record(record)
+                journal.append(record)
+            self.moves = start_moves
+        elif batch_undo and len(journal) > start_length:
+            self.join_records(start_length, start_moves)
+        return failed
+
+    def auto_complete(self, join_move=False):
+        """
+        once is_winnable holds, moves every card left to the foundations (drawing from
+        the stock when needed) as a single move that one undo takes back
+        if join_move is True, the cards join the last move made instead, so its
+        undo takes them back too
+        returns how many cards were moved (0 if the board isn't winnable yet)
+        """
+        if not self.is_winnable():
+            return 0
+        return self.play_foundation_moves(False, join_move)
+
+    def auto_play(self, join_move=False):
+        """
+        moves every card to the foundations that can never be needed on the tableaus
+        again (see is_safe_to_play), as a single move like auto_complete
+        returns how many cards were moved
+        """
+        return self.play_foundation_moves(True, join_move)
+
+    def play_foundation_moves(self, safe_only, join_move):
+        """
+        moves cards from the wastepile and tableaus to the foundations until none is left
+        that can go up (that is safe to play if safe_only), joined into one move
+        if safe_only is False, the stock is drawn from while no card can go up, and draws
+        (and waste cards put on tableaus) that didn't lead to another card going up are
+        taken back at the end
+        """
+        journal_length, moves = len(self.move_journal), self.moves
+        progress = (journal_length, moves)
+        cards_moved = 0
+        draws = 0       # draws since the last card went up
+        while True:
+            # looked up again every time, since a forked board swaps in its own copy of a pile it changes
+            sources = [('W0', self.wp)] + self.tab_keys()
+            foundations = self.found_keys()
+            move = self.next_foundation_move(sources, foundations, safe_only)
+            if move is not None:
+                self.attempt_move(move)
+                cards_moved += 1
+                draws = 0
+                progress = (len(self.move_journal), self.moves)
+            elif safe_only or draws > self.stock.get_length() + self.wp.get_length():
+                break
+            else:
+                # with 3 card draws the card needed can be stuck in the middle of the
+                # wastepile, so waste cards that fit on a tableau are put there first
+                # (which can't hurt once every card is face up)
+                move = self.next_foundation_move(sources[:1], sources[1:], False)
+                self.attempt_move(STOCK_DRAW_MOVE if move is None else move)
+                draws += 1
+        while len(self.move_journal) > progress[0]:
+            self.reverse_record(self.move_journal.pop())
+        self.moves = progress[1]
+        if cards_moved != 0:
+            if join_move and moves != 0:
+                self.join_records(journal_length - 1, moves - 1)
+            else:
+                self.join_records(journal_length, moves)
+        return cards_moved
+
+    def next_foundation_move(self, sources, foundations, safe_only):
+        """
+        returns a move of a face up card from one of the (key, pile) sources onto one
+        of the (key, pile) foundations, or None if there isn't one
+        """
+        for key, pile in sources:
+            if pile.get_length() == 0:
+                continue
+            code = pile.get_n_code(1)
+            if not code & FACE_UP or (safe_only and not self.is_safe_to_play(code)):
+                continue
+            for found_key, foundation in foundations:
+                if foundation.can_accept(code, 1, foundation.get_length()):
+                    return [key, 0, found_key]
+        return None
+
+    def is_safe_to_play(self, code):
+        """
+        a card can always be put on a foundation without hurting the game if it
+        will never be needed in the tableaus: either it is an ace or a 2, or every
+        card of the opposite color that could be placed on it is already on a foundation
+        """
+        code &= CODE_MASK
+        rank_value = CODE_RANK_VALUES[code]
+        if rank_value <= 2:
+            return True
+
+        num_decks = self.num_foundations // 4
+        built = {}
+        for fnd in self.foundations:
+            if fnd.get_length() != 0:
+                top = fnd.get_top_code() & CODE_MASK
+                if CODE_RANK_VALUES[top] >= rank_value - 1:
+                    built[CODE_SUITS[top]] = built.get(CODE_SUITS[top], 0) + 1
+        for suit in SUITS:
+            if COLORS[suit] != CODE_COLORS[code] and built.get(suit, 0) < num_decks:
+                return False
+        return True
 
     def is_winnable(self):
         if self.stock.get_length() != 0: return False
         for tableau in self.tableaus:
-            if tableau.get_length() != 0:
-                for card in tableau.cards:
-                    if not card.get_exposed():
-                        return False
+            if not tableau.is_fully_exposed():
+                return False
         return True
 
     def is_won(self):
@@ -425,6 +935,148 @@ class Board:
         else:
             return True
 
+    def snapshot(self, previous=None):
+        """
+        returns a BoardSnapshot of the board as it is now
+        piles are copied as bytes rather than shared, so the snapshot never changes
+        and never holds the board up
+        if previous is an older snapshot of this board, piles that haven't changed
+        since are reused from it instead of copied again
+        """
+        def pile_codes(key, pile, old_codes):
+            if previous is not None and self.pile_versions.get(key, 0) <= previous.version:
+                return old_codes
+            return visible_codes(pile)
+
+        if previous is None:
+            previous_piles = [None] * (2 + self.num_foundations + self.num_tableaus)
+        else:
+            previous_piles = [previous.stock, previous.waste] + list(previous.foundations) + list(previous.tableaus)
+        keys = [('S0', self.stock), ('W0', self.wp)] + self.found_keys() + self.tab_keys()
+        piles = [pile_codes(key, pile, old_codes) for (key, pile), old_codes in zip(keys, previous_piles)]
+        return BoardSnapshot(self.version, self.moves, piles[0], piles[1],
+                             tuple(piles[2:2 + self.num_foundations]), tuple(piles[2 + self.num_foundations:]))
+
+    def position_key(self, canonical=False):
+        """
+        returns a 64 bit Zobrist hash of the position: every card in every pile
+        (stock order included), face up or face down
+        every pile keeps its own hash up to date as cards move, so this is one
+        step per pile, no matter how many cards are on the board
+        if canonical is True, positions that only differ by the order of the
+        tableaus (or the order of the foundations) get the same key
+        """
+        key = self.stock.zobrist_key ^ self.wp.zobrist_key
+        if canonical:
+            for pile in self.foundations:
+                key += pile.zobrist_key
+            for pile in self.tableaus:
+                key += pile.zobrist_key
+        else:
+            for pile, multiplier in zip(self.foundations + self.tableaus, self.zobrist_multipliers):
+                key += pile.zobrist_key * multiplier
+        return key & ZOBRIST_MASK
+
+    def legal_moves(self):
+        """
+        returns a list of every move that attempt_move would currently accept,
+        in the same ['RX', Y, 'DZ'] format, without changing the board
+        * moves that pick up cards and put them back on the same pile are left out
+        * the stock draw is included whenever the stock or wastepile has cards
+        * if a tableau's top card is face down, ['TN', 0, 'TN'] is included to flip it
+        the exposed runs of the tableaus and the cards every pile is waiting for come
+        from pile_index, so only the piles changed since the last call are read again
+        """
+        wanted = self.wanted_cards()
+        pile_index = self.pile_index
+        moves = []
+        if self.stock.get_length() != 0 or self.wp.get_length() != 0:
+            moves.append(list(STOCK_DRAW_MOVE))
+
+        # tableaus: every card in the exposed run can be picked up
+        for key in self.index_keys[self.num_foundations:]:
+            needs, run, face_down = pile_index[key]
+            if face_down:
+                moves.append([key, 0, key])
+            for card_index, code in enumerate(run):
+                for dest_key in wanted.get(code, ()):
+                    if dest_key != key and (card_index == 0 or dest_key[0] == 'T'):
+                        moves.append([key, card_index, dest_key])
+
+        # wastepile and foundations: only the top card can be picked up
+        for key, pile in [('W0', self.wp)] + self.found_keys():
+            if pile.get_length() != 0:
+                code = pile.get_top_code()
+                for dest_key in wanted.get(code & CODE_MASK, ()):
+                    if dest_key != key:
+                        moves.append([key, 0, dest_key])
+        return moves
+
+    def wanted_cards(self):
+        """
+        returns an index of which destinations are waiting on which card
+        format is: {card code (FACE_UP bit masked off): [keys of piles it can be placed on]}
+        the same dictionary is returned until a foundation or tableau changes,
+        so it must not be changed
+        """
+        if self.wanted_index is None:
+            wanted = {}
+            for key in self.index_keys:
+                entry = self.pile_index.get(key)
+                if entry is None:
+                    entry = self.index_pile(key)
+                for code in entry[0]:
+                    wanted.setdefault(code, []).append(key)
+            self.wanted_index = wanted
+        return self.wanted_index
+
+    def index_pile(self, key):
+        """
+        works out what legal_moves needs to know about a foundation or tableau
+        and keeps it in pile_index until a journal record changes the pile
+        (note_change throws the entry away):
+        foundations => (codes of the cards it is waiting for,)
+        tableaus => (codes of the cards it is waiting for,
+                     codes of its exposed run from the top down, whether its top card is face down)
+        """
+        codes = self.move_dict[key].get_code_list()
+        if key[0] == 'F':
+            if len(codes) == 0:
+                entry = (ACE_CODES,)
+            elif FOUNDATION_NEXT[codes[-1] & CODE_MASK] is not None:
+                entry = ((FOUNDATION_NEXT[codes[-1] & CODE_MASK],),)
+            else:
+                entry = ((),)
+        else:
+            run = []
+            for code in reversed(codes):
+                if not code & FACE_UP:
+                    break
+                run.append(code & CODE_MASK)
+            needs = KING_CODES if len(codes) == 0 else TABLEAU_NEXT[codes[-1] & CODE_MASK]
+            entry = (needs, tuple(run), len(codes) != 0 and not codes[-1] & FACE_UP)
+        self.pile_index[key] = entry
+        return entry
+
+    def clear_index(self):
+        """
+        throws away pile_index, for when piles are changed without a journal record
+        """
+        self.pile_index = {}
+        self.wanted_index = None
+
+    def tab_keys(self):
+        """
+        returns a list of (move key, tableau) pairs
+        """
+        return [('T'+str(ind), tbl) for ind, tbl in enumerate(self.tableaus)]
+
+    def found_keys(self):
+        """
+        returns a list of (move key, foundation) pairs
+        """
+        return [('F'+str(ind), fnd) for ind, fnd in enumerate(self.foundations)]
+
     def str_tableaus(self):
         """
         draws tableaus horizontally
@@ -474,3 +1126,54 @@ class Board:
 
         return line1 + line2
 
+
+#============= FUNCTION DEFINITIONS =============#
+def visible_codes(pile):
+    """
+    returns a pile's card codes as bytes, with face down cards replaced by HIDDEN_CODE
+    """
+    return bytes(pile.get_code_list()).translate(VISIBLE_CODES)
+
+def zobrist_rows(kind, depth):
+    """
+    returns the Zobrist table for a kind of pile, adding rows until it has at least depth of them
+    every row comes from a random number generator seeded with the kind and the depth,
+    so keys are the same in every process and every run (they can be saved)
+    """
+    rows = ZOBRIST_TABLES[kind]
+    while len(rows) < depth:
+        rng = random.Random((ZOBRIST_SEED << 24) + (kind << 16) + len(rows))
+        rows.append([rng.getrandbits(64) for code in range(FACE_UP * 2)])
+    return rows
+
+def zobrist_span(kind, start, codes):
+    """
+    returns the xor of the Zobrist numbers of cards sitting in a pile
+    from depth start upwards
+    """
+    rows = ZOBRIST_TABLES[kind]
+    if start + len(codes) > len(rows):
+        rows = zobrist_rows(kind, start + len(codes))
+    key = 0
+    for code in codes:
+        key ^= rows[start][code]
+        start += 1
+    return key
+
+def zobrist_flip(kind, depth, code):
+    """
+    returns what to xor into a pile's key when the card at depth is flipped over
+    """
+    rows = ZOBRIST_TABLES[kind]
+    if depth >= len(rows):
+        rows = zobrist_rows(kind, depth + 1)
+    return rows[depth][code] ^ rows[depth][code ^ FACE_UP]
+
+def zobrist_multipliers(count):
+    """
+    returns (at least) count odd 64 bit numbers, one per foundation and tableau
+    """
+    while len(ZOBRIST_MULTIPLIERS) < count:
+        rng = random.Random((ZOBRIST_SEED << 24) + len(ZOBRIST_MULTIPLIERS))
+        ZOBRIST_MULTIPLIERS.append(rng.getrandbits(64) | 1)
+    return ZOBRIST_MULTIPLIERS
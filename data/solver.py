@@ -0,0 +1,326 @@
+"""
+finds a winning sequence of moves for a board, or proves that there is none
+solitaire glossary: https://semicolon.com/Solitaire/Rules/Glossary.html
+
+the solver plays on its own CompactBoard copy of the board it is given
+(face down cards included), so the original board is never changed
+
+general idea:
+* depth first search through Board.legal_moves, undoing moves to backtrack
+* positions are hashed (Board.position_key with canonical=True) so that tableaus
+  that only differ by column order (and foundations that only differ by order)
+  are treated as the same position
+* a transposition table remembers positions that have already been searched,
+  evicting the oldest ones when it is full
+* 'safe' foundation moves (ones that can never hurt) are made without trying
+  any alternatives
+* the search gives up once it runs out of nodes or time
+
+example:
+    status, moves = solve_seed('QgqEnPeXiUoSpCFHcdshvaTDyumGzKxZIBkVMbRWLOAftwYJlrjN')
+    if status == SOLVED:
+        for move in moves:
+            game.api_make_move(move)
+"""
+
+import time
+from . import seed_processor
+from .deck_of_cards import CODE_MASK, FACE_UP
+from .solitaire_objects import STOCK_DRAW_MOVE, DEFAULT_TABLEAUS, DEFAULT_DECKS
+from .compact_objects import CompactBoard
+
+
+#============= GLOBAL DEFINITIONS =============#
+SOLVED = 'solved'
+UNWINNABLE = 'unwinnable'
+UNKNOWN = 'unknown'     # ran out of nodes or time before finding an answer
+
+DEFAULT_MAX_NODES = 1000000
+DEFAULT_MAX_SECONDS = 30
+DEFAULT_TABLE_SIZE = 2000000
+
+# move priorities (lower is tried first)
+FOUNDATION_PRIORITY = 0
+REVEAL_PRIORITY = 1
+WASTE_PRIORITY = 2
+TABLEAU_PRIORITY = 3
+UNFOUND_PRIORITY = 4
+
+
+#============= CLASS DEFINITIONS =============#
+class TranspositionTable:
+    """
+    a set of position keys that holds at most max_size keys
+    when full, the oldest quarter of the keys are thrown away
+    """
+
+    def __init__(self, max_size=DEFAULT_TABLE_SIZE):
+        self.max_size = max_size
+        self.keys = {}
+        self.evictions = 0
+
+    def add(self, key):
+        """
+        adds key to the table
+        returns False if the key was already in the table
+        """
+        if key in self.keys:
+            return False
+        if len(self.keys) >= self.max_size:
+            self.evict(max(1, self.max_size // 4))
+        self.keys[key] = None
+        return True
+
+    def evict(self, num_keys):
+        """
+        removes the num_keys oldest keys (dicts remember insertion order)
+        """
+        for key in list(self.keys)[:num_keys]:
+            del self.keys[key]
+        self.evictions += num_keys
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class Solver:
+    """
+    max_nodes => the most moves the search will try before giving up
+    max_seconds => the most time the search will take before giving up
+    table_size => the most positions the transposition table will remember
+    after calling solve, nodes and seconds hold how much of each was used
+    """
+
+    def __init__(self, max_nodes=DEFAULT_MAX_NODES, max_seconds=DEFAULT_MAX_SECONDS, table_size=DEFAULT_TABLE_SIZE):
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.table_size = table_size
+        self.nodes = 0
+        self.seconds = 0
+        self.deadline = 0
+        self.pruned = False
+
+    def solve_seed(self, seed, deal_3=False, num_tableaus=DEFAULT_TABLEAUS, num_decks=DEFAULT_DECKS):
+        """
+        deals a new board from a seed (see seed_processor.py) and solves it
+        """
+        board = CompactBoard(num_tableaus=num_tableaus, num_decks=num_decks, deal_3=deal_3)
+        board.init_move_dict()
+        board.deal(seed_processor.seed_to_deck(seed))
+        return self.solve(board)
+
+    def solve(self, board):
+        """
+        searches for a sequence of moves that wins the game from the board's
+        current position
+        returns a tuple (status, moves):
+        * (SOLVED, [list of moves for attempt_move])
+        * (UNWINNABLE, None)
+        * (UNKNOWN, None) if the node or time budget ran out first
+
+        the first search skips tableau to tableau moves that do not uncover anything
+        useful, which finds most wins much faster. if it runs out of moves without
+        a win, the rest of the budget goes to a search that tries every move,
+        since that is the only way to be sure a game can't be won
+        """
+        if not board.auto_flip_tab:
+            raise ValueError("the solver can only play boards with auto_flip_tab turned on")
+
+        start_time = time.perf_counter()
+        self.deadline = start_time + self.max_seconds
+        self.nodes = 0
+        self.pruned = False
+
+        status, moves = self.search(compact_copy(board), True)
+        if status == UNWINNABLE and self.pruned:
+            status, moves = self.search(compact_copy(board), False)
+
+        self.seconds = time.perf_counter() - start_time
+        return status, moves
+
+    def search(self, board, prune):
+        """
+        depth first search from the board's position (see solve)
+        if prune is True, self.pruned is set when any move is skipped
+        """
+        table = TranspositionTable(self.table_size)
+        total_cards = board.num_foundations * 13
+
+        path = []           # moves made so far
+        path_keys = set()   # positions on the current path (never evicted, prevents cycles)
+        root_key = board.position_key(canonical=True)
+        table.add(root_key)
+        path_keys.add(root_key)
+        frames = [[self.candidate_moves(board, prune), 0, root_key]]
+
+        while frames:
+            if self.nodes >= self.max_nodes or (self.nodes % 256 == 0 and time.perf_counter() > self.deadline):
+                return UNKNOWN, None
+
+            frame = frames[-1]
+            if frame[1] == len(frame[0]):
+                # every move from here has been tried, back up
+                frames.pop()
+                path_keys.discard(frame[2])
+                if len(frames) != 0:
+                    self.take_back(board, path, frames[-1][0][frames[-1][1] - 1])
+                continue
+
+            sequence = frame[0][frame[1]]
+            frame[1] += 1
+            for move in sequence:
+                board.attempt_move(move)
+                path.append(move)
+            self.nodes += 1
+
+            if count_foundation_cards(board) == total_cards:
+                return SOLVED, path
+
+            key = board.position_key(canonical=True)
+            if key in path_keys or not table.add(key):
+                self.take_back(board, path, sequence)
+                continue
+            path_keys.add(key)
+            frames.append([self.candidate_moves(board, prune), 0, key])
+
+        return UNWINNABLE, None
+
+    def take_back(self, board, path, sequence):
+        """
+        undoes every move in a sequence made by the search
+        """
+        for move in sequence:
+            board.undo_move()
+            path.pop()
+
+    def candidate_moves(self, board, prune=False):
+        """
+        returns the sequences of moves worth trying from this position, best first
+        every sequence is a single move, except for playing a card from the wastepile,
+        which is the stock draws needed to reach the card followed by the card's move
+        if a safe foundation move exists, it is the only sequence returned
+        if prune is True, tableau to tableau moves are skipped unless they uncover
+        a face down card, empty a tableau or uncover a card that can go to a foundation
+        """
+        wanted = board.wanted_cards()
+        scored = []
+
+        for move in board.legal_moves():
+            orig_key, card_index, dest_key = move
+            if orig_key == 'S0' or orig_key == 'W0' or orig_key == dest_key:
+                continue    # stock and wastepile are handled by talon_plays
+            orig_pile = board.move_dict[orig_key]
+
+            if dest_key[0] == 'F':
+                if orig_key[0] == 'F':
+                    continue    # moving cards between foundations never helps
+                if is_safe_to_found(board, orig_pile.get_top_code()):
+                    return [[move]]
+                scored.append((FOUNDATION_PRIORITY, 0, [move]))
+            elif orig_key[0] == 'F':
+                scored.append((UNFOUND_PRIORITY, 0, [move]))
+            else:
+                remaining = orig_pile.get_length() - card_index - 1
+                if remaining == 0:
+                    if board.move_dict[dest_key].get_length() == 0:
+                        continue    # moving a whole pile to an empty tableau never helps
+                    scored.append((REVEAL_PRIORITY, 0, [move]))
+                elif not orig_pile.get_code_list()[remaining - 1] & FACE_UP:
+                    scored.append((REVEAL_PRIORITY, 0, [move]))
+                else:
+                    uncovered = orig_pile.get_code_list()[remaining - 1] & CODE_MASK
+                    if prune and not any(key[0] == 'F' for key in wanted.get(uncovered, ())):
+                        self.pruned = True
+                        continue
+                    scored.append((TABLEAU_PRIORITY, 0, [move]))
+
+        for draws, code in talon_plays(board):
+            for dest_key in wanted.get(code, ()):
+                move = ['W0', 0, dest_key]
+                if draws == 0 and dest_key[0] == 'F' and is_safe_to_found(board, code):
+                    return [[move]]
+                priority = FOUNDATION_PRIORITY if dest_key[0] == 'F' and draws == 0 else WASTE_PRIORITY
+                scored.append((priority, draws, [list(STOCK_DRAW_MOVE) for i in range(draws)] + [move]))
+
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return [sequence for priority, draws, sequence in scored]
+
+
+#============= FUNCTION DEFINITIONS =============#
+def solve_seed(seed, deal_3=False, **solver_options):
+    """
+    shortcut for Solver(**solver_options).solve_seed(seed, deal_3)
+    """
+    return Solver(**solver_options).solve_seed(seed, deal_3)
+
+
+def solve_board(board, **solver_options):
+    """
+    shortcut for Solver(**solver_options).solve(board)
+    """
+    return Solver(**solver_options).solve(board)
+
+
+def compact_copy(board):
+    """
+    returns a CompactBoard holding the same cards as board, with no move history
+    """
+    copy_board = CompactBoard(num_tableaus=board.num_tableaus, num_decks=board.num_foundations // 4,
+                              deal_3=board.stock.deal_3, auto_flip_tab=board.auto_flip_tab)
+    copy_board.init_move_dict()
+    copy_board.stock.merge_pile(board.stock)
+    copy_board.wp.merge_pile(board.wp)
+    for copy_pile, pile in zip(copy_board.foundations + copy_board.tableaus, board.foundations + board.tableaus):
+        copy_pile.merge_pile(pile)
+    return copy_board
+
+
+def talon_plays(board):
+    """
+    returns a list of (number of stock draws, card code) for every way a card can
+    be brought to the top of the wastepile by drawing from the stock, including
+    the card already on top (0 draws)
+    draws are played out on plain lists of codes, following Stock.deal_to_wp
+    """
+    stock = [code & CODE_MASK for code in board.stock.get_code_list()]
+    waste = [code & CODE_MASK for code in board.wp.get_code_list()]
+    plays = []
+    seen_states = set()
+    draws = 0
+    while True:
+        state = (len(stock), bytes(stock), bytes(waste))
+        if state in seen_states:
+            return plays
+        seen_states.add(state)
+        if len(waste) != 0:
+            plays.append((draws, waste[-1]))
+        elif len(stock) == 0:
+            return plays
+
+        if len(stock) == 0:
+            stock = waste[::-1]
+            waste = []
+        elif not board.stock.deal_3:
+            waste.append(stock.pop())
+        elif len(stock) > 2:
+            for i in range(3):
+                waste.append(stock.pop())
+        else:
+            waste.extend(stock)
+            stock = []
+        draws += 1
+
+
+def count_foundation_cards(board):
+    return sum(fnd.get_length() for fnd in board.foundations)
+
+
+def is_safe_to_found(board, code):
+    """
+    a card can always be put on a foundation without hurting the game
+    (see Board.is_safe_to_play)
+    """
+    return board.is_safe_to_play(code)
+
+
+
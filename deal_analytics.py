@@ -0,0 +1,188 @@
+"""
+works out difficulty features for a large batch of seeded deals and streams them
+to a folder of .npz files (one per chunk of seeds, one array per column)
+needs numpy
+
+the static features (see data/deal_features.py) are worked out for a whole chunk
+at once. with --solve, every deal is also run through the solver (data/solver.py)
+across several processes, within a node and time budget per deal
+
+columns: seed, every name in deal_features.FEATURES, and
+    solver_status   => SOLVER_STATUS_CODES (NOT_SOLVED without --solve)
+    solution_moves  => moves in the winning line the solver found (-1 if none)
+    solver_nodes    => moves the solver tried, for how hard the deal was to search
+                       (-1 without --solve)
+a deal that runs out of --solve-seconds is 'unknown', so with a time budget a deal
+near the limit can come out differently from one run to the next
+
+runs can be stopped and started again: chunks already written are skipped, as long
+as the seeds come in the same order with the same --chunk-size
+
+examples:
+    python deal_analytics.py --count 1000000 --deal-3 --out features/
+    python deal_analytics.py --seeds candidates.txt --solve --solve-seconds 2 --out pool/
+    python deal_analytics.py --deal-ids 0:1000000 --decks 2 --out shard0/
+
+reading the results back:
+    columns = read_features('pool/')
+    winnable = columns['seed'][columns['solver_status'] == SOLVER_STATUS_CODES[data.solver.SOLVED]]
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import os
+import time
+import numpy as np
+import data.solver
+from data.deal_features import DealFeatures
+from batch_runner import read_seed_file, random_seeds, deal_id_seeds, parse_deal_ids, chunked
+
+
+#============= GLOBAL DEFINITIONS =============#
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_SOLVE_NODES = 200000
+DEFAULT_SOLVE_SECONDS = 5
+SOLVE_CHUNK_SIZE = 16               # deals handed to a solver process at a time
+PART_NAME = 'part-{:06d}.npz'
+NOT_SOLVED = -1
+SOLVER_STATUS_CODES = {data.solver.UNKNOWN: 0, data.solver.SOLVED: 1, data.solver.UNWINNABLE: 2}
+SOLVER_COLUMNS = ['solver_status', 'solution_moves', 'solver_nodes']
+
+
+#============= WORKER PROCESS =============#
+# set once per worker process by init_worker
+worker_solver = None
+worker_options = None
+
+
+def init_worker(max_nodes, max_seconds, solve_options):
+    global worker_solver, worker_options
+    worker_solver = data.solver.Solver(max_nodes=max_nodes, max_seconds=max_seconds)
+    worker_options = solve_options
+
+
+def solve_chunk(seeds):
+    """
+    solves every seed in a chunk and returns a list of (status code, solution moves, nodes)
+    """
+    results = []
+    for seed in seeds:
+        status, moves = worker_solver.solve_seed(seed, **worker_options)
+        results.append((SOLVER_STATUS_CODES[status], len(moves) if moves is not None else -1, worker_solver.nodes))
+    return results
+
+
+#============= RESULT FILES =============#
+def write_part(out_dir, index, columns):
+    """
+    writes one chunk's columns to out_dir as part number index
+    the file is written next to its final name and then swapped in, so a part
+    that is there is always whole
+    """
+    path = os.path.join(out_dir, PART_NAME.format(index))
+    temp_path = f'{path}.tmp.npz'
+    np.savez(temp_path, **columns)
+    os.replace(temp_path, path)
+
+
+def count_parts(out_dir):
+    """
+    returns how many parts in a row (from part 0) are already in out_dir
+    """
+    index = 0
+    while os.path.exists(os.path.join(out_dir, PART_NAME.format(index))):
+        index += 1
+    return index
+
+
+def read_features(out_dir):
+    """
+    returns {column name: array} with every part in out_dir joined together
+    """
+    parts = []
+    for index in range(count_parts(out_dir)):
+        with np.load(os.path.join(out_dir, PART_NAME.format(index))) as part:
+            parts.append({name: part[name] for name in part.files})
+    if len(parts) == 0:
+        return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+#============= ANALYTICS =============#
+def analyze_chunk(seeds, features, executor=None):
+    """
+    returns the columns for a chunk of seeds (solving them with executor, if given)
+    """
+    columns = {'seed': np.array(seeds)}
+    columns.update(features.compute_seeds(seeds))
+    if executor is not None:
+        results = [result for chunk_results in executor.map(solve_chunk, chunked(seeds, SOLVE_CHUNK_SIZE))
+                   for result in chunk_results]
+    else:
+        results = [(NOT_SOLVED, -1, -1)] * len(seeds)
+    for name, values, dtype in zip(SOLVER_COLUMNS, zip(*results), (np.int8, np.int16, np.int32)):
+        columns[name] = np.array(values, dtype=dtype)
+    return columns
+
+
+def run_analysis(seeds, out_dir, chunk_size=DEFAULT_CHUNK_SIZE, deal_3=False, decks=1, solve=False, workers=None,
+                 max_nodes=DEFAULT_SOLVE_NODES, max_seconds=DEFAULT_SOLVE_SECONDS):
+    """
+    works out the columns for every seed from an iterable of seeds and writes them
+    to out_dir a chunk at a time, so seeds can come from a generator of any length
+    returns the number of deals analyzed
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    features = DealFeatures(num_decks=decks, deal_3=deal_3)
+    first_part = count_parts(out_dir)
+    chunks = chunked(itertools.islice(seeds, first_part * chunk_size, None), chunk_size)
+    executor = None
+    if solve:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(), initializer=init_worker,
+            initargs=(max_nodes, max_seconds, {'deal_3': deal_3, 'num_decks': decks}))
+    deals = 0
+
+    try:
+        for index, chunk in enumerate(chunks, first_part):
+            write_part(out_dir, index, analyze_chunk(chunk, features, executor))
+            deals += len(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return deals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="work out difficulty features for a batch of seeded deals")
+    parser.add_argument('--seeds', help="file with one seed per line")
+    parser.add_argument('--count', type=int, help="number of random seeds to analyze instead of a seed file")
+    parser.add_argument('--deal-ids', type=parse_deal_ids, help="'start:stop' range of deal ids to analyze instead of a seed file")
+    parser.add_argument('--decks', type=int, default=1, help="number of decks for every seed")
+    parser.add_argument('--out', required=True, help="folder to write the .npz parts to")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="seeds per part")
+    parser.add_argument('--deal-3', action='store_true', help="draw 3 cards at a time from the stock")
+    parser.add_argument('--solve', action='store_true', help="also run every deal through the solver")
+    parser.add_argument('--solve-nodes', type=int, default=DEFAULT_SOLVE_NODES, help="most moves the solver tries per deal")
+    parser.add_argument('--solve-seconds', type=float, default=DEFAULT_SOLVE_SECONDS, help="most seconds the solver takes per deal")
+    parser.add_argument('--workers', type=int, help="number of solver processes (default: one per cpu)")
+    args = parser.parse_args()
+
+    if args.seeds:
+        seeds = read_seed_file(args.seeds)
+    elif args.count:
+        seeds = random_seeds(args.count, args.decks)
+    elif args.deal_ids:
+        seeds = deal_id_seeds(args.deal_ids, args.decks)
+    else:
+        parser.error("one of --seeds, --count or --deal-ids is required")
+
+    start_time = time.perf_counter()
+    deals = run_analysis(seeds, args.out, args.chunk_size, args.deal_3, args.decks, args.solve, args.workers,
+                         args.solve_nodes, args.solve_seconds)
+    print(f'Analyzed {deals} deals in {time.perf_counter() - start_time:.1f} seconds')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+serves the Game API to many clients at once over a local TCP or Unix socket
+(asyncio, nothing outside the standard library)
+
+the protocol is JSON lines: every request is one JSON object on a line and gets
+one JSON object back on a line, in the order the requests were sent, so a client
+can send many requests without waiting for the answers (pipelining)
+
+    {"id": 1, "op": "new", "options": {"deal_3": true}}     => {"id": 1, "result": {"session": "9f2c..."}}
+    {"id": 2, "session": "9f2c...", "op": "move", "move": ["S0", 0, "S0"]}
+                                                            => {"id": 2, "result": true}
+    {"id": 3, "session": "nope", "op": "state"}             => {"id": 3, "error": "unknown session: nope"}
+
+ops (every op but new, ping and info needs a session):
+    new     options => starts a game (options are Game.new_game's), returns {"session": id}
+    move    move => api_make_move, returns true/false
+    moves   moves, atomic, batch_undo => api_make_moves, returns the index of the
+            first move turned down or null
+    undo    => api_undo_move
+    legal   => api_get_legal_moves
+    state   since => the board (like the api_read_* methods) as {"version", "moves",
+            "won", "stock", "waste", "foundations", "tableaus"}, or just {"version"}
+            if the board hasn't changed since version since
+    close   => ends the session
+    ping    => returns "pong"
+    info    => returns {"sessions": number of live sessions}
+"id" is optional and is sent back as it was
+
+sessions that haven't been used for idle_timeout seconds are closed, and so is the
+least recently used one whenever more than max_sessions are live. a connection
+reads at most pipeline requests ahead of the answers it has written, so a client
+that doesn't read its answers is slowed down rather than piling up memory
+
+with workers > 0, sessions are spread over that many worker processes (a session
+always goes to the same one) so moves don't hold up the event loop
+
+examples:
+    python game_server.py --port 8765
+    python game_server.py --unix /tmp/solitaire.sock --workers 4 --max-sessions 100000
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import secrets
+import socket
+import time
+from data.game import Game
+
+
+#============= GLOBAL DEFINITIONS =============#
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_IDLE_TIMEOUT = 15 * 60      # seconds
+DEFAULT_PIPELINE = 64               # requests a connection can have waiting for an answer
+DEFAULT_SWEEP_INTERVAL = 10         # seconds between looks for idle sessions
+MAX_LINE = 1 << 20                  # longest request line, in bytes
+GAME_OPTIONS = {'deal_3', 'auto_flip_tab', 'decks', 'tableau_qty', 'custom_seed', 'compact',
+                'auto_complete', 'auto_play'}
+SESSION_OPS = {'move', 'moves', 'undo', 'legal', 'state', 'close'}
+
+
+#============= SESSIONS =============#
+class RequestError(Exception):
+    """a request that can't be answered (the message is sent back to the client)"""
+
+
+class SessionStore:
+    """
+    the games being played, kept in least recently used order
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = collections.OrderedDict()   # session id => [game, time last used]
+        self.evicted = 0
+
+    def handle(self, request):
+        """
+        answers a request (see the module docstring) and returns the response dictionary
+        """
+        response = {'id': request.get('id')}
+        try:
+            response['result'] = self.run(request)
+        except RequestError as error:
+            response['error'] = str(error)
+        except Exception as error:
+            # a malformed move or option can fail anywhere in the engine, and one
+            # client's bad request mustn't take the server (or other sessions) down
+            response['error'] = f'bad request: {error!r}'
+        return response
+
+    def run(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return 'pong'
+        if op == 'info':
+            return {'sessions': len(self.sessions)}
+        if op == 'new':
+            session_id = request.get('session') or secrets.token_hex(8)
+            return {'session': self.new_session(session_id, request.get('options') or {})}
+        if op not in SESSION_OPS:
+            raise RequestError(f'unknown op: {op}')
+
+        game = self.get_game(request.get('session'))
+        if op == 'move':
+            return game.api_make_move(request['move'])
+        if op == 'moves':
+            return game.api_make_moves(request['moves'], request.get('atomic', True), request.get('batch_undo', False))
+        if op == 'undo':
+            game.api_undo_move()
+            return None
+        if op == 'legal':
+            return game.api_get_legal_moves()
+        if op == 'state':
+            return read_state(game, request.get('since'))
+        del self.sessions[request['session']]
+        return None
+
+    def new_session(self, session_id, options):
+        unknown = set(options) - GAME_OPTIONS
+        if unknown:
+            raise RequestError(f'unknown game options: {sorted(unknown)}')
+        game = Game(api_use=True)
+        game.new_game(**options)
+        self.sessions[session_id] = [game, time.monotonic()]
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+        return session_id
+
+    def get_game(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise RequestError(f'unknown session: {session_id}')
+        session[1] = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session[0]
+
+    def evict_idle(self):
+        """
+        closes every session that hasn't been used for idle_timeout seconds
+        and returns how many were closed (the oldest are first, so it stops
+        at the first one still in use)
+        """
+        oldest_allowed = time.monotonic() - self.idle_timeout
+        closed = 0
+        while self.sessions:
+            session_id, (game, last_used) = next(iter(self.sessions.items()))
+            if last_used >= oldest_allowed:
+                break
+            del self.sessions[session_id]
+            closed += 1
+        self.evicted += closed
+        return closed
+
+
+def read_state(game, since=None):
+    """
+    returns what the api_read_* methods return, in one dictionary
+    (just the version if it is still since)
+    """
+    version = game.api_get_version()
+    if since == version:
+        return {'version': version}
+    return {'version': version,
+            'moves': game.api_get_moves(),
+            'won': game.api_is_won(),
+            'stock': game.api_read_stock(),
+            'waste': game.api_read_waste_pile(),
+            'foundations': game.api_read_foundations(),
+            'tableaus': game.api_read_tableaus()}
+
+
+#============= WORKER PROCESS =============#
+# every worker process keeps its own sessions, set up once by init_shard
+shard_store = None
+
+
+def init_shard(max_sessions, idle_timeout):
+    global shard_store
+    shard_store = SessionStore(max_sessions, idle_timeout)
+
+
+def shard_handle(request):
+    return shard_store.handle(request)
+
+
+def shard_evict_idle():
+    return shard_store.evict_idle()
+
+
+#============= SERVER =============#
+def session_shard(session_id, num_shards):
+    """
+    returns the index of the shard that holds a session id, or None if it
+    isn't an id the server hands out (16 hex digits)
+    """
+    if not isinstance(session_id, str) or len(session_id) != 16:
+        return None
+    try:
+        return int(session_id, 16) % num_shards
+    except ValueError:
+        return None
+
+
+class GameServer:
+    """
+    answers requests from any number of connections
+    workers => 0 to play every game in the event loop's process, or the number
+        of worker processes to spread the sessions over (max_sessions is split
+        evenly between them)
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT, workers=0,
+                 pipeline=DEFAULT_PIPELINE, sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.pipeline = pipeline
+        self.sweep_interval = sweep_interval
+        self.store = None
+        self.shards = []
+        if workers == 0:
+            self.store = SessionStore(max_sessions, idle_timeout)
+        else:
+            # one process per executor, so a session's requests are played in the order they came in
+            shard_sessions = -(-max_sessions // workers)
+            self.shards = [concurrent.futures.ProcessPoolExecutor(1, initializer=init_shard,
+                                                                  initargs=(shard_sessions, idle_timeout))
+                           for i in range(workers)]
+        self.server = None
+        self.sweeper = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """
+        starts listening (on unix_path if it is given, otherwise on host and port)
+        and returns the asyncio server
+        """
+        if unix_path is not None:
+            self.server = await asyncio.start_unix_server(self.serve_connection, unix_path, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.serve_connection, host, port, limit=MAX_LINE)
+        self.sweeper = asyncio.create_task(self.sweep())
+        return self.server
+
+    async def close(self):
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for shard in self.shards:
+            shard.shutdown(cancel_futures=True)
+
+    async def sweep(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            if self.store is not None:
+                self.store.evict_idle()
+            for shard in self.shards:
+                await loop.run_in_executor(shard, shard_evict_idle)
+
+    def submit(self, request):
+        """
+        returns a future of the response to a request
+        """
+        loop = asyncio.get_running_loop()
+        if request.get('op') == 'new':
+            request['session'] = secrets.token_hex(8)   # picked here, so it can choose the shard
+        if self.store is not None:
+            future = loop.create_future()
+            future.set_result(self.store.handle(request))
+            return future
+        shard_index = session_shard(request.get('session'), len(self.shards))
+        if shard_index is not None:
+            shard = self.shards[shard_index]
+        elif request.get('op') == 'info':
+            return asyncio.ensure_future(self.shard_info(request))
+        else:
+            # ops without a session, and ids that no session could have (which
+            # the shard answers with 'unknown session', like the in-process store)
+            shard = self.shards[0]
+        return loop.run_in_executor(shard, shard_handle, request)
+
+    async def shard_info(self, request):
+        loop = asyncio.get_running_loop()
+        responses = await asyncio.gather(*[loop.run_in_executor(shard, shard_handle, request) for shard in self.shards])
+        return {'id': request.get('id'), 'result': {'sessions': sum(response['result']['sessions'] for response in responses)}}
+
+    async def serve_connection(self, reader, writer):
+        """
+        reads requests and queues up their answers, while write_responses writes
+        them back in order. once pipeline answers are waiting, reading stops
+        until the client takes some
+        """
+        responses = asyncio.Queue(self.pipeline)
+        writing = asyncio.create_task(self.write_responses(writer, responses))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break   # a line over MAX_LINE, or the connection was dropped
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('a request must be a JSON object')
+                except ValueError as error:
+                    future = asyncio.get_running_loop().create_future()
+                    future.set_result({'id': None, 'error': f'bad request: {error}'})
+                else:
+                    future = self.submit(request)
+                await responses.put(future)
+        finally:
+            await responses.put(None)
+            await writing
+            writer.close()
+
+    async def write_responses(self, writer, responses):
+        """
+        writes every answer as it is ready, in the order the requests came in
+        (once the connection is lost, the rest are thrown away)
+        """
+        connected = True
+        while True:
+            future = await responses.get()
+            if future is None:
+                return
+            response = await future
+            if connected:
+                try:
+                    writer.write(json.dumps(response).encode() + b'\n')
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+
+#============= CLIENT =============#
+class GameClient:
+    """
+    a small blocking client, mostly for scripts and testing
+        client = GameClient(port=8765)
+        session = client.request('new', options={'deal_3': True})['result']['session']
+        client.request('move', session=session, move=['S0', 0, 'S0'])
+    send and receive can be used separately to pipeline requests
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        if unix_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(unix_path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile('rwb')
+
+    def send(self, op, **fields):
+        self.file.write(json.dumps(dict(fields, op=op)).encode() + b'\n')
+
+    def receive(self):
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def request(self, op, **fields):
+        self.send(op, **fields)
+        return self.receive()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+#============= MAIN =============#
+async def serve(args):
+    server = GameServer(args.max_sessions, args.idle_timeout, args.workers, args.pipeline)
+    await server.start(args.host, args.port, args.unix)
+    print(f'Serving on {args.unix or f"{args.host}:{args.port}"}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve the solitaire Game API over a local socket")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=0, help="worker processes to play the games in (default: none)")
+    parser.add_argument('--max-sessions', type=int, default=DEFAULT_MAX_SESSIONS)
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT, help="seconds")
+    parser.add_argument('--pipeline', type=int, default=DEFAULT_PIPELINE,
+                        help="requests a connection can send ahead of reading the answers")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
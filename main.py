@@ -25,7 +25,8 @@ def main():
 
         gm = Game()
         gm.new_game(deal_3=False,
-                    commandline=options[choice])
+                    commandline=options[choice],
+                    auto_complete=True)
                     # custom_seed='aWRcXysfdHiGnIUVEDKQrwevjokpNqMbSgzZFCJTAuxPhOmLBYlt')
 
 
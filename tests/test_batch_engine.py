@@ -0,0 +1,121 @@
+"""
+checks that BatchBoard plays exactly like Board (and CompactBoard)
+run from the repository folder with 'python -m pytest tests' or
+'python -m unittest discover tests' (skipped if numpy isn't installed)
+"""
+
+import unittest
+from data import seed_processor
+from data.deck_of_cards import CODE_MASK
+from data.solitaire_objects import Board
+from data.compact_objects import CompactBoard
+
+try:
+    import numpy as np
+    from data.batch_engine import BatchBoard, EMPTY
+except ImportError:
+    np = None
+
+
+#============= GLOBAL DEFINITIONS =============#
+# (board class, BatchBoard and Board options) for every combination checked
+PARITY_CASES = [
+    (Board, {}),
+    (Board, {'deal_3': True}),
+    (Board, {'auto_flip_tab': False}),
+    (Board, {'deal_3': True, 'auto_flip_tab': False}),
+    (Board, {'num_tableaus': 9, 'num_decks': 2}),
+    (Board, {'num_tableaus': 9, 'num_decks': 2, 'deal_3': True}),
+    (CompactBoard, {}),
+    (CompactBoard, {'deal_3': True, 'auto_flip_tab': False}),
+]
+
+
+#============= FUNCTION DEFINITIONS =============#
+def board_position_codes(board):
+    """
+    returns a Board's position in the same format as BatchBoard.position_codes
+    """
+    found_tops = bytes(fnd.get_top_code() & CODE_MASK if fnd.get_length() != 0 else EMPTY for fnd in board.foundations)
+    return ((bytes(board.stock.get_code_list()), bytes(board.wp.get_code_list()), found_tops) +
+            tuple(bytes(tbl.get_code_list()) for tbl in board.tableaus))
+
+
+def check_parity(num_boards=32, steps=400, seed=0, board_class=Board, **options):
+    """
+    plays the same moves on a BatchBoard and on one Board per game and raises
+    AssertionError at the first difference in position, legal moves, accepted
+    moves or won state. most moves are picked from the legal ones, the rest are
+    random actions that are usually illegal
+    options are passed to both (num_tableaus, num_decks, deal_3, auto_flip_tab)
+    returns the number of (board, step) pairs compared
+    """
+    rng = np.random.default_rng(seed)
+    batch = BatchBoard(num_boards, **options)
+    batch.deal_ids(range(seed * num_boards, (seed + 1) * num_boards))
+    boards = []
+    for deal_id in range(seed * num_boards, (seed + 1) * num_boards):
+        board = board_class(**options)
+        board.init_move_dict()
+        board.deal(seed_processor.deal_to_deck(deal_id, batch.num_decks))
+        boards.append(board)
+
+    for step in range(steps):
+        legal = batch.legal_mask()
+        actions = np.empty(num_boards, dtype=np.intp)
+        for i, board in enumerate(boards):
+            expected = sorted(tuple(move) for move in board.legal_moves())
+            actual = sorted(tuple(batch.actions[action]) for action in np.flatnonzero(legal[i]))
+            assert actual == expected, f'legal moves differ on board {i} at step {step}: {actual} != {expected}'
+            assert batch.position_codes(i) == board_position_codes(board), f'boards {i} differ at step {step}'
+            assert batch.is_won()[i] == board.is_won(), f'won differs on board {i} at step {step}'
+
+            if legal[i].any() and rng.random() < 0.9:
+                actions[i] = rng.choice(np.flatnonzero(legal[i]))
+            else:
+                actions[i] = rng.integers(1 + batch.num_tableaus, batch.num_actions)    # a move, never a draw or flip
+
+        made = batch.step(actions)
+        for i, board in enumerate(boards):
+            result = board.attempt_move(batch.action_to_move(actions[i]))
+            assert made[i] == result, f'board {i} step {step}: {batch.actions[actions[i]]} gave {made[i]} != {result}'
+        assert list(batch.moves) == [board.moves for board in boards], f'move counts differ at step {step}'
+    return num_boards * steps
+
+
+#============= TESTS =============#
+@unittest.skipIf(np is None, "the batch engine needs numpy")
+class TestBatchParity(unittest.TestCase):
+
+    def test_parity(self):
+        for board_class, options in PARITY_CASES:
+            with self.subTest(board_class=board_class.__name__, **options):
+                self.assertEqual(check_parity(board_class=board_class, **options), 32 * 400)
+
+    def test_parity_other_deals(self):
+        for seed in (1, 2):
+            with self.subTest(seed=seed):
+                check_parity(num_boards=16, steps=300, seed=seed, deal_3=seed == 2)
+
+    def test_moves_round_trip(self):
+        batch = BatchBoard(1)
+        for action, move in enumerate(batch.actions):
+            self.assertEqual(batch.move_to_action(batch.action_to_move(action)), action)
+
+    def test_to_board(self):
+        batch = BatchBoard(8, deal_3=True)
+        batch.deal_ids(range(8))
+        rng = np.random.default_rng(0)
+        for step in range(60):
+            legal = batch.legal_mask()
+            batch.step(np.array([rng.choice(np.flatnonzero(row)) for row in legal]))
+        for i in range(batch.num_boards):
+            board = batch.to_board(i)
+            self.assertEqual(board_position_codes(board), batch.position_codes(i))
+            other = BatchBoard(1, deal_3=True)
+            other.load_board(0, board)
+            self.assertEqual(other.position_codes(0), batch.position_codes(i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+"""
+checks the move journal, legal_moves, position_key and make_moves of Board
+(and CompactBoard) against slow ways of working out the same thing
+run from the repository folder with 'python -m pytest tests' or
+'python -m unittest discover tests'
+"""
+
+import copy
+import random
+import unittest
+from data import seed_processor
+from data.solitaire_objects import Board, STOCK_DRAW_MOVE, UNDO_MOVE, REVEAL_CARD
+from data.compact_objects import CompactBoard
+
+
+#============= GLOBAL DEFINITIONS =============#
+# (board class, Board options) for every combination checked
+BOARD_CASES = [
+    (Board, {}),
+    (Board, {'deal_3': True, 'auto_flip_tab': False}),
+    (Board, {'num_tableaus': 9, 'num_decks': 2}),
+    (CompactBoard, {}),
+    (CompactBoard, {'deal_3': True, 'auto_flip_tab': False}),
+]
+AUTO_PLAY = 'auto_play'         # stands in for a call to auto_play in a list of moves
+
+
+#============= FUNCTION DEFINITIONS =============#
+def deal_board(board_class, deal_id, **options):
+    board = board_class(**options)
+    board.init_move_dict()
+    board.deal(seed_processor.deal_to_deck(deal_id, board.num_foundations // 4))
+    return board
+
+
+def board_cards(board):
+    """
+    returns the card codes of every pile on a board (stock, waste, foundations, tableaus)
+    """
+    return tuple(tuple(pile.get_code_list()) for pile in [board.stock, board.wp] + board.foundations + board.tableaus)
+
+
+def replay(board_class, deal_id, options, history):
+    """
+    returns a board dealt fresh with history played on it
+    (moves, AUTO_PLAY, or lists of moves made as one batch)
+    """
+    board = deal_board(board_class, deal_id, **options)
+    for move in history:
+        if move == AUTO_PLAY:
+            board.auto_play()
+        elif isinstance(move[0], list):
+            board.make_moves(move, batch_undo=True)
+        else:
+            board.attempt_move(move)
+    return board
+
+
+def rehashed_key(board, canonical):
+    """
+    returns board.position_key(canonical) with every pile's hash worked out from scratch
+    """
+    piles = [board.stock, board.wp] + board.foundations + board.tableaus
+    kept_keys = [pile.zobrist_key for pile in piles]
+    for pile in piles:
+        pile.rehash()
+    key = board.position_key(canonical)
+    for pile, zobrist_key in zip(piles, kept_keys):
+        pile.zobrist_key = zobrist_key
+    return key
+
+
+def brute_force_moves(board):
+    """
+    returns the set of moves attempt_move accepts, tried one at a time on forks of board
+    (a same-pile move only counts if it flips a card, like legal_moves)
+    """
+    keys = list(board.move_dict)
+    candidates = [STOCK_DRAW_MOVE] + [[key, 0, key] for key in keys if key[0] == 'T']
+    candidates += [[orig_key, index, dest_key] for orig_key in keys for dest_key in keys if orig_key != dest_key
+                   for index in range(board.move_dict[orig_key].get_length())]
+    accepted = set()
+    for move in candidates:
+        fork = board.fork()
+        if fork.attempt_move(move) and (move[0] != move[2] or move == STOCK_DRAW_MOVE or
+                                        fork.move_journal[0][0] == REVEAL_CARD):
+            accepted.add(tuple(move))
+    return accepted
+
+
+#============= TESTS =============#
+class TestBoard(unittest.TestCase):
+
+    def test_undo_matches_replay(self):
+        rng = random.Random(0)
+        for board_class, options in BOARD_CASES:
+            for deal_id in range(3):
+                with self.subTest(board_class=board_class.__name__, deal_id=deal_id, **options):
+                    board = deal_board(board_class, deal_id, **options)
+                    history = []
+                    starts = []     # where every move that undo takes back starts in history
+                    for step in range(150):
+                        legal = board.legal_moves()
+                        moves = board.moves
+                        choice = rng.random()
+                        if choice < 0.15:
+                            board.undo_move()
+                            if starts:
+                                del history[starts.pop():]
+                            self.assertEqual(board_cards(board), board_cards(replay(board_class, deal_id, options, history)))
+                            continue
+                        elif choice < 0.2:
+                            move = AUTO_PLAY
+                            board.auto_play()
+                        elif choice < 0.25 and len(legal) != 0:
+                            move = [rng.choice(legal), STOCK_DRAW_MOVE]
+                            if board.make_moves(move, batch_undo=True) is not None:
+                                continue
+                        else:
+                            move = rng.choice(legal) if legal else STOCK_DRAW_MOVE
+                            board.attempt_move(move)
+                        if board.moves > moves:
+                            starts.append(len(history))
+                        history.append(move)
+                    while board.moves != 0:
+                        board.undo_move()
+                        del history[starts.pop():]
+                        self.assertEqual(board_cards(board), board_cards(replay(board_class, deal_id, options, history)))
+
+    def test_legal_moves_on_forks(self):
+        rng = random.Random(1)
+        for board_class, options in BOARD_CASES:
+            with self.subTest(board_class=board_class.__name__, **options):
+                boards = [deal_board(board_class, 4, **options)]
+                for step in range(60):
+                    board = rng.choice(boards)
+                    legal = board.legal_moves()
+                    self.assertEqual(set(map(tuple, legal)), brute_force_moves(board))
+                    if rng.random() < 0.1:
+                        boards = boards[-3:] + [board.fork()]
+                    elif rng.random() < 0.1 and board.moves != 0:
+                        board.undo_move()
+                    else:
+                        board.attempt_move(rng.choice(legal) if legal else STOCK_DRAW_MOVE)
+
+    def test_position_key_matches_rehash(self):
+        rng = random.Random(2)
+        for board_class, options in BOARD_CASES:
+            with self.subTest(board_class=board_class.__name__, **options):
+                board = deal_board(board_class, 5, **options)
+                for step in range(300):
+                    legal = board.legal_moves()
+                    board.attempt_move(rng.choice(legal) if legal and rng.random() > 0.15 else UNDO_MOVE)
+                    for canonical in (False, True):
+                        self.assertEqual(board.position_key(canonical), rehashed_key(board, canonical))
+                key = board.position_key(canonical=True)
+                rng.shuffle(board.tableaus)
+                rng.shuffle(board.foundations)
+                self.assertEqual(board.position_key(canonical=True), key)
+
+    def test_make_moves_rollback(self):
+        rng = random.Random(3)
+        for board_class, options in BOARD_CASES:
+            with self.subTest(board_class=board_class.__name__, **options):
+                board = deal_board(board_class, 6, **options)
+                for step in range(80):
+                    before = (board_cards(board), board.moves, len(board.move_journal), board.position_key())
+                    moves = []
+                    board_copy = copy.deepcopy(board)
+                    for i in range(rng.randrange(1, 6)):
+                        legal = board_copy.legal_moves()
+                        move = rng.choice(legal + [UNDO_MOVE]) if legal else UNDO_MOVE
+                        board_copy.attempt_move(move)
+                        moves.append(move)
+                    moves.append(['W0', 0, 'W0'])      # never accepted
+                    self.assertEqual(board.make_moves(moves), len(moves) - 1)
+                    self.assertEqual((board_cards(board), board.moves, len(board.move_journal), board.position_key()), before)
+
+                    self.assertEqual(board.make_moves(moves, atomic=False), len(moves) - 1)
+                    self.assertEqual(board_cards(board), board_cards(board_copy))
+                    self.assertEqual(board.moves, board_copy.moves)
+
+    def test_flip_is_accepted(self):
+        rng = random.Random(4)
+        board = deal_board(Board, 0, auto_flip_tab=False)
+        for step in range(200):
+            legal = board.legal_moves()
+            previous = board_cards(board)
+            board.attempt_move(rng.choice([move for move in legal if move[0][0] != 'F']))
+            flips = [move for move in board.legal_moves() if move[0] == move[2] and move != STOCK_DRAW_MOVE]
+            if len(flips) != 0:
+                break
+        self.assertNotEqual(flips, [])
+        moves = board.moves
+        self.assertIsNone(board.make_moves(flips[:1]))
+        self.assertEqual(board.moves, moves)
+        self.assertTrue(board.move_dict[flips[0][0]].get_card_list()[-1].get_exposed())
+        self.assertNotIn(flips[0], board.legal_moves())
+        # one undo takes back the flip and the move that uncovered the card
+        board.undo_move()
+        self.assertEqual(board.moves, moves - 1)
+        self.assertEqual(board_cards(board), previous)
+
+if __name__ == '__main__':
+    unittest.main()
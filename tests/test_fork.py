@@ -0,0 +1,122 @@
+"""
+checks that a forked board (Board.fork) plays like a copy of the board it was
+forked from and never changes it, including auto_play and auto_complete, which
+look up the piles a fork swaps for its own copies
+run from the repository folder with 'python -m pytest tests' or
+'python -m unittest discover tests'
+"""
+
+import copy
+import random
+import unittest
+from data import seed_processor
+from data.game import Game
+from data.solitaire_objects import Board, STOCK_DRAW_MOVE
+from data.compact_objects import CompactBoard
+from data.solver import solve_board, SOLVED
+
+
+#============= GLOBAL DEFINITIONS =============#
+BOARD_CLASSES = [Board, CompactBoard]
+SOLVED_DEALS = [2, 3, 5]        # deal ids the solver wins within SOLVER_NODES
+SOLVER_NODES = 20000
+
+
+#============= FUNCTION DEFINITIONS =============#
+def deal_board(board_class, deal_id, **options):
+    board = board_class(**options)
+    board.init_move_dict()
+    board.deal(seed_processor.deal_to_deck(deal_id))
+    return board
+
+
+def board_cards(board):
+    """
+    returns the card codes of every pile on a board (stock, waste, foundations, tableaus)
+    """
+    return tuple(tuple(pile.get_code_list()) for pile in [board.stock, board.wp] + board.foundations + board.tableaus)
+
+
+def play_random_moves(board, rng, num_moves):
+    for i in range(num_moves):
+        legal = board.legal_moves()
+        board.attempt_move(rng.choice(legal) if legal else STOCK_DRAW_MOVE)
+
+
+#============= TESTS =============#
+class TestFork(unittest.TestCase):
+
+    def test_fork_isolation(self):
+        rng = random.Random(0)
+        for board_class in BOARD_CLASSES:
+            for deal_id in range(6):
+                with self.subTest(board_class=board_class.__name__, deal_id=deal_id):
+                    board = deal_board(board_class, deal_id, deal_3=deal_id % 2 == 1, auto_flip_tab=deal_id % 3 != 0)
+                    play_random_moves(board, rng, 20)
+                    before = board_cards(board)
+                    fork = board.fork()
+                    self.assertEqual(board_cards(fork), before)
+
+                    play_random_moves(fork, rng, 40)
+                    while fork.moves != 0:
+                        fork.undo_move()
+                        self.assertEqual(board_cards(board), before)
+                    play_random_moves(fork, rng, 40)
+                    self.assertEqual(board_cards(board), before)
+
+                    forked = board_cards(fork)
+                    play_random_moves(board, rng, 40)
+                    self.assertEqual(board_cards(fork), forked)
+
+    def test_auto_play_on_fork(self):
+        rng = random.Random(1)
+        for board_class in BOARD_CLASSES:
+            for deal_id in range(6):
+                with self.subTest(board_class=board_class.__name__, deal_id=deal_id):
+                    board = deal_board(board_class, deal_id)
+                    for step in range(10):
+                        play_random_moves(board, rng, 15)
+                        before = board_cards(board)
+                        fork, board_copy = board.fork(), copy.deepcopy(board)
+                        moved = fork.auto_play()
+                        self.assertEqual(moved, board_copy.auto_play())
+                        self.assertEqual(board_cards(fork), board_cards(board_copy))
+                        self.assertEqual(board_cards(board), before)
+                        if moved != 0:
+                            fork.undo_move()
+                            self.assertEqual(board_cards(fork), before)
+
+    def test_auto_complete_on_fork(self):
+        for compact in (False, True):
+            for deal_id in SOLVED_DEALS:
+                with self.subTest(compact=compact, deal_id=deal_id):
+                    game = Game(api_use=True)
+                    game.new_game(custom_seed=deal_id, compact=compact)
+                    status, moves = solve_board(game.board, max_nodes=SOLVER_NODES, max_seconds=60)
+                    self.assertEqual(status, SOLVED)
+                    board = game.board
+                    for move in moves:
+                        self.assertTrue(board.attempt_move(move), move)
+                        if board.is_winnable():
+                            break
+                    before = board_cards(board)
+
+                    fork = board.fork()
+                    self.assertNotEqual(fork.auto_complete(), 0)
+                    self.assertTrue(fork.is_won())
+                    self.assertEqual(board_cards(board), before)
+                    self.assertFalse(board.is_won())
+                    fork.undo_move()
+                    self.assertEqual(board_cards(fork), before)
+
+                    # the move that made the board winnable, made again on a forked game
+                    board.undo_move()
+                    before = board_cards(board)
+                    forked_game = game.api_fork()
+                    forked_game.auto_complete = True
+                    self.assertTrue(forked_game.api_make_move(move))
+                    self.assertTrue(forked_game.api_is_won())
+                    self.assertEqual(board_cards(board), before)
+
+if __name__ == '__main__':
+    unittest.main()